@@ -19,10 +19,18 @@ import json
 import sqlite3
 import tempfile
 import queue
+import socket
+import struct
+import csv
+import itertools
+import urllib.request
+import urllib.error
+from collections import deque
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
+from stream_export import export_format_for_path, export_to_file
 
 # --- Configuration ---
 MITM_PORT = 8080
@@ -30,82 +38,276 @@ DB_FILE = "captured_urls.db"
 NDJSON_FILE = "captured_urls.ndjson"
 ADDON_FILENAME = "mitm_addon.py"
 MITMDUMP_CMD = "mitmdump"  # ensure mitmdump is in PATH (part of mitmproxy)
-POLL_INTERVAL = 0.5  # GUI poll
+POLL_INTERVAL = 0.05  # GUI poll of the in-memory queue (no DB access)
+ADDON_BATCH_SIZE = 200  # captured requests per addon write batch
+ADDON_FLUSH_INTERVAL = 0.05  # seconds a captured request may wait before its batch is written
+FEED_HOST = "127.0.0.1"  # the addon pushes each written batch to the controller on this address
+VIEW_MAX_ROWS = 2000  # live rows kept in the table; older rows are paged back in from the DB on scroll
+INSERTS_PER_TICK = 500  # rows inserted into the table per GUI poll
+PAGE_ROWS = 500  # rows loaded from the DB per scroll page
+MONITOR_API_URL = os.environ.get("MONITOR_API_URL", "http://127.0.0.1:5000")  # Flask monitoring service (app.py)
+PROMOTE_FREQUENCY_MINUTES = 10  # check frequency for endpoints promoted to monitors
+SEARCH_WINDOWS = {"All time": None, "Last 15 minutes": 15, "Last hour": 60, "Last 24 hours": 1440}  # minutes
+
+# Columns filled in from the addon's response/error hooks; added to capture DBs created before them.
+RESPONSE_COLUMNS = (("flow_id", "TEXT"), ("status", "INTEGER"), ("resp_ms", "REAL"), ("connect_ms", "REAL"),
+                    ("tls_ms", "REAL"), ("resp_bytes", "INTEGER"), ("error", "TEXT"))
+HOST_PERCENTILE_MINUTES = 1440  # window of the per-host response time percentiles
+
+# Per-host and per-endpoint counters, upserted by the addon with every batch it writes.
+# Endpoints are keyed on the path template, e.g. /users/{id}/orders/{uuid}.
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS host_stats (
+    host TEXT PRIMARY KEY,
+    request_count INTEGER NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS endpoint_stats (
+    host TEXT NOT NULL,
+    method TEXT NOT NULL,
+    path_template TEXT NOT NULL,
+    request_count INTEGER NOT NULL,
+    first_seen TEXT,
+    last_seen TEXT,
+    sample_url TEXT,
+    PRIMARY KEY (host, method, path_template)
+) WITHOUT ROWID;
+"""
 
 # --- Helper: create mitmproxy addon file (writes to sqlite + ndjson) ---
 MITM_ADDON_TEMPLATE = r'''
 # Auto-generated mitmproxy addon.
-# Writes each request as a JSON line into the configured NDJSON_FILE and also inserts into SQLite DB.
+# The request, response and error hooks only queue a record; a background thread appends batches
+# to NDJSON_FILE, writes them to the SQLite DB over one connection kept open for the addon's lifetime
+# (responses update their request's row) and pushes each batch to the GUI controller as a
+# length-prefixed JSON frame on FEED_PORT.
 
-from mitmproxy import ctx
 import json
+import logging
+import queue
+import re
+import socket
 import sqlite3
-import os
+import struct
+import threading
+import time
 from datetime import datetime
 
+log = logging.getLogger(__name__)  # mitmproxy 9+ routes the standard logging module into its event log
+
 NDJSON = __NDJSON_PATH__
 DB_PATH = __DB_PATH__
-
-def ensure_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ts TEXT,
-            client_addr TEXT,
-            method TEXT,
-            scheme TEXT,
-            host TEXT,
-            path TEXT,
-            full_url TEXT,
-            req_headers TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+BATCH_SIZE = __BATCH_SIZE__
+FLUSH_INTERVAL = __FLUSH_INTERVAL__
+FEED_HOST = __FEED_HOST__
+FEED_PORT = __FEED_PORT__
+STATS_SCHEMA = __STATS_SCHEMA__
+MAX_OPEN_FLOWS = 100000  # request rows remembered while waiting for their response
+
+ID_RE = re.compile(r"^\d+$")
+UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+HEX_RE = re.compile(r"^(?=.*\d)[0-9a-fA-F]{16,}$")  # hashes, object ids
+
+def path_template(path):
+    # /users/42/files/9f86d081884c7d65?x=1 -> /users/{id}/files/{hex}
+    segments = path.split("?", 1)[0].split("/")
+    for i, seg in enumerate(segments):
+        if ID_RE.match(seg):
+            segments[i] = "{id}"
+        elif UUID_RE.match(seg):
+            segments[i] = "{uuid}"
+        elif HEX_RE.match(seg):
+            segments[i] = "{hex}"
+    return "/".join(segments) or "/"
+
+class CaptureWriter:
+    def __init__(self):
+        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts TEXT,
+                client_addr TEXT,
+                method TEXT,
+                scheme TEXT,
+                host TEXT,
+                path TEXT,
+                full_url TEXT,
+                req_headers TEXT,
+                flow_id TEXT,
+                status INTEGER,
+                resp_ms REAL,
+                connect_ms REAL,
+                tls_ms REAL,
+                resp_bytes INTEGER,
+                error TEXT
+            )
+        """)
+        self.conn.executescript(STATS_SCHEMA)
+        self.conn.commit()
+        self.ndjson = open(NDJSON, "a", encoding="utf-8")
+        self.feed = None
+        self.flow_ids = {}  # flow id -> requests row id, until the response or error arrives
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < BATCH_SIZE and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            records = [r for r in batch if r is not None]
+            if records:
+                try:
+                    self.write(records)
+                except Exception as e:
+                    log.warning("Addon write error: %s", e)
+                self.push(records)
+            if len(records) < len(batch):
+                return
+
+    def write(self, records):
+        self.ndjson.write("".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in records))
+        self.ndjson.flush()
+        requests = [r for r in records if r["event"] == "request"]
+        updates = []
+        with self.conn:
+            cur = self.conn.cursor()
+            for r in requests:
+                cur.execute("""
+                    INSERT INTO requests (ts, client_addr, method, scheme, host, path, full_url, req_headers, flow_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (r["ts"], r["client"], r["method"], r["scheme"], r["host"], r["path"], r["full_url"], json.dumps(r["headers"]), r["flow_id"]))
+                r["id"] = self.flow_ids[r["flow_id"]] = cur.lastrowid
+            for r in records:
+                if r["event"] == "response" and r["flow_id"] in self.flow_ids:
+                    r["id"] = self.flow_ids.pop(r["flow_id"])
+                    updates.append((r["status"], r["resp_ms"], r["connect_ms"], r["tls_ms"], r["resp_bytes"], r["error"], r["id"]))
+            cur.executemany("UPDATE requests SET status = ?, resp_ms = ?, connect_ms = ?, tls_ms = ?, resp_bytes = ?, error = ? WHERE id = ?", updates)
+            self.update_stats(cur, requests)
+        while len(self.flow_ids) > MAX_OPEN_FLOWS:
+            del self.flow_ids[next(iter(self.flow_ids))]
+
+    def update_stats(self, cur, records):
+        # Fold the batch in memory first, so each host/endpoint costs one upsert per batch.
+        hosts, endpoints = {}, {}
+        for r in records:
+            h = hosts.setdefault(r["host"], [0, r["ts"], r["ts"]])
+            h[0] += 1; h[2] = r["ts"]
+            e = endpoints.setdefault((r["host"], r["method"], path_template(r["path"])), [0, r["ts"], r["ts"], None])
+            e[0] += 1; e[2] = r["ts"]; e[3] = r["full_url"]
+        cur.executemany("""
+            INSERT INTO host_stats (host, request_count, first_seen, last_seen) VALUES (?, ?, ?, ?)
+            ON CONFLICT (host) DO UPDATE SET request_count = request_count + excluded.request_count, last_seen = excluded.last_seen
+        """, [(host,) + tuple(v) for host, v in hosts.items()])
+        cur.executemany("""
+            INSERT INTO endpoint_stats (host, method, path_template, request_count, first_seen, last_seen, sample_url) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (host, method, path_template) DO UPDATE SET request_count = request_count + excluded.request_count,
+                last_seen = excluded.last_seen, sample_url = excluded.sample_url
+        """, [key + tuple(v) for key, v in endpoints.items()])
+
+    def push(self, records):
+        # Best effort: without a listening controller the DB and NDJSON file still get every record.
+        if not FEED_PORT:
+            return
+        payload = json.dumps([{k: v for k, v in r.items() if k != "headers"} for r in records]).encode("utf-8")
+        try:
+            if self.feed is None:
+                self.feed = socket.create_connection((FEED_HOST, FEED_PORT), timeout=1)
+            self.feed.sendall(struct.pack("!I", len(payload)) + payload)
+        except OSError as e:
+            log.warning("Addon feed error: %s", e)
+            if self.feed:
+                self.feed.close()
+            self.feed = None
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        if self.feed:
+            self.feed.close()
+        self.ndjson.close()
+        self.conn.close()
+
+writer = None
+
+def load(loader):
+    global writer
+    writer = CaptureWriter()
+
+def done():
+    if writer:
+        writer.close()
 
 def request(flow):
     try:
-        ensure_db()
-        ts = datetime.utcnow().isoformat() + "Z"
         client_addr = "%s:%s" % (flow.client_conn.address[0], flow.client_conn.address[1]) if flow.client_conn.address else ""
-        method = flow.request.method
-        scheme = flow.request.scheme
-        host = flow.request.host or ""
-        path = flow.request.path or ""
-        full_url = flow.request.pretty_url or ""
-        headers = dict(flow.request.headers)
-
-        # write to ndjson
-        rec = {
-            "ts": ts,
+        writer.queue.put({
+            "event": "request",
+            "flow_id": flow.id,
+            "ts": datetime.utcnow().isoformat() + "Z",
             "client": client_addr,
-            "method": method,
-            "scheme": scheme,
-            "host": host,
-            "path": path,
-            "full_url": full_url,
-            "headers": headers
-        }
-        # append to ndjson
-        with open(NDJSON, "a", encoding="utf-8") as f:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-        # insert to sqlite
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO requests (ts, client_addr, method, scheme, host, path, full_url, req_headers)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (ts, client_addr, method, scheme, host, path, full_url, json.dumps(headers)))
-        conn.commit()
-        conn.close()
+            "method": flow.request.method,
+            "scheme": flow.request.scheme,
+            "host": flow.request.host or "",
+            "path": flow.request.path or "",
+            "full_url": flow.request.pretty_url or "",
+            "headers": dict(flow.request.headers)
+        })
+    except Exception as e:
+        log.warning("Addon capture error: %s", e)
+
+def response_record(flow, error=None):
+    req, resp, server = flow.request, flow.response, flow.server_conn
+    rec = {"event": "response", "flow_id": flow.id, "status": resp.status_code if resp else None, "resp_ms": None,
+           "connect_ms": None, "tls_ms": None, "resp_bytes": None, "error": error}
+    if resp:
+        if resp.timestamp_end and req.timestamp_end:
+            rec["resp_ms"] = round((resp.timestamp_end - req.timestamp_end) * 1000, 2)
+        rec["resp_bytes"] = len(resp.raw_content) if resp.raw_content is not None else int(resp.headers.get("content-length") or 0)
+    # connect/TLS time only belongs to the flow that opened the upstream connection
+    if server and server.timestamp_start and req.timestamp_start and server.timestamp_start >= req.timestamp_start:
+        if server.timestamp_tcp_setup:
+            rec["connect_ms"] = round((server.timestamp_tcp_setup - server.timestamp_start) * 1000, 2)
+            if server.timestamp_tls_setup:
+                rec["tls_ms"] = round((server.timestamp_tls_setup - server.timestamp_tcp_setup) * 1000, 2)
+    return rec
+
+def response(flow):
+    try:
+        writer.queue.put(response_record(flow))
     except Exception as e:
-        ctx.log.warn("Addon write error: %s" % str(e))
+        log.warning("Addon capture error: %s", e)
+
+def error(flow):
+    try:
+        writer.queue.put(response_record(flow, flow.error.msg if flow.error else "error"))
+    except Exception as e:
+        log.warning("Addon capture error: %s", e)
 '''
 
 # --- GUI / Controller ---
+def utc_since(minutes):
+    # Same format as the addon's ts column, so it compares correctly as text.
+    return (datetime.utcnow() - timedelta(minutes=minutes)).isoformat() + "Z"
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else None
+
 class MitmController:
     def __init__(self, workdir: Path):
         self.workdir = workdir
@@ -115,6 +317,8 @@ class MitmController:
         self.proc = None
         self._stop_event = threading.Event()
         self._poll_q = queue.Queue()
+        self._feed_server = None
+        self.fts_enabled = False
         # create DB if not exists
         self._ensure_db()
 
@@ -131,30 +335,77 @@ class MitmController:
                 host TEXT,
                 path TEXT,
                 full_url TEXT,
-                req_headers TEXT
+                req_headers TEXT,
+                flow_id TEXT,
+                status INTEGER,
+                resp_ms REAL,
+                connect_ms REAL,
+                tls_ms REAL,
+                resp_bytes INTEGER,
+                error TEXT
             )
         """)
+        existing = {row[1] for row in cur.execute("PRAGMA table_info(requests)")}
+        for name, decl in RESPONSE_COLUMNS:
+            if name not in existing:
+                cur.execute(f"ALTER TABLE requests ADD COLUMN {name} {decl}")
+        # single-column indexes also carry the rowid, so each one serves "<col> = ? AND id BETWEEN ..." ranges
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_ts ON requests (ts)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_host ON requests (host)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_method ON requests (method)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_client ON requests (client_addr)")
+        cur.executescript(STATS_SCHEMA)
         conn.commit()
+        self.fts_enabled = self._ensure_fts(conn)
         conn.close()
 
-    def write_addon(self):
+    def _ensure_fts(self, conn):
+        # Optional trigram FTS5 index for substring search over full_url/path; falls back to LIKE without it.
+        try:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'requests_fts'").fetchone()
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(full_url, path, content='requests', content_rowid='id', tokenize='trigram');
+                CREATE TRIGGER IF NOT EXISTS requests_fts_ai AFTER INSERT ON requests BEGIN
+                    INSERT INTO requests_fts (rowid, full_url, path) VALUES (new.id, new.full_url, new.path);
+                END;
+                CREATE TRIGGER IF NOT EXISTS requests_fts_ad AFTER DELETE ON requests BEGIN
+                    INSERT INTO requests_fts (requests_fts, rowid, full_url, path) VALUES ('delete', old.id, old.full_url, old.path);
+                END;
+            """)
+            if not exists:
+                conn.execute("INSERT INTO requests_fts (requests_fts) VALUES ('rebuild')")
+            conn.commit()
+            return True
+        except sqlite3.OperationalError:
+            conn.rollback()
+            return False
+
+    def write_addon(self, feed_port=0):
         tpl = MITM_ADDON_TEMPLATE
         tpl = tpl.replace("__NDJSON_PATH__", json.dumps(self.ndjson_path))
         tpl = tpl.replace("__DB_PATH__", json.dumps(self.db_path))
+        tpl = tpl.replace("__BATCH_SIZE__", str(ADDON_BATCH_SIZE))
+        tpl = tpl.replace("__FLUSH_INTERVAL__", str(ADDON_FLUSH_INTERVAL))
+        tpl = tpl.replace("__FEED_HOST__", json.dumps(FEED_HOST))
+        tpl = tpl.replace("__FEED_PORT__", str(feed_port))
+        tpl = tpl.replace("__STATS_SCHEMA__", json.dumps(STATS_SCHEMA))
         with open(self.addon_path, "w", encoding="utf-8") as f:
             f.write(tpl)
+        return self.addon_path
 
     def start_mitmdump(self):
         if self.proc:
             raise RuntimeError("mitmdump already started")
-        self.write_addon()
+        # listen for the addon's push feed before mitmdump loads it
+        self._feed_server = self.open_feed()
+        self.write_addon(self._feed_server.getsockname()[1])
         cmd = [MITMDUMP_CMD, "-p", str(MITM_PORT), "-s", self.addon_path]
         # Launch mitmdump subprocess
         self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         # start a thread to read stderr/stdout and push logs to queue
         threading.Thread(target=self._reader_thread, daemon=True).start()
-        # start watcher thread to tail DB
-        threading.Thread(target=self._db_watcher_thread, daemon=True).start()
+        # start feed thread to receive captured batches
+        threading.Thread(target=self._feed_thread, args=(self._feed_server,), daemon=True).start()
 
     def stop_mitmdump(self):
         if not self.proc:
@@ -168,6 +419,9 @@ class MitmController:
         except Exception:
             pass
         self.proc = None
+        if self._feed_server:
+            self._feed_server.close()
+            self._feed_server = None
 
     def is_running(self):
         return self.proc is not None and self.proc.poll() is None
@@ -186,53 +440,188 @@ class MitmController:
                     pass
             threading.Thread(target=drain, args=(stream,), daemon=True).start()
 
-    def _db_watcher_thread(self):
-        # Poll the SQLite DB for new rows and push them to the queue for GUI.
-        last_id = 0
-        while self.is_running():
+    def open_feed(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind((FEED_HOST, 0))
+        server.listen(1)
+        return server
+
+    def _feed_thread(self, server):
+        # Accept the addon's connection and forward every pushed batch to the GUI queue.
+        while True:
             try:
-                conn = sqlite3.connect(self.db_path)
-                cur = conn.cursor()
-                cur.execute("SELECT id, ts, client_addr, method, scheme, host, path, full_url FROM requests WHERE id > ? ORDER BY id ASC", (last_id,))
-                rows = cur.fetchall()
-                conn.close()
-                for r in rows:
-                    last_id = max(last_id, r[0])
-                    rec = {
-                        "id": r[0],
-                        "ts": r[1],
-                        "client": r[2],
-                        "method": r[3],
-                        "scheme": r[4],
-                        "host": r[5],
-                        "path": r[6],
-                        "full_url": r[7]
-                    }
-                    self._poll_q.put(("item", rec))
-            except Exception as e:
-                self._poll_q.put(("log", f"DB read error: {e}"))
-            time.sleep(0.5)
+                conn, _ = server.accept()
+            except OSError:
+                return  # server closed by stop_mitmdump
+            threading.Thread(target=self._read_feed, args=(conn,), daemon=True).start()
+
+    def _read_feed(self, conn):
+        try:
+            with conn:
+                while True:
+                    header = self._recv_exact(conn, 4)
+                    if header is None:
+                        return
+                    payload = self._recv_exact(conn, struct.unpack("!I", header)[0])
+                    if payload is None:
+                        return
+                    self._poll_q.put(("items", json.loads(payload.decode("utf-8"))))
+        except (OSError, ValueError) as e:
+            self._poll_q.put(("log", f"Feed error: {e}"))
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = conn.recv(size - len(buf))
+            if not chunk:
+                return None
+            buf.extend(chunk)
+        return bytes(buf)
 
     def get_queue(self):
         return self._poll_q
 
-    def export_csv(self, outpath):
+    def _filters(self, cur, host=None, method=None, client=None, text=None, since=None, until=None, before_id=None):
+        # Rows are stored in capture order, so a time range becomes an id range found through the
+        # ts index; every other filter then runs as a range scan on its own (column, id) index.
+        where, params = [], []
+        if since:
+            first = cur.execute("SELECT id FROM requests WHERE ts >= ? ORDER BY ts LIMIT 1", (since,)).fetchone()
+            where.append("id >= ?"); params.append(first[0] if first else 2**63 - 1)
+        if until:
+            last = cur.execute("SELECT id FROM requests WHERE ts < ? ORDER BY ts DESC LIMIT 1", (until,)).fetchone()
+            where.append("id <= ?"); params.append(last[0] if last else 0)
+        if before_id is not None:
+            where.append("id < ?"); params.append(before_id)
+        if host:
+            where.append("host = ?"); params.append(host)
+        if method:
+            where.append("method = ?"); params.append(method.upper())
+        if client:
+            # client_addr is "ip:port"; GLOB keeps the prefix match on the index
+            where.append("client_addr GLOB ?"); params.append(client.replace("[", "[[]").replace("*", "[*]").replace("?", "[?]") + ":*")
+        if text:
+            # host/client already narrow the scan to one index range, where LIKE beats materialising FTS hits
+            if self.fts_enabled and len(text) >= 3 and not (host or client):
+                where.append("id IN (SELECT rowid FROM requests_fts WHERE requests_fts MATCH ?)"); params.append('"%s"' % text.replace('"', '""'))
+            else:
+                pattern = "%" + text.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+                where.append("(full_url LIKE ? ESCAPE '!' OR path LIKE ? ESCAPE '!')"); params.extend([pattern, pattern])
+        return (" WHERE " + " AND ".join(where) if where else ""), params
+
+    def query(self, limit=PAGE_ROWS, **filters):
+        """Newest-first page of captured rows matching every given filter.
+
+        Filters: host, method, client (IP, any port), text (case-insensitive substring of
+        full_url or path, via the FTS index when available), since/until (ISO timestamps as
+        written by the addon) and before_id for paging.
+        """
         conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
         cur = conn.cursor()
-        cur.execute("SELECT ts, client_addr, method, scheme, host, path, full_url FROM requests ORDER BY id ASC")
+        where, params = self._filters(cur, **filters)
+        cur.execute("SELECT id, ts, client_addr AS client, method, host, full_url, status, resp_ms, resp_bytes, error FROM requests" + where + " ORDER BY id DESC LIMIT ?", params + [limit])
+        rows = [dict(r) for r in cur.fetchall()]
+        conn.close()
+        return rows
+
+    def host_counts(self, limit=50, **filters):
+        """(host, requests) for the rows matching `filters`, busiest first."""
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        where, params = self._filters(cur, **filters)
+        cur.execute("SELECT host, COUNT(*) AS n FROM requests" + where + " GROUP BY host ORDER BY n DESC LIMIT ?", params + [limit])
         rows = cur.fetchall()
         conn.close()
-        import csv
+        return rows
+
+    def host_percentiles(self, minutes=HOST_PERCENTILE_MINUTES, **filters):
+        """Per-host response time percentiles (ms), mean response size and error count.
+
+        Covers the last `minutes` (all rows if 0) plus any query filters; rows are streamed one host at a time.
+        """
+        if minutes:
+            filters.setdefault("since", utc_since(minutes))
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        where, params = self._filters(cur, **filters)
+        # "+host" keeps the planner off idx_requests_host for the sort: that index would scan the whole
+        # table and ignore the id bound, while the rowid range plus a temp sort only reads the window.
+        cur.execute("SELECT host, resp_ms, resp_bytes, error FROM requests" + where + " ORDER BY +host", params)
+        summary = {}
+        for host, rows in itertools.groupby(cur, key=lambda r: r[0]):
+            rows = list(rows)
+            times = sorted(r[1] for r in rows if r[1] is not None)
+            sizes = [r[2] for r in rows if r[2] is not None]
+            summary[host] = {"host": host, "requests": len(rows), "responses": len(times), "errors": sum(1 for r in rows if r[3]),
+                             "p50_ms": percentile(times, 50), "p90_ms": percentile(times, 90), "p99_ms": percentile(times, 99),
+                             "max_ms": times[-1] if times else None, "avg_bytes": round(sum(sizes) / len(sizes)) if sizes else None}
+        conn.close()
+        return summary
+
+    def export_host_summary(self, outpath, minutes=HOST_PERCENTILE_MINUTES):
+        rows = sorted(self.host_percentiles(minutes).values(), key=lambda h: -h["requests"])
+        fields = ["host", "requests", "responses", "errors", "p50_ms", "p90_ms", "p99_ms", "max_ms", "avg_bytes"]
         with open(outpath, "w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(["ts","client","method","scheme","host","path","full_url"])
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
             w.writerows(rows)
+        return len(rows)
+
+    def endpoint_stats(self, limit=5000):
+        """Hosts (busiest first), each with its endpoint rows (busiest first)."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        hosts = [dict(r, endpoints=[]) for r in cur.execute("SELECT * FROM host_stats ORDER BY request_count DESC")]
+        by_host = {h["host"]: h for h in hosts}
+        for r in cur.execute("SELECT * FROM endpoint_stats ORDER BY request_count DESC LIMIT ?", (limit,)):
+            if r["host"] in by_host:
+                by_host[r["host"]]["endpoints"].append(dict(r))
+        conn.close()
+        return hosts
+
+    def promote(self, url, category="Discovered", frequency=PROMOTE_FREQUENCY_MINUTES):
+        # Adds the URL as a monitor through the Flask service's API, so its scheduler picks it up at once.
+        body = json.dumps({"url": url, "category": category, "frequency": frequency}).encode("utf-8")
+        req = urllib.request.Request(MONITOR_API_URL + "/api/advanced/add_monitor", data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error")
+            except ValueError:
+                message = None
+            raise RuntimeError(message or f"HTTP {e.code}")
+
+    def export(self, outpath, fmt="csv", compress=False):
+        # Streams the table in chunks, so memory does not grow with the number of captured rows.
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT ts, client_addr AS client, method, scheme, host, path, full_url, status, resp_ms, connect_ms, tls_ms, resp_bytes, error FROM requests ORDER BY id ASC")
+            return export_to_file(outpath, cur, fmt, compress)
+        finally:
+            conn.close()
+
+    def export_csv(self, outpath):
+        return self.export(outpath, "csv")
 
     def clear_db(self):
         conn = sqlite3.connect(self.db_path)
         cur = conn.cursor()
+        if self.fts_enabled:
+            # empty the FTS index in one step rather than through the per-row delete trigger
+            cur.execute("DROP TRIGGER IF EXISTS requests_fts_ad")
+            cur.execute("INSERT INTO requests_fts (requests_fts) VALUES ('delete-all')")
         cur.execute("DELETE FROM requests")
+        cur.execute("DELETE FROM host_stats")
+        cur.execute("DELETE FROM endpoint_stats")
         conn.commit()
+        if self.fts_enabled:
+            self._ensure_fts(conn)
         conn.close()
         # remove ndjson
         try:
@@ -250,6 +639,12 @@ class App:
         self.workdir = Path.cwd()
         self.ctrl = MitmController(self.workdir)
         self.queue = self.ctrl.get_queue()
+        # rows waiting to be shown; once it overflows, the view is reloaded from the DB instead
+        self.pending = deque(maxlen=VIEW_MAX_ROWS)
+        self.dropped = False
+        self.loading_older = False
+        self.filters = {}  # active search; live rows are held back while one is set
+        self.responses = {}  # row id -> response that arrived before its row was shown
 
         top = ttk.Frame(root, padding=6)
         top.pack(fill="x")
@@ -259,10 +654,32 @@ class App:
         self.start_btn.pack(side="right", padx=6)
         ttk.Button(top, text="Install cert (open instructions)", command=self.open_cert_instructions).pack(side="right")
 
-        mid = ttk.Frame(root, padding=6)
-        mid.pack(fill="both", expand=True)
-
-        cols = ("ts","client","method","host","full_url")
+        search = ttk.Frame(root, padding=(6,0))
+        search.pack(fill="x")
+        self.search_vars = {}
+        for key, label, width in (("text", "URL contains:", 30), ("host", "Host:", 20), ("client", "Client IP:", 14)):
+            ttk.Label(search, text=label).pack(side="left")
+            var = tk.StringVar()
+            entry = ttk.Entry(search, textvariable=var, width=width)
+            entry.pack(side="left", padx=(2,8))
+            entry.bind("<Return>", lambda e: self.apply_search())
+            self.search_vars[key] = var
+        ttk.Label(search, text="Method:").pack(side="left")
+        self.search_vars["method"] = tk.StringVar(value="")
+        ttk.Combobox(search, textvariable=self.search_vars["method"], width=8, state="readonly",
+                     values=("", "GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")).pack(side="left", padx=(2,8))
+        self.search_vars["window"] = tk.StringVar(value="All time")
+        ttk.Combobox(search, textvariable=self.search_vars["window"], width=14, state="readonly",
+                     values=tuple(SEARCH_WINDOWS)).pack(side="left", padx=(2,8))
+        ttk.Button(search, text="Search", command=self.apply_search).pack(side="left", padx=2)
+        ttk.Button(search, text="Reset", command=self.reset_search).pack(side="left", padx=2)
+
+        self.tabs = ttk.Notebook(root)
+        self.tabs.pack(fill="both", expand=True)
+        mid = ttk.Frame(self.tabs, padding=6)
+        self.tabs.add(mid, text="Requests")
+
+        cols = ("ts","client","method","host","status","ms","bytes","full_url")
         self.tree = ttk.Treeview(mid, columns=cols, show="headings")
         for c in cols:
             self.tree.heading(c, text=c)
@@ -270,20 +687,47 @@ class App:
                 self.tree.column(c, width=500)
             elif c=="host":
                 self.tree.column(c, width=200)
+            elif c in ("method","status","ms","bytes"):
+                self.tree.column(c, width=70)
             else:
                 self.tree.column(c, width=140)
         self.tree.pack(fill="both", expand=True, side="left")
-        vsb = ttk.Scrollbar(mid, orient="vertical", command=self.tree.yview)
-        vsb.pack(side="left", fill="y")
-        self.tree.configure(yscrollcommand=vsb.set)
+        self.vsb = ttk.Scrollbar(mid, orient="vertical", command=self.tree.yview)
+        self.vsb.pack(side="left", fill="y")
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+        endpoints = ttk.Frame(self.tabs, padding=6)
+        self.tabs.add(endpoints, text="Endpoints")
+        ep_bar = ttk.Frame(endpoints)
+        ep_bar.pack(fill="x", pady=(0,4))
+        ttk.Button(ep_bar, text="Refresh", command=self.refresh_endpoints).pack(side="left")
+        ttk.Button(ep_bar, text="Promote to monitor", command=self.promote_endpoint).pack(side="left", padx=4)
+        ttk.Button(ep_bar, text="Export host summary", command=self.export_host_summary).pack(side="left", padx=4)
+        self.ep_summary = ttk.Label(ep_bar, text="")
+        self.ep_summary.pack(side="right")
+        ep_cols = ("method","endpoint","requests","p50_ms","p90_ms","p99_ms","errors","first_seen","last_seen")
+        self.ep_tree = ttk.Treeview(endpoints, columns=ep_cols, show="tree headings")
+        self.ep_tree.heading("#0", text="host")
+        self.ep_tree.column("#0", width=220)
+        for c in ep_cols:
+            self.ep_tree.heading(c, text=c)
+            self.ep_tree.column(c, width=360 if c=="endpoint" else 150 if c in ("first_seen","last_seen") else 70)
+        self.ep_tree.pack(fill="both", expand=True, side="left")
+        ep_vsb = ttk.Scrollbar(endpoints, orient="vertical", command=self.ep_tree.yview)
+        ep_vsb.pack(side="left", fill="y")
+        self.ep_tree.configure(yscrollcommand=ep_vsb.set)
+        self.ep_samples = {}  # endpoint row iid -> last concrete URL seen for it
+        self.ep_loading = False
+        self.tabs.bind("<<NotebookTabChanged>>", lambda e: self.tabs.index("current") == 1 and self.refresh_endpoints())
 
         right = ttk.Frame(root, padding=6)
         right.pack(fill="x")
-        ttk.Button(right, text="Export CSV", command=self.export_csv).pack(side="left", padx=4)
+        ttk.Button(right, text="Export", command=self.export).pack(side="left", padx=4)
         ttk.Button(right, text="Clear Log", command=self.clear_log).pack(side="left", padx=4)
         self.status = ttk.Label(right, text="Idle")
         self.status.pack(side="right")
 
+        self.reload_view()
         # poll queue
         root.after(200, self.poll_queue)
 
@@ -315,20 +759,171 @@ class App:
                 if typ == "log":
                     # currently just set status
                     self.status.config(text=payload[:200])
-                elif typ == "item":
-                    r = payload
-                    self.tree.insert("", 0, values=(r["ts"], r["client"], r["method"], r["host"], r["full_url"]))
-        except Exception:
+                elif typ == "endpoints":
+                    self.show_endpoints(*payload)
+                elif typ == "items":
+                    requests = [r for r in payload if r.get("event") != "response"]
+                    if len(self.pending) + len(requests) > VIEW_MAX_ROWS:
+                        self.dropped = True
+                    self.pending.extend(requests)
+                    for r in payload:
+                        if r.get("event") == "response":
+                            self.apply_response(r)
+        except queue.Empty:
             pass
+        try:
+            self.flush_pending()
+        except Exception as e:
+            self.status.config(text=f"View error: {e}"[:200])
         finally:
             self.root.after(int(POLL_INTERVAL*1000), self.poll_queue)
 
-    def export_csv(self):
+    def insert_row(self, index, r):
+        # reload_view() reads the DB, so it can already show rows whose batch the addon has not pushed yet.
+        if r.get("id") is not None and self.tree.exists(r["id"]):
+            return
+        r.update(self.responses.pop(r.get("id"), {}))
+        self.tree.insert("", index, iid=r.get("id"), values=(r["ts"], r["client"], r["method"], r["host"]) + self.response_values(r) + (r["full_url"],))
+
+    @staticmethod
+    def response_values(r):
+        status = "ERR" if r.get("error") else r.get("status")
+        return tuple("" if v is None else v for v in (status, r.get("resp_ms"), r.get("resp_bytes")))
+
+    def apply_response(self, r):
+        # Rows already in the table are updated in place; others pick the response up when inserted.
+        if r.get("id") is None:
+            return
+        if self.tree.exists(r["id"]):
+            for col, v in zip(("status", "ms", "bytes"), self.response_values(r)):
+                self.tree.set(r["id"], col, v)
+        else:
+            if len(self.responses) >= VIEW_MAX_ROWS:
+                self.responses.clear()
+            self.responses[r["id"]] = r
+
+    def flush_pending(self):
+        # Live rows only go in while the user is at the top of the unfiltered view; otherwise they wait in pending.
+        if self.filters or self.tree.yview()[0] > 0:
+            return
+        if self.dropped:
+            self.reload_view()
+            return
+        for _ in range(min(INSERTS_PER_TICK, len(self.pending))):
+            self.insert_row(0, self.pending.popleft())
+        children = self.tree.get_children()
+        if len(children) > VIEW_MAX_ROWS:
+            self.tree.delete(*children[VIEW_MAX_ROWS:])
+
+    def reload_view(self):
+        # The DB already holds everything that was pending, so start over from its newest rows.
+        self.pending.clear()
+        self.dropped = False
+        self.tree.delete(*self.tree.get_children())
+        for r in self.ctrl.query(limit=PAGE_ROWS if self.filters else VIEW_MAX_ROWS, **self.filters):
+            self.insert_row("end", r)
+
+    def apply_search(self):
+        filters = {k: v.get().strip() for k, v in self.search_vars.items() if k != "window" and v.get().strip()}
+        minutes = SEARCH_WINDOWS[self.search_vars["window"].get()]
+        if minutes:
+            filters["since"] = utc_since(minutes)
+        self.filters = filters
+        started = time.perf_counter()
+        try:
+            self.reload_view()
+            self.status.config(text=f"{len(self.tree.get_children())} rows shown ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        except Exception as e:
+            messagebox.showerror("Search error", str(e))
+
+    def reset_search(self):
+        for key, var in self.search_vars.items():
+            var.set("All time" if key == "window" else "")
+        self.filters = {}
+        self.reload_view()
+
+    def on_scroll(self, first, last):
+        self.vsb.set(first, last)
+        if float(first) > 0 and float(last) >= 1.0 and not self.loading_older:
+            self.loading_older = True
+            self.root.after_idle(self.load_older)
+
+    def load_older(self):
+        try:
+            children = self.tree.get_children()
+            if children and children[-1].isdigit():
+                for r in self.ctrl.query(before_id=int(children[-1]), **self.filters):
+                    self.insert_row("end", r)
+        except Exception as e:
+            self.status.config(text=f"DB read error: {e}"[:200])
+        finally:
+            self.loading_older = False
+
+    def refresh_endpoints(self):
+        # The percentile query reads a day of rows, so it runs off the Tk thread; poll_queue() shows the result.
+        if self.ep_loading:
+            return
+        self.ep_loading = True
+        self.ep_summary.config(text="Loading endpoints...")
+
+        def load():
+            try:
+                self.queue.put(("endpoints", (self.ctrl.endpoint_stats(), self.ctrl.host_percentiles(), None)))
+            except Exception as e:
+                self.queue.put(("endpoints", (None, None, e)))
+        threading.Thread(target=load, daemon=True).start()
+
+    def show_endpoints(self, hosts, latency, error):
+        self.ep_loading = False
+        if error is not None:
+            self.ep_summary.config(text="")
+            messagebox.showerror("Endpoints error", str(error))
+            return
+        open_hosts = {iid for iid in self.ep_tree.get_children() if self.ep_tree.item(iid, "open")}
+        self.ep_tree.delete(*self.ep_tree.get_children())
+        self.ep_samples = {}
+        for h in hosts:
+            lat = latency.get(h["host"], {})
+            pcts = tuple("" if lat.get(k) is None else lat[k] for k in ("p50_ms", "p90_ms", "p99_ms", "errors"))
+            hid = self.ep_tree.insert("", "end", iid="host:" + h["host"], text=h["host"], open="host:" + h["host"] in open_hosts,
+                                      values=("", f"{len(h['endpoints'])} endpoints", h["request_count"]) + pcts + (h["first_seen"], h["last_seen"]))
+            for e in h["endpoints"]:
+                iid = self.ep_tree.insert(hid, "end", values=(e["method"], e["path_template"], e["request_count"], "", "", "", "", e["first_seen"], e["last_seen"]))
+                self.ep_samples[iid] = e["sample_url"]
+        self.ep_summary.config(text=f"{len(hosts)} hosts, {len(self.ep_samples)} endpoints; percentiles over the last {HOST_PERCENTILE_MINUTES // 60}h")
+
+    def export_host_summary(self):
         out = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv")])
         if not out:
             return
         try:
-            self.ctrl.export_csv(out)
+            count = self.ctrl.export_host_summary(out)
+            messagebox.showinfo("Export", f"Exported {count} hosts to {out}")
+        except Exception as e:
+            messagebox.showerror("Export error", str(e))
+
+    def promote_endpoint(self):
+        sel = [iid for iid in self.ep_tree.selection() if iid in self.ep_samples]
+        if not sel:
+            messagebox.showinfo("Promote", "Select an endpoint row (expand a host first).")
+            return
+        url = self.ep_samples[sel[0]]
+        category = simpledialog.askstring("Promote to monitor", f"Monitor {url}\n\nCategory:", initialvalue="Discovered", parent=self.root)
+        if category is None:
+            return
+        try:
+            self.ctrl.promote(url, category or "Discovered")
+            messagebox.showinfo("Promote", f"Now monitoring {url}")
+        except Exception as e:
+            messagebox.showerror("Promote error", f"{e}\n\nIs the monitoring service running at {MONITOR_API_URL}?")
+
+    def export(self):
+        out = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv"), ("NDJSON files","*.ndjson"), ("Gzipped CSV","*.csv.gz"), ("Gzipped NDJSON","*.ndjson.gz")])
+        if not out:
+            return
+        try:
+            fmt, compress = export_format_for_path(out)
+            self.ctrl.export(out, fmt, compress)
             messagebox.showinfo("Export", f"Exported to {out}")
         except Exception as e:
             messagebox.showerror("Export error", str(e))
@@ -338,8 +933,12 @@ class App:
             return
         try:
             self.ctrl.clear_db()
-            for iid in self.tree.get_children():
-                self.tree.delete(iid)
+            self.pending.clear()
+            self.responses.clear()
+            self.dropped = False
+            self.tree.delete(*self.tree.get_children())
+            self.ep_tree.delete(*self.ep_tree.get_children())
+            self.ep_samples = {}
         except Exception as e:
             messagebox.showerror("Clear error", str(e))
 
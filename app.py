@@ -2,18 +2,44 @@ import sqlite3
 import threading
 import time
 import os
+import sys
 import json
 import math
 import smtplib
-from flask import Flask, jsonify, request, send_from_directory
+import asyncio
+import heapq
+import itertools
+import random
+import weakref
+import bisect
+import queue
+import struct
+import re
+import functools
+import signal
+import atexit
+import argparse
+from contextlib import contextmanager
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
+from urllib.request import pathname2url
 import socket
 import ssl
-import requests
+import ipaddress
+import http.client
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime, timedelta
+from stream_export import EXPORT_FORMATS, export_chunks
+from metrics import SIZE_BUCKETS, MetricsRegistry, SamplingProfiler
+try:
+    import dns.resolver  # optional: gives the DNS cache real record TTLs
+except ImportError:
+    dns = None
 
 # --- Configuration ---
 SIMPLE_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
@@ -22,12 +48,87 @@ ADVANCED_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "
 app = Flask(__name__, static_folder=SIMPLE_STATIC_DIR)
 CORS(app)
 
-DATA_FILE = "api_logs.json"
+DATA_FILE = "api_logs.json"  # legacy simple-checker log, migrated into LOG_STORE_FILE on first start
+LOG_STORE_FILE = "api_logs.ndjson"
 DATABASE_FILE = "monitoring.db"
+PROBE_CONCURRENCY = int(os.environ.get("PROBE_CONCURRENCY", 50))  # checks in flight at once
+PROBE_PER_HOST_CONCURRENCY = int(os.environ.get("PROBE_PER_HOST_CONCURRENCY", 4))  # checks in flight per hostname
+PROBE_TIMEOUT = 10  # seconds, per socket operation
+BATCH_CHECK_CONCURRENCY = int(os.environ.get("BATCH_CHECK_CONCURRENCY", 32))  # probes in flight across all /check_api/batch requests
+BATCH_CHECK_MAX_URLS = 1000
+PROBE_MAX_REDIRECTS = 5
+PROBE_KEEP_ALIVE = os.environ.get("PROBE_KEEP_ALIVE", "0") == "1"  # reuse warm connections between checks
+KEEP_ALIVE_IDLE_SECONDS = 120  # pooled connections idle longer than this are dropped
+DNS_CACHE_ENABLED = os.environ.get("DNS_CACHE", "1") == "1"  # share resolved addresses between probes until they expire
+DNS_DEFAULT_TTL = int(os.environ.get("DNS_DEFAULT_TTL", 60))  # seconds an entry is kept when the record TTL is unknown
+DNS_MAX_TTL = 3600
+DNS_TTL_LOOKUP_TIMEOUT = 2  # seconds for the background record-TTL query; the default TTL is kept if it fails
+HOSTS_FILE = os.path.join(os.environ.get("SystemRoot", r"C:\Windows"), "System32", "drivers", "etc", "hosts") if os.name == "nt" else "/etc/hosts"
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", 1024 * 1024))  # default cap on body bytes read per check
+BODY_CHUNK_BYTES = 64 * 1024
+BODY_MATCH_OVERLAP = 4096  # bytes of the previous chunk kept so a regex match can span two chunks
+SCHEDULER_JITTER = float(os.environ.get("SCHEDULER_JITTER", 0.1))  # spread first checks over this fraction of the interval
+MIN_CHECK_INTERVAL_SECONDS = 5
+WORKER_SHARDS = int(os.environ.get("WORKER_SHARDS", 64))  # monitors are split between workers by id % WORKER_SHARDS; every worker must agree
+WORKER_LEASE_SECONDS = float(os.environ.get("WORKER_LEASE_SECONDS", 15))  # a crashed worker's shards are taken over once its leases run out
+WORKER_RESYNC_SECONDS = float(os.environ.get("WORKER_RESYNC_SECONDS", 5))  # how often a worker renews its leases and re-reads its monitors
+CHECK_RELAY_INTERVAL = 0.5  # seconds between polls for checks written by standalone workers
+WRITER_BATCH_SIZE = int(os.environ.get("WRITER_BATCH_SIZE", 200))  # results per group commit
+WRITER_MAX_DELAY = float(os.environ.get("WRITER_MAX_DELAY", 0.25))  # seconds a result may wait before it is committed
+READ_POOL_SIZE = int(os.environ.get("READ_POOL_SIZE", 8))
+HISTORY_PAGE_SIZE = 15
+HISTORY_COUNT_TTL = 60  # seconds a monitor's cached history count is reused
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)  # seconds per rollup bucket: minute, hour, day
+SKETCH_RELATIVE_ACCURACY = 0.01  # quantiles from sketches are within 1% of the true value
+SUMMARY_DEFAULT_POINTS = 120
+LIFETIME_RESOLUTION = 0  # one rollup per monitor covering its whole history
+ROLLUP_FLUSH_SECONDS = float(os.environ.get("ROLLUP_FLUSH_SECONDS", 30))  # hour, day and lifetime rollups are written at least this often (minute ones every batch)
+PHASE_COLUMNS = {"dns": "dns_lookup_ms", "tcp": "tcp_connection_ms", "tls": "tls_handshake_ms",
+                 "server_processing": "server_processing_ms", "content_download": "content_download_ms"}
+RAW_RETENTION_DAYS = float(os.environ.get("RAW_RETENTION_DAYS", 7))  # raw monitoring_logs rows
+MINUTE_ROLLUP_RETENTION_DAYS = float(os.environ.get("MINUTE_ROLLUP_RETENTION_DAYS", 90))  # hourly, daily and lifetime rollups are kept
+SSE_HEARTBEAT_SECONDS = 15
+SSE_SUBSCRIBER_BACKLOG = 1000  # events queued for one dashboard before it is disconnected as too slow
+COMPACTION_INTERVAL_SECONDS = int(os.environ.get("COMPACTION_INTERVAL_SECONDS", 3600))
+COMPACTION_BATCH_SIZE = 500  # rows per delete transaction, so writers and readers are never blocked for long
+COMPACTION_PAUSE_SECONDS = 0.05  # pause between delete batches
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 465))
+SMTP_SECURITY = os.environ.get("SMTP_SECURITY", "ssl")  # ssl, starttls or none (local relays and test servers)
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+ALERT_SENDER = os.environ.get("ALERT_SENDER", SMTP_USERNAME)  # alerts are disabled when empty
+ALERT_DIGEST_WINDOW = float(os.environ.get("ALERT_DIGEST_WINDOW", 10))  # seconds one recipient's alerts are collected into one email
+ALERT_MAX_RETRIES = 5
+ALERT_RETRY_BASE_SECONDS = 2  # first retry delay, doubled for each further attempt
+ALERT_SMTP_IDLE_SECONDS = 60  # the reused SMTP connection is closed after this long without sending
+# window -> (seconds, rollup resolution); each answer merges a bounded number of rollup rows
+PERCENTILE_WINDOWS = {"1h": (3600, 60), "24h": (86400, 3600), "7d": (7 * 86400, 86400), "30d": (30 * 86400, 86400), "all": (None, LIFETIME_RESOLUTION)}
+
+# --- Self-Metrics ---
+# Histograms are observed on the hot paths; gauges are read from the live objects when /metrics is scraped.
+metrics = MetricsRegistry()
+SCHEDULER_LAG = metrics.histogram("apimon_scheduler_lag_seconds", "Time between a monitor falling due and its check being dispatched.")
+PROBE_SLOT_WAIT = metrics.histogram("apimon_probe_slot_wait_seconds", "Time a dispatched check waited for a global and per-host probe slot.")
+CHECK_DURATION = metrics.histogram("apimon_check_duration_seconds", "Wall time of perform_latency_check.", labels=("source", "outcome"))
+DB_SECONDS = metrics.histogram("apimon_db_seconds", "Time spent in SQLite: write batches, read pool checkouts, lease syncs and compaction runs.", labels=("op",))
+WRITE_BATCH_SIZE = metrics.histogram("apimon_db_write_batch_size", "Check results committed per writer transaction.", buckets=SIZE_BUCKETS)
+SMTP_SECONDS = metrics.histogram("apimon_smtp_send_seconds", "Time spent connecting to SMTP and sending one alert email.", labels=("result",))
+CHECKS_DROPPED = metrics.counter("apimon_checks_dropped", "Monitor checks dropped because this process stopped owning the monitor, before probing or before writing.", labels=("stage",))
+ROUTE_SECONDS = metrics.histogram("apimon_http_request_seconds", "Flask route latency until the response is returned (streamed bodies excluded).", labels=("method", "route", "status"))
+profiler = SamplingProfiler()
 
 # --- Database Setup ---
 def init_db():
-    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+    conn = sqlite3.connect(DATABASE_FILE, timeout=60, check_same_thread=False)  # waits out another process's migration
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # only takes effect before the first table is created
+    for attempt in range(50):
+        # Persistent: readers no longer block on the writer. The switch skips the busy timeout when
+        # processes starting together race for it, so it is retried here.
+        try: conn.execute("PRAGMA journal_mode=WAL"); break
+        except sqlite3.OperationalError:
+            if attempt == 49: raise
+            time.sleep(0.1)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS monitored_apis (
@@ -47,117 +148,1479 @@ def init_db():
         )
     ''')
     conn.commit()
+    migrate_db(conn)
     conn.close()
 
-# --- Email Alerting ---
-def send_downtime_alert(api, error_message):
-    SENDER_EMAIL = "kabhilan2905@gmail.com"
-    SENDER_PASSWORD = "iycq ldeq qhds ekee"
-    
-    receiver_email = api.get('notification_email')
-    if not receiver_email:
-        return
-
-    subject = f"API Alert: {api['url']} is Down"
-    body = f"""
-    Hello,
-    An alert has been triggered for an API you are monitoring.
-
-    URL: {api['url']}
-    Category: {api.get('category', 'N/A')}
-    Status: Down / Error
-    Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-    Details:
-    {error_message}
-
-    The system will not send further notifications until it is operational again.
+# Schema changes after the original tables, applied in order and tracked with PRAGMA user_version.
+SCHEMA_MIGRATIONS = [
+    # 1: keep-alive probes record whether the measured request reused a warm connection
+    ("ALTER TABLE monitoring_logs ADD COLUMN connection_reused BOOLEAN DEFAULT 0",),
+    # 2: history pages seek on (api_id, timestamp, id) instead of sorting a monitor's whole history
+    ("CREATE INDEX IF NOT EXISTS idx_monitoring_logs_api_ts ON monitoring_logs (api_id, timestamp, id)",),
+    # 3: per-monitor rollups maintained by CheckWriter
+    ('''CREATE TABLE IF NOT EXISTS monitoring_rollups (
+            api_id INTEGER NOT NULL, resolution INTEGER NOT NULL, bucket_start INTEGER NOT NULL,
+            check_count INTEGER NOT NULL, up_count INTEGER NOT NULL, error_count INTEGER NOT NULL,
+            latency_count INTEGER NOT NULL, latency_sum REAL NOT NULL, latency_min REAL, latency_max REAL, latency_sketch BLOB,
+            PRIMARY KEY (api_id, resolution, bucket_start)
+        ) WITHOUT ROWID''',),
+    # 4: per-phase latency sketches on every rollup; rollups are rebuilt from the raw history
+    tuple(f"ALTER TABLE monitoring_rollups ADD COLUMN {phase}_sketch BLOB" for phase in PHASE_COLUMNS)
+    + ("DELETE FROM monitoring_rollups", lambda conn: backfill_rollups(conn)),
+    # 5: retention: the compactor deletes by age, and freed pages are returned with incremental vacuum
+    ("CREATE INDEX IF NOT EXISTS idx_monitoring_logs_ts ON monitoring_logs (timestamp)",
+     "CREATE INDEX IF NOT EXISTS idx_monitoring_rollups_age ON monitoring_rollups (resolution, bucket_start)",
+     "PRAGMA auto_vacuum = INCREMENTAL", "VACUUM"),
+    # 6: per-monitor opt-out of the DNS cache, and whether each check's lookups were all cache hits
+    ("ALTER TABLE monitored_apis ADD COLUMN cold_dns BOOLEAN DEFAULT 0",
+     "ALTER TABLE monitoring_logs ADD COLUMN dns_cached BOOLEAN DEFAULT 0"),
+    # 7: per-monitor content assertions and body size cap
+    ("ALTER TABLE monitored_apis ADD COLUMN expected_status TEXT",
+     "ALTER TABLE monitored_apis ADD COLUMN body_assertion TEXT",
+     "ALTER TABLE monitored_apis ADD COLUMN max_body_bytes INTEGER"),
+    # 8: worker processes heartbeat here and lease shards of monitored_apis
+    ("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, hostname TEXT, pid INTEGER, started_at REAL, heartbeat_at REAL NOT NULL)",
+     "CREATE TABLE IF NOT EXISTS worker_leases (shard INTEGER PRIMARY KEY, worker_id TEXT, expires_at REAL NOT NULL DEFAULT 0)"),
+]
+
+def migrate_db(conn):
+    """Applies the pending SCHEMA_MIGRATIONS, one BEGIN IMMEDIATE transaction per step.
+
+    user_version is re-read inside each transaction, so when several processes start on the same
+    database at once, a step another process has just applied is skipped rather than run twice.
     """
+    isolation_level, conn.isolation_level = conn.isolation_level, None  # transactions are explicit below
     try:
-        msg = MIMEMultipart(); msg["From"], msg["To"], msg["Subject"] = SENDER_EMAIL, receiver_email, subject
+        for number, statements in enumerate(SCHEMA_MIGRATIONS, start=1):
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= number: continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    conn.execute("ROLLBACK"); continue
+                deferred = []
+                for stmt in statements:
+                    if callable(stmt): stmt(conn)  # data migrations
+                    elif stmt == "VACUUM": deferred.append(stmt)  # cannot run inside a transaction
+                    else: conn.execute(stmt)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction: conn.execute("ROLLBACK")
+                raise
+            for stmt in deferred: conn.execute(stmt)
+    finally:
+        conn.isolation_level = isolation_level
+
+# --- Email Alerting ---
+class AlertDispatcher:
+    """Delivers downtime and recovery emails off the check path.
+
+    notify() only queues. One thread collects each recipient's alerts for digest_window
+    seconds and sends them as one email (the latest state per monitor), over a single SMTP
+    connection that is reused until it has been idle for ALERT_SMTP_IDLE_SECONDS. A failed
+    send is retried with exponential backoff, up to max_retries times.
+    """
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, security=SMTP_SECURITY, username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                 sender=ALERT_SENDER, digest_window=ALERT_DIGEST_WINDOW, max_retries=ALERT_MAX_RETRIES, retry_base=ALERT_RETRY_BASE_SECONDS):
+        self.host, self.port, self.security = host, port, security
+        self.username, self.password, self.sender = username, password, sender
+        self.digest_window, self.max_retries, self.retry_base = digest_window, max_retries, retry_base
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "connections": 0}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._digests = {}  # recipient -> (deadline, {api_id: alert})
+        self._outbox = []  # heap of (send_at, seq, recipient, subject, body, attempt)
+        self._seq = itertools.count()
+        self._smtp, self._smtp_used = None, 0.0
+        self._delivering = False
+
+    def start(self):
+        if self._thread is None:
+            if not self.sender:
+                print("⚠️ ALERT_SENDER / SMTP_USERNAME not set; downtime emails are disabled.")
+            self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self, api, kind, detail=""):
+        """Queues a "down" or "recovered" alert for the monitor's notification_email."""
+        recipient = api.get('notification_email')
+        if not recipient or not self.sender: return
+        self.stats["queued"] += 1
+        self._queue.put((recipient, {"api_id": api['id'], "url": api['url'], "category": api.get('category') or 'N/A',
+                                     "kind": kind, "detail": detail, "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}))
+
+    def pending(self):
+        return self._queue.qsize() + sum(len(alerts) for _, alerts in self._digests.values()) + len(self._outbox) + self._delivering
+
+    def _next_wakeup(self):
+        deadlines = [deadline for deadline, _ in self._digests.values()] + [item[0] for item in self._outbox[:1]]
+        if self._smtp: deadlines.append(self._smtp_used + ALERT_SMTP_IDLE_SECONDS)
+        return max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    def stop(self, timeout=None):
+        """Sends every queued alert and open digest now (retries skip their backoff), then ends the thread."""
+        if self._thread is not None:
+            self._queue.put(None); self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while True:
+            try:
+                item = self._queue.get(timeout=0 if stopping else self._next_wakeup())
+                if item is None:
+                    stopping = True; continue
+                recipient, alert = item
+                deadline, alerts = self._digests.setdefault(recipient, (time.monotonic() + self.digest_window, {}))
+                alerts[alert["api_id"]] = alert  # a later transition of the same monitor replaces the earlier one
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            for recipient in [r for r, (deadline, _) in self._digests.items() if stopping or deadline <= now]:
+                subject, body = self._compose(list(self._digests.pop(recipient)[1].values()))
+                heapq.heappush(self._outbox, (now, next(self._seq), recipient, subject, body, 0))
+            while self._outbox and (stopping or self._outbox[0][0] <= now):
+                self._delivering = True
+                try: self._deliver(*heapq.heappop(self._outbox)[2:])
+                finally: self._delivering = False
+            if self._smtp and (stopping or time.monotonic() - self._smtp_used >= ALERT_SMTP_IDLE_SECONDS):
+                self._disconnect()
+            if stopping and self._queue.empty() and not self._digests: return
+
+    def _compose(self, alerts):
+        down = [a for a in alerts if a["kind"] == "down"]; recovered = [a for a in alerts if a["kind"] == "recovered"]
+        if len(alerts) == 1:
+            a = alerts[0]
+            subject = f"API Alert: {a['url']} is Down" if down else f"API Recovered: {a['url']} is Up"
+        else:
+            subject = "API Alert: " + ", ".join(part for part in (f"{len(down)} down" if down else "", f"{len(recovered)} recovered" if recovered else "") if part)
+        lines = ["Hello,", "", "The following APIs you are monitoring changed state:" if len(alerts) > 1 else "An alert has been triggered for an API you are monitoring.", ""]
+        for a in down + recovered:
+            lines += [f"URL: {a['url']}", f"Category: {a['category']}", f"Status: {'Down / Error' if a['kind'] == 'down' else 'Up (recovered)'}", f"Time: {a['time']}"]
+            if a["detail"]: lines += ["Details:", a["detail"]]
+            lines.append("")
+        lines.append("You will be notified again when the state of these APIs changes.")
+        return subject, "\n".join(lines)
+
+    def _connect(self):
+        if self.security == "ssl": smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=PROBE_TIMEOUT)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=PROBE_TIMEOUT)
+            if self.security == "starttls": smtp.starttls()
+        if self.username: smtp.login(self.username, self.password)
+        self.stats["connections"] += 1
+        return smtp
+
+    def _disconnect(self):
+        try: self._smtp.quit()
+        except (smtplib.SMTPException, OSError): pass
+        self._smtp = None
+
+    def _deliver(self, recipient, subject, body, attempt):
+        msg = MIMEMultipart(); msg["From"], msg["To"], msg["Subject"] = self.sender, recipient, subject
         msg.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.sendmail(SENDER_EMAIL, receiver_email, msg.as_string())
-        print(f"✅ Downtime alert sent to {receiver_email} for URL {api['url']}")
-    except Exception as e:
-        print(f"❌ Failed to send downtime alert for {api['url']}: {e}")
+        for reconnect in (False, True):
+            started = time.perf_counter()
+            try:
+                if self._smtp is None: self._smtp = self._connect()
+                self._smtp.sendmail(self.sender, recipient, msg.as_string())
+                self._smtp_used = time.monotonic(); self.stats["sent"] += 1
+                SMTP_SECONDS.observe(time.perf_counter() - started, "sent")
+                print(f"✅ Alert sent to {recipient}: {subject}")
+                return
+            except smtplib.SMTPServerDisconnected:
+                SMTP_SECONDS.observe(time.perf_counter() - started, "disconnected")
+                self._smtp = None  # the reused connection went stale; one fresh connection is not a retry
+                if reconnect: break
+            except (smtplib.SMTPException, OSError) as e:
+                SMTP_SECONDS.observe(time.perf_counter() - started, "failed")
+                print(f"❌ Failed to send alert to {recipient} (attempt {attempt + 1}): {e}")
+                if self._smtp: self._disconnect()
+                break
+        if attempt + 1 >= self.max_retries:
+            self.stats["failed"] += 1
+            print(f"❌ Giving up on alert to {recipient}: {subject}")
+            return
+        self.stats["retries"] += 1
+        heapq.heappush(self._outbox, (time.monotonic() + self.retry_base * 2 ** attempt, next(self._seq), recipient, subject, body, attempt + 1))
+
+alert_dispatcher = AlertDispatcher()
 
 # --- Core Helper Functions ---
-def perform_latency_check(url, headers={}):
-    parsed_url = urlparse(url); host = parsed_url.hostname
-    if not host: raise ValueError("Invalid URL: Host not found")
-    port = 443 if parsed_url.scheme == "https" else 80
-    t1 = time.time(); ip = socket.gethostbyname(host); dns_lookup = (time.time() - t1) * 1000
-    t2 = time.time(); sock = socket.create_connection((ip, port), timeout=10); tcp_conn = (time.time() - t2) * 1000
-    tls_handshake = 0
-    if parsed_url.scheme == "https":
-        t3 = time.time(); context = ssl.create_default_context(); sock = context.wrap_socket(sock, server_hostname=host); tls_handshake = (time.time() - t3) * 1000
-    sock.close()
-    t4 = time.time(); response = requests.get(url, timeout=10, headers=headers); t5 = time.time()
-    content_type = response.headers.get('Content-Type', '').lower()
-    server_processing = response.elapsed.total_seconds() * 1000
-    content_download = ((t5 - t4) * 1000) - server_processing
+class DnsCache:
+    """Resolved addresses shared by all probes, kept until their TTL runs out.
+
+    Addresses come from the system resolver (getaddrinfo), so hosts files and IPv6/IPv4
+    preference order are respected, and every address is kept for connection fallback.
+    An entry lives for default_ttl; with dnspython installed, one background query for the record
+    then moves its expiry to the record's TTL, so probes never wait on the extra lookup. Names
+    answered from the hosts file keep default_ttl. cold=True always asks the resolver, for monitors
+    that measure real DNS latency.
+    """
+    def __init__(self, enabled=DNS_CACHE_ENABLED, default_ttl=DNS_DEFAULT_TTL, max_ttl=DNS_MAX_TTL):
+        self.enabled, self.default_ttl, self.max_ttl = enabled, default_ttl, max_ttl
+        self.stats = {"hits": 0, "misses": 0, "cold": 0, "errors": 0}
+        self._entries = {}  # host -> (expires_at, [(family, sockaddr)])
+        self._lock = threading.Lock()
+        self._ttl_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dns-ttl") if dns is not None else None
+        self._hosts_file = (None, frozenset())  # (mtime, names listed in HOSTS_FILE)
+
+    def resolve(self, host, cold=False):
+        """Returns ([(family, sockaddr)], from_cache); IP literals never touch the resolver."""
+        try:
+            ip = ipaddress.ip_address(host)
+            return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, (host, 0))], False
+        except ValueError:
+            pass
+        if self.enabled and not cold:
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry and entry[0] > time.monotonic():
+                    self.stats["hits"] += 1
+                    return entry[1], True
+        try:
+            addresses = list(dict.fromkeys((family, sockaddr) for family, _, _, _, sockaddr in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)))
+        except OSError:
+            with self._lock: self.stats["errors"] += 1
+            raise
+        with self._lock:
+            self.stats["cold" if cold else "misses"] += 1
+            if self.enabled: self._entries[host] = (time.monotonic() + self.default_ttl, addresses)
+        if self.enabled and self._ttl_pool is not None and not self._in_hosts_file(host):
+            self._ttl_pool.submit(self._apply_record_ttl, host, addresses)
+        return addresses, False
+
+    def lookup_counts(self):
+        with self._lock: return dict(self.stats)
+
+    def _in_hosts_file(self, host):
+        try: mtime = os.path.getmtime(HOSTS_FILE)
+        except OSError: return False
+        if self._hosts_file[0] != mtime:
+            names = set()
+            try:
+                with open(HOSTS_FILE, encoding="utf-8", errors="replace") as f:
+                    for line in f: names.update(name.lower() for name in line.split("#", 1)[0].split()[1:])
+            except OSError: pass
+            self._hosts_file = (mtime, frozenset(names))
+        return host.lower().rstrip(".") in self._hosts_file[1]
+
+    def _apply_record_ttl(self, host, addresses):
+        # One query, for the family getaddrinfo put first; any failure keeps default_ttl.
+        rdtype = "AAAA" if addresses and addresses[0][0] == socket.AF_INET6 else "A"
+        try: ttl = dns.resolver.resolve(host, rdtype, lifetime=DNS_TTL_LOOKUP_TIMEOUT).rrset.ttl
+        except Exception: return
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry and entry[1] is addresses:  # not replaced by a newer lookup meanwhile
+                self._entries[host] = (time.monotonic() + min(ttl, self.max_ttl), addresses)
+
+    def snapshot(self):
+        now = time.monotonic()
+        stats = self.lookup_counts()
+        with self._lock: entries = list(self._entries.items())
+        lookups = stats["hits"] + stats["misses"]
+        return {**stats, "enabled": self.enabled, "record_ttls": dns is not None, "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else None,
+                "entries": [{"host": host, "addresses": [sockaddr[0] for _, sockaddr in addresses], "expires_in": round(expires_at - now, 1)}
+                            for host, (expires_at, addresses) in sorted(entries) if expires_at > now]}
+
+dns_cache = DnsCache()
+
+def _connect_any(addresses, port, timeout=PROBE_TIMEOUT):
+    # Tries each resolved address in resolver order (IPv6 and IPv4) until one accepts.
+    last_error = None
+    for family, sockaddr in addresses:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect((sockaddr[0], port) + tuple(sockaddr[2:]))
+            return sock
+        except OSError as e:
+            sock.close(); last_error = e
+    raise last_error or OSError("No addresses to connect to")
+
+_warm_connections = defaultdict(list)  # (scheme, host, port) -> [(HTTPConnection, last_used)]
+_warm_lock = threading.Lock()
+
+def _open_connection(scheme, host, port, phases, cold_dns=False, timeout=PROBE_TIMEOUT):
+    # Each phase is timed on the socket the request will actually use.
+    t = time.perf_counter(); addresses, cached = dns_cache.resolve(host, cold_dns); phases['dns'] += time.perf_counter() - t
+    phases['lookups'].append(cached)
+    t = time.perf_counter(); sock = _connect_any(addresses, port, timeout); phases['tcp'] += time.perf_counter() - t
+    if scheme == "https":
+        t = time.perf_counter()
+        try: sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        except Exception: sock.close(); raise
+        phases['tls'] += time.perf_counter() - t
+        conn = http.client.HTTPSConnection(host, port, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    conn.sock = sock  # http.client skips connect() when a socket is already attached
+    return conn
+
+def _take_warm_connection(origin):
+    with _warm_lock:
+        pool = _warm_connections[origin]
+        while pool:
+            conn, last_used = pool.pop()
+            if time.time() - last_used < KEEP_ALIVE_IDLE_SECONDS: return conn
+            conn.close()
+    return None
+
+def _return_warm_connection(origin, conn):
+    with _warm_lock: _warm_connections[origin].append((conn, time.time()))
+
+def _timed_request(conn, path, headers, phases):
+    t = time.perf_counter(); conn.request("GET", path, headers=headers); response = conn.getresponse(); phases['ttfb'] += time.perf_counter() - t
+    return response
+
+class ContentCheck:
+    """A monitor's content assertions, compiled once and reused for every check.
+
+    expected_status is a comma-separated list of codes and ranges ("200,204,300-399");
+    without it any status below 400 is healthy. body_assertion is either a JSONPath
+    ("$.data[0].state", optionally followed by "== <JSON value>") or a regular expression
+    searched for in the raw body. Regexes are matched chunk by chunk while the body streams in.
+    """
+    def __init__(self, expected_status=None, body_assertion=None):
+        self.statuses = self._parse_statuses(expected_status) if expected_status else None
+        self.regex = self.json_path = None
+        self.expected = _MISSING
+        if body_assertion and body_assertion.lstrip().startswith("$"):
+            path, has_expected, expected = body_assertion.partition("==")
+            self.json_path = self._parse_json_path(path.strip())
+            if has_expected:
+                try: self.expected = json.loads(expected.strip())
+                except ValueError: self.expected = expected.strip()
+        elif body_assertion:
+            try: self.regex = re.compile(body_assertion.encode("utf-8"))
+            except re.error as e: raise ValueError(f"Invalid body assertion regex: {e}")
+
+    @staticmethod
+    def _parse_statuses(text):
+        ranges = []
+        for part in text.replace(" ", "").split(","):
+            low, dash, high = part.partition("-")
+            if not low.isdigit() or (dash and not high.isdigit()): raise ValueError(f"Invalid expected status: {part!r}")
+            ranges.append((int(low), int(high or low)))
+        return ranges
+
+    @staticmethod
+    def _parse_json_path(path):
+        steps, pos = [], 1
+        for m in JSON_PATH_STEP.finditer(path, 1):
+            if m.start() != pos: break
+            name, index, key = m.groups()
+            steps.append(int(index) if index is not None else name if name is not None else key)
+            pos = m.end()
+        if pos != len(path): raise ValueError(f"Invalid JSONPath: {path!r}")
+        return steps
+
+    @property
+    def needs_body(self):
+        return self.regex is not None or self.json_path is not None
+
+    def status_ok(self, status):
+        if self.statuses is None: return status < 400
+        return any(low <= status <= high for low, high in self.statuses)
+
+    def evaluate_json(self, body, truncated):
+        """Returns an assertion error message, or None when the JSONPath assertion holds."""
+        if truncated: return "Body exceeds max_body_bytes; JSONPath assertion not evaluated"
+        try: value = json.loads(body)
+        except ValueError: return "Body is not valid JSON"
+        for step in self.json_path:
+            try: value = value[step]
+            except (KeyError, IndexError, TypeError): return f"JSONPath step {step!r} not found"
+        if self.expected is not _MISSING and value != self.expected:
+            return f"JSONPath value {json.dumps(value)[:100]} != {json.dumps(self.expected)}"
+        return None
+
+_MISSING = object()
+JSON_PATH_STEP = re.compile(r"""\.([A-Za-z_][\w-]*)|\[(\d+)\]|\[['"]([^'"]+)['"]\]""")
+
+@functools.lru_cache(maxsize=4096)
+def content_check(expected_status=None, body_assertion=None):
+    # Keyed on the monitor's raw settings, so each distinct assertion is compiled only once.
+    return ContentCheck(expected_status, body_assertion)
+
+def monitor_content_check(api):
+    return content_check(api.get('expected_status') or None, api.get('body_assertion') or None)
+
+def _read_body(response, phases, check, max_bytes):
+    """Streams up to max_bytes of the body, stopping early once a regex assertion matches.
+
+    Returns (bytes_read, complete, assertion_error); only a completely read response can
+    leave its connection reusable.
+    """
+    t = time.perf_counter()
+    total, window, buffered, matched = 0, b"", [], False
+    wants_json = check is not None and check.json_path is not None
+    while total < max_bytes:
+        chunk = response.read(min(BODY_CHUNK_BYTES, max_bytes - total))
+        if not chunk: break
+        total += len(chunk)
+        if wants_json: buffered.append(chunk)
+        elif check is not None and check.regex is not None:
+            window = window[-BODY_MATCH_OVERLAP:] + chunk  # keeps matches that straddle two chunks
+            if check.regex.search(window): matched = True; break
+    complete = response.isclosed()
+    phases['download'] += time.perf_counter() - t
+    error = None
+    if wants_json: error = check.evaluate_json(b"".join(buffered), truncated=not complete)
+    elif check is not None and check.regex is not None and not matched:
+        error = "Body assertion not matched" + ("" if complete else f" within the first {total} bytes")
+    return total, complete, error
+
+
+def perform_latency_check(url, headers={}, keep_alive=False, cold_dns=False, check=None, max_body_bytes=MAX_BODY_BYTES, timeout=PROBE_TIMEOUT):
+    """Probes url over one instrumented connection per hop.
+
+    The DNS, TCP, TLS, time-to-first-byte (reported as server_processing_ms) and download
+    phases all belong to the request that produced status_code; redirect hops add to them.
+    With keep_alive, an idle connection to the same origin is reused when one is pooled and
+    connection_reused tells warm measurements apart from cold ones. Names are resolved
+    through dns_cache unless cold_dns is set; dns_cached is true when every lookup was a hit.
+    At most max_body_bytes of each body are read; the final response is judged by check
+    (a ContentCheck), and a failed assertion marks the result down with assertion_error.
+    timeout bounds each socket operation.
+    """
+    phases = {'dns': 0.0, 'tcp': 0.0, 'tls': 0.0, 'ttfb': 0.0, 'download': 0.0, 'lookups': []}
+    request_headers = {"User-Agent": "API-Monitor/1.0", "Accept": "*/*", **headers}
+    reused = False
+    for _ in range(PROBE_MAX_REDIRECTS + 1):
+        parsed_url = urlparse(url); host = parsed_url.hostname
+        if not host: raise ValueError("Invalid URL: Host not found")
+        port = parsed_url.port or (443 if parsed_url.scheme == "https" else 80)
+        origin = (parsed_url.scheme, host, port)
+        path = (parsed_url.path or "/") + (f"?{parsed_url.query}" if parsed_url.query else "")
+        conn = _take_warm_connection(origin) if keep_alive else None
+        response = None
+        if conn is not None:
+            before = dict(phases)
+            try:
+                response = _timed_request(conn, path, request_headers, phases); reused = True
+            except (http.client.HTTPException, OSError):
+                conn.close(); phases.update(before)  # the server dropped the idle connection; fall back to a cold one
+        if response is None:
+            conn = _open_connection(parsed_url.scheme, host, port, phases, cold_dns, timeout)
+            try: response = _timed_request(conn, path, request_headers, phases)
+            except Exception: conn.close(); raise
+            reused = False
+        location = response.getheader('Location')
+        redirect = response.status in (301, 302, 303, 307, 308) and location
+        try: body_bytes, complete, assertion_error = _read_body(response, phases, None if redirect else check, max_body_bytes)
+        except Exception: conn.close(); raise
+        if keep_alive and complete and not response.will_close: _return_warm_connection(origin, conn)
+        else: conn.close()
+        if redirect:
+            url = urljoin(url, location); continue
+        break
+    content_type = (response.getheader('Content-Type') or '').lower()
+    dns_lookup, tcp_conn, tls_handshake, server_processing, content_download = (phases[k] * 1000 for k in ('dns', 'tcp', 'tls', 'ttfb', 'download'))
     total_latency = dns_lookup + tcp_conn + tls_handshake + server_processing + content_download
-    result = {"status_code": response.status_code, "up": response.ok, "total_latency_ms": round(total_latency, 2), "dns_lookup_ms": round(dns_lookup, 2), "tcp_connection_ms": round(tcp_conn, 2), "tls_handshake_ms": round(tls_handshake, 2), "server_processing_ms": round(server_processing, 2), "content_download_ms": round(content_download, 2), "timestamp": datetime.now().isoformat()}
+    status_ok = check.status_ok(response.status) if check else response.status < 400
+    if check and check.statuses and not status_ok: assertion_error = f"Unexpected status {response.status}"
+    result = {"status_code": response.status, "up": status_ok and assertion_error is None, "assertion_error": assertion_error, "body_bytes": body_bytes, "total_latency_ms": round(total_latency, 2), "dns_lookup_ms": round(dns_lookup, 2), "tcp_connection_ms": round(tcp_conn, 2), "tls_handshake_ms": round(tls_handshake, 2), "server_processing_ms": round(server_processing, 2), "content_download_ms": round(content_download, 2), "connection_reused": reused, "dns_cached": bool(phases['lookups']) and all(phases['lookups']), "timestamp": datetime.now().isoformat()}
     if 'application/json' in content_type or 'application/xml' in content_type: result['url_type'] = 'API'
     else: result['url_type'] = 'Other'
     return result
 
-# --- Background Worker ---
-def monitor_worker():
-    print("🚀 Advanced Monitoring worker started.")
+# --- Concurrent Probe Engine ---
+def monitor_headers(api):
+    return {api.get('header_name'): api.get('header_value')} if api.get('header_name') else {}
+
+class ProbeEngine:
+    """Runs perform_latency_check for many monitors in parallel.
+
+    Probes are dispatched from an asyncio loop onto a thread pool, bounded by a
+    global limit and a per-hostname limit so one slow host cannot take every slot.
+    on_result(api, result, error) is called on the caller's thread as each probe finishes.
+    A probe whose wanted(api) is false once it gets its slots is skipped without a result.
+    """
+    def __init__(self, concurrency=PROBE_CONCURRENCY, per_host_concurrency=PROBE_PER_HOST_CONCURRENCY, keep_alive=PROBE_KEEP_ALIVE):
+        self.concurrency = max(1, concurrency)
+        self.keep_alive = keep_alive
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="probe")
+        self._loop_limits = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+
+    def _limits(self):
+        # asyncio primitives belong to one event loop, so each loop gets its own set.
+        loop = asyncio.get_running_loop()
+        if loop not in self._loop_limits:
+            self._loop_limits[loop] = (asyncio.Semaphore(self.concurrency), defaultdict(lambda: asyncio.Semaphore(self.per_host_concurrency)))
+        return self._loop_limits[loop]
+
+    async def probe(self, api, on_result, wanted=None):
+        global_limit, host_limits = self._limits()
+        queued_at = time.perf_counter()
+        # Take the host slot first so a throttled host never holds a global slot while waiting.
+        async with host_limits[urlparse(api['url']).hostname or ""], global_limit:
+            started = time.perf_counter(); PROBE_SLOT_WAIT.observe(started - queued_at)
+            if wanted is not None and not wanted(api): return  # e.g. its shard moved while it waited for a slot
+            self.in_flight += 1
+            try:
+                res, error = await asyncio.get_running_loop().run_in_executor(self._pool, perform_latency_check, api['url'], monitor_headers(api), self.keep_alive,
+                                                                                  bool(api.get('cold_dns')), monitor_content_check(api), api.get('max_body_bytes') or MAX_BODY_BYTES), None
+            except Exception as e:
+                res, error = None, e
+            finally:
+                self.in_flight -= 1
+            CHECK_DURATION.observe(time.perf_counter() - started, "monitor", check_status(res, error).lower())
+        on_result(api, res, error)
+
+    async def _run(self, apis, on_result):
+        await asyncio.gather(*(self.probe(api, on_result) for api in apis))
+
+    def run(self, apis, on_result):
+        if apis: asyncio.run(self._run(apis, on_result))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+# --- Due-Time Scheduler ---
+def check_interval_seconds(api):
+    return max(float(api['check_frequency_minutes']) * 60, MIN_CHECK_INTERVAL_SECONDS)
+
+class MonitorScheduler:
+    """Min-heap of active monitors keyed on next-due time.
+
+    Heap entries are (due_at, seq, api_id); an entry is live only while its seq matches the
+    monitor's current one, so upserts and removals just bump or drop the seq and stale
+    entries are skipped when they surface. A monitor popped for checking stays known but has
+    no live entry until reschedule() is called with its due time. After close() it holds nothing,
+    ignores further loads and wait_for_due() returns right away.
+    """
+    def __init__(self, jitter=SCHEDULER_JITTER, clock=time.time):
+        self.jitter, self.clock = jitter, clock
+        self._heap = []
+        self._apis = {}  # api_id -> monitor row (dict)
+        self._live_seq = {}  # api_id -> seq of its live heap entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def __len__(self):
+        return len(self._apis)
+
+    def __contains__(self, api_id):
+        with self._cond: return api_id in self._apis
+
+    def _push(self, api_id, due_at):
+        seq = next(self._seq); self._live_seq[api_id] = seq
+        heapq.heappush(self._heap, (due_at, seq, api_id))
+
+    def _first_due(self, api):
+        # New monitors run right away; known ones keep their cadence. Jitter spreads a backlog of
+        # overdue monitors (e.g. after a restart) instead of firing them all in the same instant.
+        if api.get('last_checked_at') is None: return self.clock()
+        interval = check_interval_seconds(api)
+        return max(self.clock(), api['last_checked_at'] + interval) + random.uniform(0, self.jitter * interval)
+
+    def load(self, apis):
+        with self._cond:
+            if self.closed: return
+            self._heap, self._apis, self._live_seq = [], {}, {}
+            for api in apis:
+                self._apis[api['id']] = api; self._push(api['id'], self._first_due(api))
+            self._cond.notify_all()
+
+    def upsert(self, api):
+        with self._cond:
+            if self.closed: return
+            self._apis[api['id']] = api; self._push(api['id'], self._first_due(api))
+            self._cond.notify_all()
+
+    def remove(self, api_id):
+        with self._cond:
+            self._apis.pop(api_id, None); self._live_seq.pop(api_id, None)
+            self._cond.notify_all()
+
+    def sync(self, apis):
+        """Makes the scheduled monitors exactly `apis`. Unchanged monitors keep their due time;
+        new or edited ones are scheduled as by upsert() and missing ones are dropped."""
+        with self._cond:
+            if self.closed: return
+            current = {}
+            for api in apis:
+                known = self._apis.get(api['id'])
+                if known is None or any(known.get(k) != v for k, v in api.items() if k not in SCHEDULER_VOLATILE_COLUMNS):
+                    self._apis[api['id']] = api; self._push(api['id'], self._first_due(api))
+                current[api['id']] = self._apis[api['id']]
+            for api_id in self._apis.keys() - current.keys(): self._live_seq.pop(api_id, None)
+            self._apis = current
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._heap, self._apis, self._live_seq = [], {}, {}
+            self._cond.notify_all()
+
+    def reschedule(self, api_id, last_due):
+        with self._cond:
+            api = self._apis.get(api_id)
+            if api is None or api_id in self._live_seq: return  # deleted, or edited while in flight
+            interval = check_interval_seconds(api)
+            self._push(api_id, max(last_due + interval, self.clock()))
+            self._cond.notify_all()
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, seq, api_id = heapq.heappop(self._heap)
+            if self._live_seq.get(api_id) != seq: continue
+            del self._live_seq[api_id]
+            due.append((self._apis[api_id], due_at))
+        return due
+
+    def _next_due_at(self):
+        while self._heap and self._live_seq.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def wait_for_due(self, timeout=None):
+        """Blocks until at least one monitor is due (or timeout) and returns [(api, due_at)]."""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while True:
+                now = self.clock()
+                due = self._pop_due(now)
+                if due or self.closed or (deadline is not None and now >= deadline): return due
+                next_due = self._next_due_at()
+                waits = [t - now for t in (next_due, deadline) if t is not None]
+                self._cond.wait(min(waits) if waits else None)
+
+SCHEDULER_VOLATILE_COLUMNS = ("last_checked_at", "last_status")  # written by the worker itself, so not an edit
+
+scheduler = MonitorScheduler()
+
+def sync_scheduler(conn, api_id):
+    # Called after add/update/delete so the worker's next wake-up reflects the table right away.
+    # Standalone workers pick the change up on their next resync instead.
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM monitored_apis WHERE id = ?", (api_id,)).fetchone()
+    if row is None or not row['is_active'] or not shard_leases.owns(api_id): scheduler.remove(api_id)
+    else: scheduler.upsert(dict(row))
+
+# --- Worker Shard Leases ---
+class ShardLeases:
+    """Splits monitored_apis between worker processes through leases in the shared database.
+
+    Monitor `id` belongs to shard id % shards. On every sync() a worker heartbeats into `workers`,
+    renews the leases it holds and then claims or releases shards until it holds its fair share of
+    what the live workers need. Only unheld or expired leases are claimed, so a shard has one owner
+    at a time, and a crashed worker's shards move once its leases run out.
+    """
+    def __init__(self, path=DATABASE_FILE, shards=WORKER_SHARDS, lease_seconds=WORKER_LEASE_SECONDS, clock=time.time):
+        self.path, self.shards, self.lease_seconds, self.clock = path, shards, lease_seconds, clock
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(3).hex()}"
+        self.owned = frozenset()
+        self.expires_at = 0.0
+        self.released = False
+        self._started_at = clock()
+
+    def owns(self, api_id):
+        # A lease that ran out without a successful renewal may already belong to another worker.
+        return self.clock() < self.expires_at and api_id % self.shards in self.owned
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.lease_seconds / 3, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def sync(self):
+        """Heartbeats, renews and rebalances this worker's leases; returns the shards it now holds."""
+        if self.released: return self.owned
+        now = self.clock()
+        conn = self._connect()
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")  # one worker rebalances at a time
+            conn.execute("INSERT INTO workers (worker_id, hostname, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?) "
+                         "ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                         (self.worker_id, socket.gethostname(), os.getpid(), self._started_at, now))
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - 10 * self.lease_seconds,))
+            conn.executemany("INSERT OR IGNORE INTO worker_leases (shard) VALUES (?)", ((shard,) for shard in range(self.shards)))
+            live = conn.execute("SELECT COUNT(*) FROM workers WHERE heartbeat_at > ?", (now - self.lease_seconds,)).fetchone()[0]
+            fair_share = math.ceil(self.shards / max(live, 1))
+            owned = [r[0] for r in conn.execute("SELECT shard FROM worker_leases WHERE worker_id = ? AND expires_at > ? AND shard < ? ORDER BY shard",
+                                                (self.worker_id, now, self.shards))]
+            if len(owned) > fair_share:  # a worker joined: hand the surplus back for it to claim
+                surplus, owned = owned[fair_share:], owned[:fair_share]
+                conn.executemany("UPDATE worker_leases SET worker_id = NULL, expires_at = 0 WHERE shard = ?", ((shard,) for shard in surplus))
+            elif len(owned) < fair_share:
+                owned += [r[0] for r in conn.execute("SELECT shard FROM worker_leases WHERE shard < ? AND (worker_id IS NULL OR expires_at <= ?) ORDER BY shard LIMIT ?",
+                                                     (self.shards, now, fair_share - len(owned)))]
+            expires_at = now + self.lease_seconds
+            conn.executemany("UPDATE worker_leases SET worker_id = ?, expires_at = ? WHERE shard = ?", ((self.worker_id, expires_at, shard) for shard in owned))
+            conn.execute("COMMIT")
+            self.owned, self.expires_at = frozenset(owned), expires_at
+        except sqlite3.Error as e:
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            print(f"❌ Lease sync failed for worker {self.worker_id}: {e}")
+            if self.clock() >= self.expires_at: self.owned = frozenset()  # the leases may already belong to someone else
+        finally:
+            conn.close()
+            DB_SECONDS.observe(time.perf_counter() - started, "lease_sync")
+        return self.owned
+
+    def release(self):
+        """Gives every lease back at once so other workers take over without waiting for expiry."""
+        self.released, self.owned = True, frozenset()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE worker_leases SET worker_id = NULL, expires_at = 0 WHERE worker_id = ?", (self.worker_id,))
+                conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+        finally:
+            conn.close()
+
+    def snapshot(self):
+        return {"worker_id": self.worker_id, "shards": self.shards, "owned": sorted(self.owned), "expires_at": self.expires_at}
+
+shard_leases = ShardLeases()
+
+def owned_monitors(conn, shards, owned):
+    if not owned: return []
+    marks = ",".join("?" * len(owned))
+    return [dict(row) for row in conn.execute(f"SELECT * FROM monitored_apis WHERE is_active = 1 AND id % ? IN ({marks})", (shards, *owned))]
+
+def resync_worker(interval=WORKER_RESYNC_SECONDS):
+    """Keeps this process's leases renewed and the scheduler holding exactly the monitors of its shards."""
+    while not shard_leases.released:
+        try:
+            owned = shard_leases.sync()
+            with read_pool.connection() as conn:
+                scheduler.sync(owned_monitors(conn, shard_leases.shards, owned))
+        except Exception as e:
+            print(f"❌ Worker resync failed: {e}")
+        time.sleep(interval)
+
+# --- Rollups and Latency Sketches ---
+class LatencySketch:
+    """Mergeable quantile sketch with relative-error guarantees (the DDSketch scheme).
+
+    A value v lands in bucket ceil(log_gamma(v)), so every bucket spans a fixed ratio and any
+    quantile is answered within SKETCH_RELATIVE_ACCURACY. Merging just adds bucket counts.
+    """
+    GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    MIN_VALUE = 0.01  # ms; anything smaller is counted in the zero bucket
+
+    def __init__(self):
+        self.bins, self.zero_count, self.count = {}, 0, 0
+
+    def add(self, value, weight=1):
+        if value <= self.MIN_VALUE: self.zero_count += weight
+        else:
+            key = math.ceil(math.log(value) / self.LOG_GAMMA)
+            self.bins[key] = self.bins.get(key, 0) + weight
+        self.count += weight
+
+    def merge(self, other):
+        for key, n in other.bins.items(): self.bins[key] = self.bins.get(key, 0) + n
+        self.zero_count += other.zero_count; self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if not self.count: return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank: return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank: return round(2 * self.GAMMA ** key / (self.GAMMA + 1), 2)
+        return None
+
+    def to_bytes(self):
+        # Zero count followed by (bucket, count) pairs: a few hundred bytes for a realistic latency spread.
+        return struct.pack(f"<I{2 * len(self.bins)}i", self.zero_count, *itertools.chain.from_iterable(sorted(self.bins.items())))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        sketch = cls()
+        if blob:
+            values = struct.unpack(f"<I{(len(blob) - 4) // 4}i", blob)
+            sketch.zero_count = values[0]
+            sketch.bins = dict(zip(values[1::2], values[2::2]))
+            sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+class Rollup:
+    """Check counts and latency aggregates for one monitor over one bucket, with a sketch per phase."""
+    def __init__(self):
+        self.check_count = self.up_count = self.error_count = 0
+        self.latency_sum, self.latency_min, self.latency_max = 0.0, None, None
+        self.sketch = LatencySketch()
+        self.phase_sketches = {phase: LatencySketch() for phase in PHASE_COLUMNS}
+
+    def add(self, is_up, is_error, latency, phases=None):
+        self.check_count += 1; self.up_count += bool(is_up); self.error_count += bool(is_error)
+        if latency is not None:
+            self.latency_sum += latency; self.sketch.add(latency)
+            self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+            self.latency_max = latency if self.latency_max is None else max(self.latency_max, latency)
+        for phase, value in (phases or {}).items():
+            if value is not None: self.phase_sketches[phase].add(value)
+
+    def merge(self, other):
+        self.check_count += other.check_count; self.up_count += other.up_count; self.error_count += other.error_count
+        self.latency_sum += other.latency_sum; self.sketch.merge(other.sketch)
+        for phase, sketch in other.phase_sketches.items(): self.phase_sketches[phase].merge(sketch)
+        mins = [v for v in (self.latency_min, other.latency_min) if v is not None]
+        maxes = [v for v in (self.latency_max, other.latency_max) if v is not None]
+        self.latency_min, self.latency_max = (min(mins) if mins else None), (max(maxes) if maxes else None)
+        return self
+
+    @classmethod
+    def from_row(cls, row):
+        rollup = cls()
+        rollup.check_count, rollup.up_count, rollup.error_count = row['check_count'], row['up_count'], row['error_count']
+        rollup.latency_sum, rollup.latency_min, rollup.latency_max = row['latency_sum'], row['latency_min'], row['latency_max']
+        rollup.sketch = LatencySketch.from_bytes(row['latency_sketch'])
+        for phase in PHASE_COLUMNS: rollup.phase_sketches[phase] = LatencySketch.from_bytes(row[f"{phase}_sketch"])
+        return rollup
+
+    def to_dict(self):
+        latency_count = self.sketch.count
+        return {"check_count": self.check_count, "up_count": self.up_count, "error_count": self.error_count,
+                "uptime_pct": round(100 * self.up_count / self.check_count, 2) if self.check_count else None,
+                "latency_min_ms": None if self.latency_min is None else round(self.latency_min, 2), "latency_max_ms": None if self.latency_max is None else round(self.latency_max, 2),
+                "latency_mean_ms": round(self.latency_sum / latency_count, 2) if latency_count else None,
+                "latency_p50_ms": self.sketch.quantile(0.5), "latency_p95_ms": self.sketch.quantile(0.95), "latency_p99_ms": self.sketch.quantile(0.99)}
+
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99)):
+        sketches = {"total": self.sketch, **self.phase_sketches}
+        return {name: {"count": sketch.count, **{f"p{round(q * 100)}": sketch.quantile(q) for q in quantiles}} for name, sketch in sketches.items()}
+
+def bucket_start(ts, resolution):
+    return int(ts // resolution * resolution) if resolution else 0
+
+def merge_sketch_blobs(a, b):
+    """SQL function sketch_merge(a, b): two serialized LatencySketches merged into one.
+
+    Runs for every sketch column of every upserted bucket. The stored sketch `a` is large and
+    the batch's `b` small, so b's counts are added in place at a's sorted keys; the bins are
+    only rebuilt when b brings keys that a lacks.
+    """
+    if not a: return b
+    if not b: return a
+    merged, vb = list(struct.unpack(f"<I{(len(a) - 4) // 4}i", a)), struct.unpack(f"<I{(len(b) - 4) // 4}i", b)
+    keys, new = merged[1::2], {}
+    merged[0] += vb[0]
+    for key, n in zip(vb[1::2], vb[2::2]):
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key: merged[2 * i + 2] += n
+        else: new[key] = n
+    if new:
+        bins = dict(zip(keys, merged[2::2])); bins.update(new)
+        merged = [merged[0], *itertools.chain.from_iterable(sorted(bins.items()))]
+    return struct.pack(f"<I{len(merged) - 1}i", *merged)
+
+def register_rollup_functions(conn):
+    conn.create_function("sketch_merge", 2, merge_sketch_blobs, deterministic=True)
+
+class RollupUpserter:
+    """Folds batches of checks into monitoring_rollups with additive upserts.
+
+    Minute buckets are upserted with every batch. Hour, day and lifetime buckets would take a
+    check from nearly every batch, so their deltas are summed in memory and upserted together
+    once flush_interval has passed or one of them has closed (or on flush(), e.g. at shutdown);
+    those resolutions are up to flush_interval late, and a crash loses at most that much of them.
+    Upserts add counts and sums, compare min/max and merge sketches with sketch_merge, so
+    nothing read back is cached and several workers writing the same bucket, e.g. while its
+    shard moves, all count. apply() and flush() stage; commit() or rollback() follows once the
+    transaction has ended. The connection needs register_rollup_functions().
+    """
+    RESOLUTIONS = ROLLUP_RESOLUTIONS + (LIFETIME_RESOLUTION,)
+    EVERY_BATCH = ROLLUP_RESOLUTIONS[0]
+    COLUMNS = ("check_count", "up_count", "error_count", "latency_count", "latency_sum", "latency_min", "latency_max", "latency_sketch") + tuple(f"{phase}_sketch" for phase in PHASE_COLUMNS)
+    ADDED = ("check_count", "up_count", "error_count", "latency_count", "latency_sum")
+    MERGED = ("latency_sketch",) + tuple(f"{phase}_sketch" for phase in PHASE_COLUMNS)
+
+    def __init__(self, flush_interval=ROLLUP_FLUSH_SECONDS, clock=time.time):
+        self.flush_interval, self.clock = flush_interval, clock
+        updates = [f"{c} = {c} + excluded.{c}" for c in self.ADDED] + [f"{c} = sketch_merge({c}, excluded.{c})" for c in self.MERGED]
+        updates += ["latency_min = min(coalesce(latency_min, excluded.latency_min), coalesce(excluded.latency_min, latency_min))",
+                    "latency_max = max(coalesce(latency_max, excluded.latency_max), coalesce(excluded.latency_max, latency_max))"]
+        self.sql = (f"INSERT INTO monitoring_rollups (api_id, resolution, bucket_start, {', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * (3 + len(self.COLUMNS)))}) "
+                    f"ON CONFLICT (api_id, resolution, bucket_start) DO UPDATE SET {', '.join(updates)}")
+        self._pending = {}  # (api_id, resolution, bucket_start) -> Rollup delta of hour/day/lifetime buckets not written yet
+        self._closes_at = math.inf  # earliest end of a pending bucket
+        self._flushed_at = clock()
+        self._staged, self._flushing = {}, False  # the current transaction's coarse deltas, and whether it writes _pending
+
+    def apply(self, cursor, checks):
+        """checks: iterable of (api_id, checked_at, is_up, is_error, latency, {phase: ms})."""
+        batch = defaultdict(Rollup)
+        for api_id, checked_at, is_up, is_error, latency, phases in checks:
+            for resolution in self.RESOLUTIONS:
+                batch[(api_id, resolution, bucket_start(checked_at, resolution))].add(is_up, is_error, latency, phases)
+        rows = [key + self._row(rollup) for key, rollup in batch.items() if key[1] == self.EVERY_BATCH]
+        self._staged = {key: rollup for key, rollup in batch.items() if key[1] != self.EVERY_BATCH}
+        now = self.clock()
+        self._flushing = now - self._flushed_at >= self.flush_interval or min(self._closes_at, *(self._close_time(key) for key in self._staged)) <= now
+        if self._flushing:
+            # _pending is left untouched until commit(), so a rolled-back flush is simply retried.
+            merged = dict(self._pending)
+            for key, rollup in self._staged.items():
+                merged[key] = Rollup().merge(merged[key]).merge(rollup) if key in merged else rollup
+            rows += [key + self._row(rollup) for key, rollup in merged.items()]
+        cursor.executemany(self.sql, rows)
+
+    def flush(self, cursor):
+        """Stages every pending bucket without a new batch; returns False when there is nothing to write."""
+        self._staged, self._flushing = {}, bool(self._pending)
+        if self._flushing: cursor.executemany(self.sql, [key + self._row(rollup) for key, rollup in self._pending.items()])
+        return self._flushing
+
+    def commit(self):
+        if self._flushing:
+            self._pending, self._closes_at, self._flushed_at = {}, math.inf, self.clock()
+        else:
+            for key, rollup in self._staged.items():
+                if key in self._pending: self._pending[key].merge(rollup)
+                else: self._pending[key] = rollup; self._closes_at = min(self._closes_at, self._close_time(key))
+        self._staged, self._flushing = {}, False
+
+    def rollback(self):
+        self._staged, self._flushing = {}, False
+
+    @staticmethod
+    def _close_time(key):
+        _, resolution, start = key
+        return start + resolution if resolution else math.inf
+
+    @staticmethod
+    def _row(r):
+        # Empty sketches (error checks) are sent as NULL so sketch_merge can return the stored blob as is.
+        sketches = (r.sketch,) + tuple(r.phase_sketches[phase] for phase in PHASE_COLUMNS)
+        return (r.check_count, r.up_count, r.error_count, r.sketch.count, r.latency_sum, r.latency_min, r.latency_max) \
+            + tuple(sketch.to_bytes() if sketch.count else None for sketch in sketches)
+
+def check_phases(res):
+    return {phase: res[column] for phase, column in PHASE_COLUMNS.items()}
+
+def backfill_rollups(conn):
+    # Schema migration 4: build rollups for history recorded before they existed.
+    register_rollup_functions(conn)
+    rollups, source = RollupUpserter(flush_interval=0), conn.execute(f"SELECT api_id, timestamp, is_up, error_message, total_latency_ms, {', '.join(PHASE_COLUMNS.values())} FROM monitoring_logs")
     while True:
-        conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-        cursor.execute("SELECT * FROM monitored_apis WHERE is_active = 1")
-        apis_to_check = [dict(row) for row in cursor.fetchall()]
-        now = time.time()
-        for api in apis_to_check:
-            api_id, url, old_status, frequency, last_checked = api['id'], api['url'], api['last_status'], api['check_frequency_minutes'], api['last_checked_at']
-            if last_checked is None or (now - last_checked) >= (frequency * 60):
-                new_status, error_msg = 'Pending', ""
+        rows = source.fetchmany(5000)
+        if not rows: break
+        checks = []
+        for api_id, ts, is_up, error, latency, *phase_values in rows:
+            try: checked_at = datetime.fromisoformat(str(ts)).timestamp()
+            except ValueError: continue
+            checks.append((api_id, checked_at, is_up, error is not None, latency, dict(zip(PHASE_COLUMNS, phase_values))))
+        rollups.apply(conn.cursor(), checks); rollups.commit()  # one transaction: the migration commits at the end
+
+def pick_resolution(window_seconds, points):
+    """Stored resolution and output step so a window is answered in about `points` buckets."""
+    target = max(window_seconds / max(points, 1), 1)
+    resolution = max([r for r in ROLLUP_RESOLUTIONS if r <= target] or [ROLLUP_RESOLUTIONS[0]])
+    return resolution, max(resolution, math.ceil(target / resolution) * resolution)
+
+# --- Database Writer and Read Pool ---
+class CheckWriter:
+    """Owns all monitoring_logs writes.
+
+    Probe results are queued by submit() and a single thread group-commits them: a batch
+    is committed once it holds batch_size results or its oldest result has waited max_delay.
+    Pending hour/day/lifetime rollups are also written when the queue has been idle for their
+    flush interval and when the writer stops, which happens at interpreter exit at the latest.
+    """
+    def __init__(self, path=DATABASE_FILE, batch_size=WRITER_BATCH_SIZE, max_delay=WRITER_MAX_DELAY):
+        self.path, self.batch_size, self.max_delay = path, batch_size, max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._rollups = RollupUpserter()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="check-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def submit(self, api, res, error, checked_at, new_status):
+        self._queue.put((api['id'], res, error, checked_at, new_status))
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Blocks until everything submitted so far is committed."""
+        self._queue.join()
+
+    def stop(self, timeout=None):
+        """Commits everything submitted so far, then ends the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None); self._thread.join(timeout)
+            self._thread = None
+
+    def _next_batch(self):
+        try: batch = [self._queue.get(timeout=max(self._rollups.flush_interval, 1))]
+        except queue.Empty: return []  # idle: time to write the pending rollups
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            try: batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty: break
+        return batch
+
+    def _write(self, cursor, batch):
+        """Writes a batch and returns the dashboard events to publish once it is committed."""
+        events = []
+        for api_id, res, error, checked_at, new_status in batch:
+            log_id = record_check_result(cursor, api_id, res, error, checked_at, new_status)
+            events.append({"id": log_id, "api_id": api_id, "status": new_status, "last_checked_at": checked_at,
+                           "timestamp": res["timestamp"] if error is None else datetime.now().isoformat(),
+                           "is_up": error is None and res["up"], "status_code": res["status_code"] if error is None else None,
+                           "total_latency_ms": res["total_latency_ms"] if error is None else None,
+                           "error_message": str(error) if error is not None else res.get("assertion_error")})
+        self._rollups.apply(cursor, [(api_id, checked_at, error is None and res["up"], error is not None, None, None) if error is not None
+                                     else (api_id, checked_at, res["up"], False, res["total_latency_ms"], check_phases(res))
+                                     for api_id, res, error, checked_at, _ in batch])
+        return events
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+        register_rollup_functions(conn)
+        cursor = conn.cursor()
+        while True:
+            batch = self._next_batch()
+            stopping = bool(batch) and batch[-1] is None  # stop()'s marker, always the last item taken
+            if stopping:
+                batch.pop(); self._queue.task_done()
+            if batch:
+                WRITE_BATCH_SIZE.observe(len(batch))
                 try:
-                    res = perform_latency_check(url, {api.get('header_name'): api.get('header_value')} if api.get('header_name') else {})
-                    cursor.execute(
-                        "INSERT INTO monitoring_logs (api_id, status_code, is_up, total_latency_ms, dns_lookup_ms, tcp_connection_ms, tls_handshake_ms, server_processing_ms, content_download_ms, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (api_id, res["status_code"], res["up"], res["total_latency_ms"], res["dns_lookup_ms"], res["tcp_connection_ms"], res["tls_handshake_ms"], res["server_processing_ms"], res["content_download_ms"], res["timestamp"])
-                    )
-                    new_status = "Up" if res["up"] else "Down"
+                    with conn, DB_SECONDS.time("write"): events = self._write(cursor, batch)
+                    self._rollups.commit()
+                    for event in events: event_broker.publish("check", event)
                 except Exception as e:
-                    error_msg = str(e)
-                    cursor.execute("INSERT INTO monitoring_logs (api_id, is_up, error_message, timestamp) VALUES (?, ?, ?, ?)", (api_id, 0, error_msg, datetime.now().isoformat()))
-                    new_status = "Error"
-                
-                if new_status in ["Down", "Error"] and old_status == "Up":
-                    send_downtime_alert(api, error_msg)
-                    
-                cursor.execute("UPDATE monitored_apis SET last_checked_at = ?, last_status = ? WHERE id = ?", (now, new_status, api_id))
-                conn.commit()
-        conn.close(); time.sleep(30)
+                    self._rollups.rollback()
+                    print(f"❌ Failed to write {len(batch)} check results: {e}")
+                finally:
+                    for _ in batch: self._queue.task_done()
+            if stopping or not batch:
+                try:
+                    with conn, DB_SECONDS.time("write"): self._rollups.flush(cursor)
+                    self._rollups.commit()
+                except Exception as e:
+                    self._rollups.rollback()
+                    print(f"❌ Failed to write pending rollups: {e}")
+            if stopping: break
+        conn.close()
+
+class EventBroker:
+    """Fans dashboard events out to every open /api/advanced/stream response.
+
+    Each event is serialized once, so publishing costs the same however many dashboards are open.
+    A subscriber that falls SSE_SUBSCRIBER_BACKLOG events behind is dropped; its browser reconnects.
+    """
+    def __init__(self, backlog=SSE_SUBSCRIBER_BACKLOG):
+        self.backlog = backlog
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.backlog)
+        with self._lock: self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock: self._subscribers.discard(q)
+
+    def __len__(self):
+        with self._lock: return len(self._subscribers)
+
+    def publish(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        with self._lock: subscribers = list(self._subscribers)
+        for q in subscribers:
+            try: q.put_nowait(message)
+            except queue.Full:
+                self.unsubscribe(q)
+                with q.mutex: q.queue.clear()
+                q.put_nowait(None)  # tells the response generator to close
+
+class ReadPool:
+    """Reusable read-only connections for the Flask routes."""
+    def __init__(self, path=DATABASE_FILE, size=READ_POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def open(self):
+        """A read-only connection outside the pool, for long readers such as exports; the caller closes it."""
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try: conn = self._idle.get_nowait()
+            except queue.Empty: conn = self.open()
+            started = time.perf_counter()
+            try:
+                yield conn
+            except sqlite3.Error:
+                conn.close(); raise
+            else:
+                self._idle.put(conn)
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - started, "read")
+
+check_writer = CheckWriter()
+read_pool = ReadPool()
+event_broker = EventBroker()
+
+# --- Retention and Compaction ---
+class Compactor:
+    """Deletes expired raw logs and minute rollups in small batches and returns the space to the OS.
+
+    Raw rows older than raw_days are dropped (the writer has already folded them into rollups),
+    minute rollups older than minute_days follow; hourly, daily and lifetime rollups are kept.
+    """
+    def __init__(self, path=DATABASE_FILE, raw_days=RAW_RETENTION_DAYS, minute_days=MINUTE_ROLLUP_RETENTION_DAYS,
+                 batch_size=COMPACTION_BATCH_SIZE, pause=COMPACTION_PAUSE_SECONDS):
+        self.path, self.raw_days, self.minute_days = path, raw_days, minute_days
+        self.batch_size, self.pause = batch_size, pause
+        self.last_report = None
+
+    def _delete_in_batches(self, conn, sql, params):
+        deleted = 0
+        while True:
+            with conn: count = conn.execute(sql, params + (self.batch_size,)).rowcount
+            deleted += count
+            if count < self.batch_size: return deleted
+            time.sleep(self.pause)
+
+    def _incremental_vacuum(self, conn, pages_per_step=256):
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free > 0:
+            # executescript steps the pragma to completion; execute() would free a single page per call.
+            conn.executescript(f"PRAGMA incremental_vacuum({pages_per_step});")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free: break
+            free = remaining; time.sleep(self.pause)
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+    def run_once(self):
+        started = time.time()
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+            raw_cutoff = (datetime.now() - timedelta(days=self.raw_days)).isoformat()
+            raw_deleted = self._delete_in_batches(conn, "DELETE FROM monitoring_logs WHERE id IN (SELECT id FROM monitoring_logs WHERE timestamp < ? LIMIT ?)", (raw_cutoff,))
+            rollups_deleted = self._delete_in_batches(conn,
+                "DELETE FROM monitoring_rollups WHERE (api_id, resolution, bucket_start) IN (SELECT api_id, resolution, bucket_start FROM monitoring_rollups WHERE resolution = ? AND bucket_start < ? LIMIT ?)",
+                (60, int(time.time() - self.minute_days * 86400)))
+            self._incremental_vacuum(conn)
+            pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            conn.close()
+        self.last_report = {"finished_at": datetime.now().isoformat(), "seconds": round(time.time() - started, 2),
+                            "raw_rows_deleted": raw_deleted, "rollup_rows_deleted": rollups_deleted,
+                            "bytes_reclaimed": max(pages_before - pages_after, 0) * page_size}
+        print(f"🧹 Compaction removed {raw_deleted} log rows and {rollups_deleted} rollup rows, reclaimed {self.last_report['bytes_reclaimed']} bytes.")
+        return self.last_report
+
+    def run_forever(self, interval=COMPACTION_INTERVAL_SECONDS):
+        while True:
+            try:
+                with DB_SECONDS.time("compaction"): self.run_once()
+            except Exception as e: print(f"❌ Compaction failed: {e}")
+            time.sleep(interval)
+
+compactor = Compactor()
+
+# --- Background Worker ---
+def check_status(res, error):
+    if error is not None: return "Error"
+    return "Up" if res["up"] else "Down"
+
+def record_check_result(cursor, api_id, res, error, checked_at, new_status):
+    """Writes one monitoring_logs row for a finished probe and updates the monitor's status."""
+    if error is None:
+        cursor.execute(
+            "INSERT INTO monitoring_logs (api_id, status_code, is_up, total_latency_ms, dns_lookup_ms, tcp_connection_ms, tls_handshake_ms, server_processing_ms, content_download_ms, connection_reused, dns_cached, error_message, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (api_id, res["status_code"], res["up"], res["total_latency_ms"], res["dns_lookup_ms"], res["tcp_connection_ms"], res["tls_handshake_ms"], res["server_processing_ms"], res["content_download_ms"], res["connection_reused"], res["dns_cached"], res.get("assertion_error"), res["timestamp"])
+        )
+    else:
+        cursor.execute("INSERT INTO monitoring_logs (api_id, is_up, error_message, timestamp) VALUES (?, ?, ?, ?)", (api_id, 0, str(error), datetime.now().isoformat()))
+    log_id = cursor.lastrowid
+    cursor.execute("UPDATE monitored_apis SET last_checked_at = ?, last_status = ? WHERE id = ?", (checked_at, new_status, api_id))
+    return log_id
+
+probe_engine = ProbeEngine()
+
+def still_owned(api):
+    # Re-checked when a queued probe gets its slot: a resync may have moved the shard away meanwhile.
+    if shard_leases.owns(api['id']) and api['id'] in scheduler: return True
+    CHECKS_DROPPED.inc("probe")
+    return False
+
+async def _dispatch_due_checks():
+    # Waiting happens on a helper thread; probes and result handling stay on this loop's thread.
+    # Returns once the scheduler is closed and the probes already running have finished.
+    loop, in_flight = asyncio.get_running_loop(), set()
+    while not scheduler.closed:
+        for api, due_at in await loop.run_in_executor(None, scheduler.wait_for_due, 60):
+            SCHEDULER_LAG.observe(max(time.time() - due_at, 0))
+            def on_result(api, res, error, due_at=due_at):
+                try:
+                    if not shard_leases.owns(api['id']):  # the new owner checks it on its own schedule
+                        CHECKS_DROPPED.inc("write"); return
+                    new_status = check_status(res, error)
+                    check_writer.submit(api, res, error, due_at, new_status)
+                    if new_status in ["Down", "Error"] and api['last_status'] == "Up":
+                        alert_dispatcher.notify(api, "down", str(error) if error else res.get('assertion_error') or f"HTTP {res['status_code']}")
+                    elif new_status == "Up" and api['last_status'] in ["Down", "Error"]:
+                        alert_dispatcher.notify(api, "recovered")
+                    api['last_status'] = new_status; api['last_checked_at'] = due_at
+                finally:
+                    scheduler.reschedule(api['id'], due_at)
+            task = asyncio.create_task(probe_engine.probe(api, on_result, still_owned))
+            in_flight.add(task); task.add_done_callback(in_flight.discard)
+    if in_flight: await asyncio.wait(in_flight)  # queued probes are dropped by still_owned; running ones are written
+
+def monitor_worker():
+    print(f"🚀 Advanced Monitoring worker {shard_leases.worker_id} started.")
+    check_writer.start(); alert_dispatcher.start()
+    threading.Thread(target=resync_worker, name="worker-resync", daemon=True).start()
+    asyncio.run(_dispatch_due_checks())
+
+def serve_worker_metrics(port):
+    """A bare /metrics listener for standalone workers, which do not run Flask."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render().encode() if self.path == "/metrics" else b""
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4"); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+        def log_message(self, *args): pass
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, name="worker-metrics", daemon=True).start()
+
+def run_standalone_worker(metrics_port=None):
+    """`python app.py --worker`: checks this process's shards without serving the web UI, until SIGTERM or Ctrl+C."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if metrics_port: serve_worker_metrics(metrics_port)
+    worker = threading.Thread(target=monitor_worker, name="monitor-worker", daemon=True)
+    worker.start()
+    try:
+        while True: time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        # Stop dispatching and let running probes finish while the leases are still held, so their
+        # results are written; then hand the shards over and flush the writer and the alert digests.
+        scheduler.close()
+        worker.join(PROBE_TIMEOUT + 5)
+        shard_leases.release(); probe_engine.shutdown()
+        check_writer.stop(); alert_dispatcher.stop()
+        print(f"👋 Worker {shard_leases.worker_id} stopped and released its shards.", flush=True)
+
+def relay_worker_checks(interval=CHECK_RELAY_INTERVAL):
+    """Publishes checks written by standalone workers to the dashboards of a web-only process."""
+    with read_pool.connection() as conn:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM monitoring_logs").fetchone()[0]
+    while True:
+        time.sleep(interval)
+        try:
+            with read_pool.connection() as conn:
+                rows = conn.execute("SELECT l.id, l.api_id, l.timestamp, l.is_up, l.status_code, l.total_latency_ms, l.error_message, a.last_checked_at "
+                                    "FROM monitoring_logs l LEFT JOIN monitored_apis a ON a.id = l.api_id WHERE l.id > ? ORDER BY l.id LIMIT 1000", (last_id,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"❌ Check relay failed: {e}"); continue
+        for row in rows:
+            event = dict(row)
+            event["is_up"] = bool(event["is_up"])
+            event["status"] = "Error" if row["status_code"] is None else ("Up" if row["is_up"] else "Down")
+            event_broker.publish("check", event)
+            last_id = row["id"]
 
 # --- Simple Checker functions and routes ---
-def read_logs_safely():
-    if not os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "w") as f: json.dump([], f)
-        return []
+class LogStore:
+    """Append-only NDJSON file of simple-checker results with an in-memory index.
+
+    Only byte offsets are indexed (every record in append order, each api_url's records
+    by timestamp, and each api_url's newest record), so appends are O(1) and reads only
+    touch the lines of the page they return.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets = []  # (offset, length) of every record, oldest first
+        self._by_url = defaultdict(list)  # api_url -> [(timestamp, offset, length)] sorted by timestamp
+        self._latest = {}  # api_url -> (offset, length) of its newest record
+        if not os.path.exists(path): open(path, "wb").close()
+        self._build_index()
+        self._writer = open(path, "ab")
+        self._reader = open(path, "rb")
+
+    def _index(self, record, offset, length):
+        self._offsets.append((offset, length))
+        url = record.get("api_url")
+        if url:
+            bisect.insort(self._by_url[url], (record.get("timestamp", ""), offset, length))
+            self._latest[url] = (offset, length)
+
+    def _build_index(self):
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"): break  # torn final write from a crash
+                try: self._index(json.loads(line), offset, len(line))
+                except json.JSONDecodeError: pass
+                offset += len(line)
+        if offset != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f: f.truncate(offset)
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        lines = [(json.dumps(r) + "\n").encode("utf-8") for r in records]
+        with self._lock:
+            offset = self._writer.tell()
+            self._writer.write(b"".join(lines)); self._writer.flush()
+            for record, line in zip(records, lines):
+                self._index(record, offset, len(line)); offset += len(line)
+
+    def _read(self, spans):
+        records = []
+        for offset, length in spans:
+            self._reader.seek(offset); records.append(json.loads(self._reader.read(length)))
+        return records
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def newest(self, start, stop):
+        """Records in newest-first order, sliced like logs[::-1][start:stop]."""
+        with self._lock:
+            total = len(self._offsets)
+            spans = self._offsets[max(total - stop, 0):max(total - start, 0)][::-1]
+            return self._read(spans)
+
+    def latest_by_url(self):
+        with self._lock: return self._read(list(self._latest.values()))
+
+    def for_url(self, api_url, since=None, limit=None):
+        """An api_url's records oldest first, optionally from timestamp `since` and capped to the newest `limit`."""
+        with self._lock:
+            entries = self._by_url.get(api_url, [])
+            lo = bisect.bisect_left(entries, (since,)) if since else 0
+            if limit: lo = max(lo, len(entries) - limit)
+            return self._read([(offset, length) for _, offset, length in entries[lo:]])
+
+def open_log_store():
+    # One-time migration: the old store rewrote a single JSON array on every check.
+    if os.path.exists(DATA_FILE) and not os.path.exists(LOG_STORE_FILE):
+        try:
+            with open(DATA_FILE, "r", encoding="utf-8") as f: legacy = json.load(f)
+        except json.JSONDecodeError:
+            legacy = []; os.rename(DATA_FILE, f"{DATA_FILE}.bak_{int(time.time())}")
+        tmp = LOG_STORE_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in legacy: f.write(json.dumps(record) + "\n")
+        os.replace(tmp, LOG_STORE_FILE)
+        if os.path.exists(DATA_FILE): os.rename(DATA_FILE, DATA_FILE + ".migrated")
+        print(f"📦 Migrated {len(legacy)} records from {DATA_FILE} to {LOG_STORE_FILE}.")
+    return LogStore(LOG_STORE_FILE)
+
+log_store = None  # opened on first use, so workers and tools importing this module never index or create the file
+_log_store_lock = threading.Lock()
+
+def get_log_store():
+    global log_store
+    if log_store is None:
+        with _log_store_lock:
+            if log_store is None: log_store = open_log_store()
+    return log_store
+
+def simple_check(api_url, header_name=None, header_value=None, timeout=PROBE_TIMEOUT):
+    headers = {header_name: header_value} if header_name and header_value else {}
+    started = time.perf_counter()
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f: return json.load(f)
-    except json.JSONDecodeError:
-        backup_file = f"{DATA_FILE}.bak_{int(time.time())}"; os.rename(DATA_FILE, backup_file)
-        with open(DATA_FILE, "w") as f: json.dump([], f)
-        return []
-read_logs_safely()
-def save_to_json(data): logs = read_logs_safely(); logs.append(data); open(DATA_FILE, "w").write(json.dumps(logs, indent=4))
+        result = perform_latency_check(api_url, headers, timeout=timeout)
+    except Exception:
+        CHECK_DURATION.observe(time.perf_counter() - started, "simple", "error"); raise
+    CHECK_DURATION.observe(time.perf_counter() - started, "simple", "up" if result["up"] else "down")
+    result.update({"api_url": api_url, "header_name": header_name or "", "header_value": header_value or "", "diagnosis": "API appears healthy."})
+    return result
+
 def check_api_logic(api_url, header_name=None, header_value=None):
     try:
-        headers = {header_name: header_value} if header_name and header_value else {}
-        result = perform_latency_check(api_url, headers)
-        result.update({"api_url": api_url, "header_name": header_name or "", "header_value": header_value or "", "diagnosis": "API appears healthy."})
-        save_to_json(result)
+        result = simple_check(api_url, header_name, header_value)
+        get_log_store().append(result)
         return jsonify(result)
     except Exception as e:
         return jsonify({"api_url": api_url, "status_code": 500, "up": False, "error": str(e)}), 500
 
+batch_check_pool = ThreadPoolExecutor(max_workers=BATCH_CHECK_CONCURRENCY, thread_name_prefix="batch-check")
+
+def run_batch_checks(targets, concurrency, deadline):
+    """Yields (index, result, error) for each target as soon as its probe finishes.
+
+    At most `concurrency` probes of this batch run at once: a slot is taken before a probe
+    is submitted to the shared pool and given back only when the probe has really finished,
+    so probes reported as timed out still count until their thread is free. A probe still
+    running `deadline` seconds after it started (not after it was queued) is reported as
+    timed out; its socket timeouts are set to the same deadline. Probes not started yet are
+    cancelled if the caller stops reading.
+    """
+    slots, started = threading.Semaphore(concurrency), {}  # index -> monotonic time its probe began
+    def probe(index, target):
+        try:
+            started[index] = time.monotonic()
+            return simple_check(target["api_url"], target.get("header_name"), target.get("header_value"), deadline)
+        finally:
+            slots.release()
+    queued, pending, abandoned = iter(enumerate(targets)), {}, set()
+    exhausted = False
+    def submit_ready():
+        nonlocal exhausted
+        while not exhausted and slots.acquire(blocking=False):
+            for index, target in queued:
+                pending[batch_check_pool.submit(probe, index, target)] = index
+                break
+            else:
+                exhausted = True; slots.release()
+    try:
+        submit_ready()
+        while pending or (abandoned and not exhausted):
+            now = time.monotonic()
+            # A probe that has not started yet cannot expire before now + deadline.
+            expires = min([started[i] + deadline for i in pending.values() if i in started] + [now + deadline])
+            done, _ = wait(set(pending) | abandoned, timeout=max(0.0, expires - now), return_when=FIRST_COMPLETED)
+            abandoned -= done
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if future in done:
+                    del pending[future]
+                    try: yield index, future.result(), None
+                    except Exception as e: yield index, None, e
+                elif index in started and started[index] + deadline <= now:
+                    del pending[future]
+                    if not future.cancel(): abandoned.add(future)  # keeps its slot until the thread returns
+                    yield index, None, TimeoutError(f"No result within {deadline:g}s")
+            submit_ready()
+    finally:
+        for future in pending: future.cancel()
+
 @app.route("/")
 def serve_index(): return send_from_directory(SIMPLE_STATIC_DIR, "index.html")
 @app.route("/static/<path:filename>")
@@ -171,52 +1634,97 @@ def check_api():
     data = request.json
     api_url, h_name, h_value = data.get("api_url"), data.get("header_name"), data.get("header_value")
     return check_api_logic(api_url, h_name, h_value)
+@app.route("/check_api/batch", methods=["POST"])
+def check_api_batch():
+    """Probes many URLs concurrently and streams one NDJSON line per URL as each finishes.
+
+    Body: {"urls": [url or {"api_url", "header_name", "header_value"}], "header_name",
+    "header_value" (defaults for plain URLs), "concurrency", "timeout" (seconds per URL)}.
+    Lines carry the URL's position as "index". Probe results are saved in one write at the end.
+    """
+    data = request.json or {}
+    urls = data.get("urls") or []
+    if not isinstance(urls, list) or not urls or len(urls) > BATCH_CHECK_MAX_URLS:
+        return jsonify({"error": f"urls must be a list of 1 to {BATCH_CHECK_MAX_URLS} URLs"}), 400
+    targets = [u if isinstance(u, dict) else {"api_url": u, "header_name": data.get("header_name"), "header_value": data.get("header_value")} for u in urls]
+    if not all(t.get("api_url") for t in targets):
+        return jsonify({"error": "every entry needs an api_url"}), 400
+    try:
+        concurrency = max(1, min(int(data.get("concurrency") or BATCH_CHECK_CONCURRENCY), BATCH_CHECK_CONCURRENCY))
+        deadline = max(0.1, min(float(data.get("timeout") or PROBE_TIMEOUT), PROBE_TIMEOUT))
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency and timeout must be numbers"}), 400
+    def generate():
+        results = []
+        try:
+            for index, result, error in run_batch_checks(targets, concurrency, deadline):
+                if error is None:
+                    results.append(result)
+                    yield json.dumps({"index": index, **result}) + "\n"
+                else:
+                    yield json.dumps({"index": index, "api_url": targets[index]["api_url"], "status_code": 500, "up": False, "error": str(error)}) + "\n"
+        finally:
+            if results: get_log_store().append_many(results)  # also runs when the client disconnects early
+    return Response(generate(), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
 @app.route("/last_logs", methods=["GET"])
 def last_logs():
     page = request.args.get('page', 1, type=int); per_page = 10
-    logs = read_logs_safely(); total_items = len(logs)
+    store = get_log_store()
+    total_items = len(store)
     start = (page - 1) * per_page; end = start + per_page
-    paginated_logs = logs[::-1][start:end]
+    paginated_logs = store.newest(start, end)
     total_pages = math.ceil(total_items / per_page)
     return jsonify({"logs": paginated_logs, "total_pages": total_pages, "current_page": page})
 @app.route("/monitored_urls")
 def monitored_urls():
-    logs = read_logs_safely()
-    latest_logs_by_url = {log["api_url"]: log for log in logs if log.get("api_url")}
-    return jsonify({"urls_data": list(latest_logs_by_url.values())})
+    return jsonify({"urls_data": get_log_store().latest_by_url()})
 @app.route("/chart_data", methods=["GET"])
 def chart_data():
-    api_url = request.args.get('url'); logs = read_logs_safely()
-    url_logs = sorted([log for log in logs if log.get("api_url") == api_url], key=lambda x: x.get("timestamp", ""))
+    api_url = request.args.get('url')
+    url_logs = get_log_store().for_url(api_url, since=request.args.get('since'), limit=request.args.get('limit', type=int))
     return jsonify({"labels": [log.get("timestamp") for log in url_logs], "data": [log.get("total_latency_ms") for log in url_logs]})
 @app.route("/api/advanced/monitors")
 def get_monitors():
-    conn = sqlite3.connect(DATABASE_FILE); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT * FROM monitored_apis")
-    monitors = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with read_pool.connection() as conn:
+        monitors = [dict(row) for row in conn.execute("SELECT * FROM monitored_apis")]
     return jsonify(monitors)
+def content_settings(data):
+    """(expected_status, body_assertion, max_body_bytes) from a monitor form; raises ValueError if they do not compile."""
+    expected_status = (data.get('expected_status') or '').strip() or None
+    body_assertion = (data.get('body_assertion') or '').strip() or None
+    max_body_bytes = int(data['max_body_bytes']) if data.get('max_body_bytes') else None
+    if max_body_bytes is not None and max_body_bytes <= 0: raise ValueError("max_body_bytes must be positive")
+    content_check(expected_status, body_assertion)
+    return expected_status, body_assertion, max_body_bytes
 @app.route("/api/advanced/add_monitor", methods=["POST"])
 def add_monitor():
     data = request.json
+    try: content = content_settings(data)
+    except ValueError as e: return jsonify({"error": str(e)}), 400
     conn = sqlite3.connect(DATABASE_FILE)
     try:
         cursor = conn.cursor()
-        cursor.execute("INSERT INTO monitored_apis (url, category, header_name, header_value, check_frequency_minutes, notification_email) VALUES (?, ?, ?, ?, ?, ?)",
-            (data['url'], data['category'], data.get('header_name'), data.get('header_value'), data['frequency'], data.get('notification_email')))
+        cursor.execute("INSERT INTO monitored_apis (url, category, header_name, header_value, check_frequency_minutes, notification_email, cold_dns, expected_status, body_assertion, max_body_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (data['url'], data['category'], data.get('header_name'), data.get('header_value'), data['frequency'], data.get('notification_email'), bool(data.get('cold_dns'))) + content)
         conn.commit()
+        sync_scheduler(conn, cursor.lastrowid)
+        event_broker.publish("monitors", {"action": "added", "id": cursor.lastrowid})
     except sqlite3.IntegrityError: return jsonify({"error": "This URL is already monitored."}), 409
     finally: conn.close()
     return jsonify({"success": True})
 @app.route("/api/advanced/update_monitor", methods=["POST"])
 def update_monitor():
     data = request.json
+    try: content = content_settings(data)
+    except ValueError as e: return jsonify({"error": str(e)}), 400
     conn = sqlite3.connect(DATABASE_FILE)
     try:
         cursor = conn.cursor()
-        cursor.execute("UPDATE monitored_apis SET url = ?, category = ?, header_name = ?, header_value = ?, check_frequency_minutes = ?, notification_email = ? WHERE id = ?",
-            (data['url'], data['category'], data.get('header_name'), data.get('header_value'), data['frequency'], data.get('notification_email'), data['id']))
+        cursor.execute("UPDATE monitored_apis SET url = ?, category = ?, header_name = ?, header_value = ?, check_frequency_minutes = ?, notification_email = ?, cold_dns = ?, expected_status = ?, body_assertion = ?, max_body_bytes = ? WHERE id = ?",
+            (data['url'], data['category'], data.get('header_name'), data.get('header_value'), data['frequency'], data.get('notification_email'), bool(data.get('cold_dns'))) + content + (data['id'],))
         conn.commit()
+        sync_scheduler(conn, data['id'])
+        event_broker.publish("monitors", {"action": "updated", "id": data['id']})
     finally: conn.close()
     return jsonify({"success": True})
 @app.route("/api/advanced/delete_monitor", methods=["POST"])
@@ -226,42 +1734,207 @@ def delete_monitor():
     cursor = conn.cursor()
     cursor.execute("DELETE FROM monitored_apis WHERE id = ?", (data['id'],))
     conn.commit()
+    scheduler.remove(data['id'])
+    event_broker.publish("monitors", {"action": "deleted", "id": data['id']})
     conn.close()
     return jsonify({"success": True})
+_history_counts = {}  # api_id -> (row count, computed_at)
+
+def cached_history_count(conn, api_id):
+    # Only used for the page indicator, so a count up to HISTORY_COUNT_TTL old is good enough.
+    cached = _history_counts.get(api_id)
+    if cached and time.time() - cached[1] < HISTORY_COUNT_TTL: return cached[0]
+    count = conn.execute("SELECT COUNT(*) FROM monitoring_logs WHERE api_id = ?", (api_id,)).fetchone()[0]
+    _history_counts[api_id] = (count, time.time())
+    return count
+
 @app.route("/api/advanced/history")
 def get_history():
-    api_id = request.args.get('id', type=int); page = request.args.get('page', 1, type=int); per_page = 15
-    conn = sqlite3.connect(DATABASE_FILE); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(id) FROM monitoring_logs WHERE api_id = ?", (api_id,))
-    total_items = cursor.fetchone()[0]
-    total_pages = math.ceil(total_items / per_page)
-    offset = (page - 1) * per_page
-    cursor.execute("SELECT * FROM monitoring_logs WHERE api_id = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?", (api_id, per_page, offset))
-    history = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify({"history": history, "total_pages": total_pages, "current_page": page})
+    """Newest-first keyset pagination: `cursor` is the next_cursor of the previous page."""
+    api_id = request.args.get('id', type=int); per_page = max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 100))
+    cursor_arg = request.args.get('cursor')
+    if cursor_arg:
+        try: ts, last_id = cursor_arg.rsplit('|', 1); last_id = int(last_id)
+        except ValueError: return jsonify({"error": "invalid cursor"}), 400
+    with read_pool.connection() as conn:
+        if cursor_arg:
+            rows = conn.execute("SELECT * FROM monitoring_logs WHERE api_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                (api_id, ts, last_id, per_page + 1)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM monitoring_logs WHERE api_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?", (api_id, per_page + 1)).fetchall()
+        total_items = cached_history_count(conn, api_id)
+    history = [dict(row) for row in rows[:per_page]]
+    next_cursor = f"{history[-1]['timestamp']}|{history[-1]['id']}" if len(rows) > per_page else None
+    return jsonify({"history": history, "next_cursor": next_cursor, "total_items": total_items, "total_pages": math.ceil(total_items / per_page)})
 @app.route("/api/advanced/daily_summary")
 def get_daily_summary():
     api_id = request.args.get('id', type=int)
     now = datetime.now(); start_time = now - timedelta(days=1)
-    conn = sqlite3.connect(DATABASE_FILE); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, is_up, total_latency_ms, error_message FROM monitoring_logs WHERE api_id = ? AND timestamp >= ? ORDER BY timestamp ASC",
-                   (api_id, start_time.strftime("%Y-%m-%d %H:%M:%S")))
-    logs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with read_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT timestamp, is_up, total_latency_ms, error_message FROM monitoring_logs WHERE api_id = ? AND timestamp >= ? ORDER BY timestamp ASC",
+                       (api_id, start_time.strftime("%Y-%m-%d %H:%M:%S")))
+        logs = [dict(row) for row in cursor.fetchall()]
     return jsonify(logs)
+@app.route("/api/advanced/summary")
+def get_summary():
+    """Rollup-backed uptime and latency for one monitor.
+
+    `start`/`end` are epoch seconds (default: the last 24 hours) and `points` caps how many
+    buckets come back; the coarsest rollup that still fits the budget is used.
+    """
+    api_id = request.args.get('id', type=int)
+    end = request.args.get('end', time.time(), type=float); start = request.args.get('start', end - 86400, type=float)
+    points = request.args.get('points', SUMMARY_DEFAULT_POINTS, type=int)
+    resolution, step = pick_resolution(end - start, points)
+    with read_pool.connection() as conn:
+        rows = conn.execute("SELECT * FROM monitoring_rollups WHERE api_id = ? AND resolution = ? AND bucket_start >= ? AND bucket_start < ? ORDER BY bucket_start",
+                            (api_id, resolution, bucket_start(start, resolution), end)).fetchall()
+    buckets, overall = {}, Rollup()
+    for row in rows:
+        rollup = Rollup.from_row(row)
+        overall.merge(rollup)
+        key = bucket_start(row['bucket_start'], step)
+        buckets[key] = buckets[key].merge(rollup) if key in buckets else rollup
+    return jsonify({"resolution": step, "start": start, "end": end, "overall": overall.to_dict(),
+                    "buckets": [{"bucket_start": key, **rollup.to_dict()} for key, rollup in sorted(buckets.items())]})
+@app.route("/api/advanced/percentiles")
+def get_percentiles():
+    """p50/p90/p99 of total latency and each phase over `window` (1h, 24h, 7d, 30d or all).
+
+    Every window is served from a bounded number of rollup sketches, so the cost does not
+    grow with history. Windows are aligned to rollup buckets and may include one extra bucket.
+    """
+    api_id = request.args.get('id', type=int); window = request.args.get('window', '24h')
+    if window not in PERCENTILE_WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(PERCENTILE_WINDOWS)}"}), 400
+    seconds, resolution = PERCENTILE_WINDOWS[window]
+    since = bucket_start(time.time() - seconds, resolution) if seconds else 0
+    with read_pool.connection() as conn:
+        rows = conn.execute("SELECT * FROM monitoring_rollups WHERE api_id = ? AND resolution = ? AND bucket_start >= ?", (api_id, resolution, since)).fetchall()
+    merged = Rollup()
+    for row in rows: merged.merge(Rollup.from_row(row))
+    return jsonify({"window": window, "check_count": merged.check_count, "percentiles": merged.percentiles()})
+@app.route("/api/advanced/compaction")
+def get_compaction_report():
+    return jsonify(compactor.last_report or {"error": "Compaction has not run yet"})
+@app.route("/api/advanced/dns_cache")
+def get_dns_cache():
+    """Hit/miss counters of the shared DNS cache and the hosts it currently holds."""
+    return jsonify(dns_cache.snapshot())
+@app.route("/api/advanced/workers")
+def get_workers():
+    """Live and recently seen monitoring workers with the number of shards each currently holds."""
+    with read_pool.connection() as conn:
+        workers = [dict(row) for row in conn.execute("SELECT w.*, COUNT(l.shard) AS shards_held FROM workers w LEFT JOIN worker_leases l ON l.worker_id = w.worker_id AND l.expires_at > ? "
+                                                     "GROUP BY w.worker_id ORDER BY w.started_at", (time.time(),))]
+    return jsonify({"this_process": shard_leases.snapshot(), "workers": workers})
+
+metrics.callback("apimon_scheduled_monitors", "Active monitors held by this process's scheduler.", lambda: len(scheduler))
+metrics.callback("apimon_probes_in_flight", "Monitor checks currently running.", lambda: probe_engine.in_flight)
+metrics.callback("apimon_writer_queue_depth", "Check results waiting for the writer.", lambda: check_writer.depth())
+metrics.callback("apimon_alert_queue_depth", "Alerts queued, held in a digest or waiting for a retry.", lambda: alert_dispatcher.pending())
+metrics.callback("apimon_alerts", "Alert dispatcher events by kind.", lambda: dict(alert_dispatcher.stats), kind="counter", labels=("event",))
+metrics.callback("apimon_dns_cache_lookups", "Shared DNS cache lookups by result.", lambda: dns_cache.lookup_counts(), kind="counter", labels=("result",))
+metrics.callback("apimon_worker_shards_held", "Shards of monitored_apis leased by this process.", lambda: len(shard_leases.owned))
+metrics.callback("apimon_sse_subscribers", "Open dashboard event streams.", lambda: len(event_broker))
+metrics.callback("apimon_profiler_enabled", "1 while the sampling profiler is running.", lambda: int(profiler.enabled))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Labelled by the route pattern, not the path, so the number of series stays bounded.
+    if "request_started" in g:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        ROUTE_SECONDS.observe(time.perf_counter() - g.request_started, request.method, rule, str(response.status_code))
+    return response
+
+@app.route("/metrics")
+def get_metrics():
+    """Self-metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/advanced/profiler", methods=["GET", "POST"])
+def sampling_profiler():
+    """GET: the most sampled stacks (?format=folded for flame graph tools). POST {"enabled", "interval", "reset"}: toggle the profiler."""
+    if request.method == "POST":
+        data = request.json or {}
+        try: interval = float(data['interval']) if data.get('interval') else None
+        except (TypeError, ValueError): return jsonify({"error": "interval must be a number of seconds"}), 400
+        if interval is not None and not 0.001 <= interval <= 1: return jsonify({"error": "interval must be between 0.001 and 1 seconds"}), 400
+        if data.get('reset'): profiler.reset()
+        if data.get('enabled'): profiler.start(interval)
+        elif 'enabled' in data: profiler.stop()
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(), mimetype="text/plain")
+    return jsonify(profiler.snapshot(limit=request.args.get('limit', 50, type=int)))
+@app.route("/api/advanced/stream")
+def stream_events():
+    """Server-sent events: `check` for every committed result, `monitors` when the monitor list changes."""
+    def generate():
+        q = event_broker.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try: message = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"; continue
+                if message is None: return
+                yield message
+        finally:
+            event_broker.unsubscribe(q)
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+@app.route("/api/advanced/export")
+def export_history():
+    """Stream one monitor's raw checks between `start` and `end` (epoch seconds, default: the last 24 hours).
+
+    `format` is csv or ndjson and `gzip=1` compresses the body; rows are read and sent in chunks.
+    """
+    api_id = request.args.get('id', type=int); fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '0') in ('1', 'true')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    # Validated before the response starts: a bad value must be a 400, not a body cut short after a 200.
+    try:
+        end = float(request.args.get('end', time.time())); start = float(request.args.get('start', end - 86400))
+        since, until = datetime.fromtimestamp(start).isoformat(), datetime.fromtimestamp(end).isoformat()
+    except (ValueError, OverflowError, OSError):
+        return jsonify({"error": "start and end must be epoch seconds"}), 400
+    def generate():
+        # Its own connection, so a slow download does not hold one of the routes' pooled connections.
+        conn = read_pool.open()
+        try:
+            cursor = conn.execute("SELECT * FROM monitoring_logs WHERE api_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp, id", (api_id, since, until))
+            yield from export_chunks(cursor, fmt, compress)
+        finally:
+            conn.close()
+    filename = f"monitor-{api_id}.{fmt}" + (".gz" if compress else "")
+    mimetype = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    return Response(generate(), mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={filename}"})
 @app.route("/api/advanced/log_details/<int:log_id>")
 def get_log_details(log_id):
-    conn = sqlite3.connect(DATABASE_FILE); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT * FROM monitoring_logs WHERE id = ?", (log_id,))
-    log_details = cursor.fetchone()
-    conn.close()
+    with read_pool.connection() as conn:
+        log_details = conn.execute("SELECT * FROM monitoring_logs WHERE id = ?", (log_id,)).fetchone()
     return jsonify(dict(log_details) if log_details else {"error": "Log not found"})
 
 
 # --- Main Execution Block ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API monitoring service.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--worker", action="store_true", help="run a standalone monitoring worker without the web UI")
+    mode.add_argument("--no-worker", action="store_true", help="serve the web UI only; checks come from standalone workers")
+    parser.add_argument("--metrics-port", type=int, help="with --worker: serve /metrics on this port")
+    args = parser.parse_args()
     init_db()
-    monitor_thread = threading.Thread(target=monitor_worker, daemon=True)
-    monitor_thread.start()
-    app.run(port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    if args.worker:
+        run_standalone_worker(args.metrics_port)
+    else:
+        if args.no_worker: threading.Thread(target=relay_worker_checks, daemon=True).start()
+        else: threading.Thread(target=monitor_worker, daemon=True).start()
+        threading.Thread(target=compactor.run_forever, daemon=True).start()
+        get_log_store()  # index (and migrate) the simple-checker log before the first request
+        app.run(port=5000, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,750 @@
+"""
+benchmark.py
+Local benchmarks for the monitoring service. Everything runs against stub HTTP(S) servers
+bound to loopback addresses, so no external endpoint is ever contacted.
+
+Every scenario prints one JSON line per result; --output writes them, with the git revision
+and machine details, to a report file that `compare` checks against a baseline report.
+
+Usage:
+  python benchmark.py probes [--monitors 200] [--hosts 8] [--delay 0.2] [--concurrency 1,4,16,64]
+  python benchmark.py scheduler [--monitors 10000] [--duration 30]
+  python benchmark.py writer [--results 50000] [--readers 4]
+  python benchmark.py mitm [--flows 20000]
+  python benchmark.py capture-query [--rows 1000000]
+  python benchmark.py alerts [--monitors 500] [--recipients 5] [--smtp-delay 0.2] [--fail-first 3]
+  python benchmark.py bodies [--body-mb 20] [--checks 20]
+  python benchmark.py batch [--urls 500] [--hosts 8] [--delay 0.1] [--concurrency 32]
+  python benchmark.py workers [--workers 1,2,4] [--monitors 3000] [--delay 0.2] [--probe-concurrency 10] [--duration 20]
+  python benchmark.py seed --data-dir DIR [--monitors 500] [--rows 2000000] [--log-rows 1000000]
+  python benchmark.py load [--data-dir DIR] [--interval 5] [--delay 0.05] [--failure-rate 0.02] [--https-share 0.25] [--clients 8] [--duration 30]
+  python benchmark.py compare BASELINE.json CURRENT.json [--threshold 0.1]
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import signal
+import socketserver
+import sqlite3
+import subprocess
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import app
+from metrics import bucket_quantile
+
+
+# --- Stub endpoints ---
+class StubServer:
+    """A threaded HTTP server on 127.0.0.<n> that answers every GET after an injected delay.
+
+    failure_rate is the share of requests answered with a 503, body_bytes pads the JSON body to
+    about that size, and an ssl.SSLContext in `tls` makes it an HTTPS server.
+    """
+    def __init__(self, host="127.0.0.1", delay=0.0, body=b'{"status": "ok"}', failure_rate=0.0, body_bytes=None, tls=None):
+        if body_bytes: body = b'{"status": "ok", "padding": "' + b"x" * max(body_bytes - 31, 0) + b'"}'
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+            def do_GET(self):
+                if delay: time.sleep(delay)
+                failed = failure_rate and random.random() < failure_rate
+                payload = b'{"status": "unavailable"}' if failed else body
+                self.send_response(503 if failed else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, 0), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.handle_error = lambda request, client_address: None  # probes may hang up before a large body is sent
+        if tls:
+            # The handshake is deferred to the handler thread, so a slow client cannot stall accept().
+            self.httpd.socket = tls.wrap_socket(self.httpd.socket, server_side=True, do_handshake_on_connect=False)
+        self.url = "%s://%s:%d/" % ("https" if tls else "http", host, self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+
+class StubSMTPServer:
+    """A plain-text SMTP server on loopback that accepts every message after an injected delay.
+
+    The first `fail_first` messages are rejected with a transient 451, to exercise retries.
+    """
+    def __init__(self, delay=0.0, fail_first=0):
+        stub = self
+        self.messages, self.connections, self.rejected = [], 0, 0
+        self._lock = threading.Lock()
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+            def handle(self):
+                with stub._lock: stub.connections += 1
+                self.reply("220 stub ESMTP")
+                for raw in self.rfile:
+                    verb = raw.decode(errors="replace").strip().split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for line in self.rfile:
+                            if line == b".\r\n": break
+                            lines.append(line)
+                        if delay: time.sleep(delay)
+                        with stub._lock:
+                            reject = stub.rejected < fail_first
+                            if reject: stub.rejected += 1
+                            else: stub.messages.append(b"".join(lines))
+                        self.reply("451 Try again later" if reject else "250 Queued")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye"); return
+                    else:
+                        self.reply("502 Not implemented")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown(); self.server.server_close()
+
+
+def start_stub_servers(count, delay, first_host=1, **options):
+    # Distinct loopback addresses give each stub its own hostname for the per-host limit.
+    return [StubServer(host="127.0.0.%d" % (first_host + i), delay=delay, **options) for i in range(count)]
+
+
+def make_test_certificate(workdir, hosts):
+    """A self-signed certificate for the stub addresses, made with the openssl CLI.
+
+    SSL_CERT_FILE points at it, so the probes' default context trusts it (and only it) for this process.
+    """
+    cert, key = os.path.join(workdir, "stub-cert.pem"), os.path.join(workdir, "stub-key.pem")
+    san = "subjectAltName=" + ",".join("IP:" + host for host in hosts)
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=apimon-bench",
+                        "-addext", san, "-keyout", key, "-out", cert], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise SystemExit(f"HTTPS stubs need the openssl command line tool (OpenSSL 1.1.1+): {e}")
+    os.environ["SSL_CERT_FILE"] = cert
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+# --- Scenarios ---
+def bench_probes(args):
+    servers = start_stub_servers(args.hosts, args.delay)
+    apis = [{"id": i, "url": servers[i % len(servers)].url + "check/%d" % i} for i in range(args.monitors)]
+    results = []
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            engine = app.ProbeEngine(concurrency=concurrency, per_host_concurrency=args.per_host)
+            errors = []
+            started = time.perf_counter()
+            engine.run(apis, lambda api, res, error: error and errors.append(error))
+            elapsed = time.perf_counter() - started
+            engine.shutdown()
+            row = {"concurrency": concurrency, "per_host": args.per_host, "checks": len(apis), "errors": len(errors),
+                   "seconds": round(elapsed, 3), "checks_per_second": round(len(apis) / elapsed, 1)}
+            print(json.dumps(row))
+            results.append(row)
+    finally:
+        for s in servers: s.close()
+    return results
+
+
+def percentile(values, pct):
+    if not values: return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def bench_scheduler(args):
+    # Every monitor gets a 5-15s interval; a consumer pops due monitors and reschedules them at
+    # once, so the measured drift is the scheduler's own lateness, not probe time.
+    sched = app.MonitorScheduler()
+    now = time.time()
+    sched.load([{"id": i, "check_frequency_minutes": random.uniform(5, 15) / 60, "last_checked_at": now - random.uniform(0, 5)}
+                for i in range(args.monitors)])
+    drifts, stop_at = [], time.time() + args.duration
+    while time.time() < stop_at:
+        for api, due_at in sched.wait_for_due(timeout=0.5):
+            drifts.append((time.time() - due_at) * 1000)
+            sched.reschedule(api["id"], due_at)
+    row = {"monitors": args.monitors, "seconds": args.duration, "checks_fired": len(drifts),
+           "drift_ms_p50": round(percentile(drifts, 50), 3), "drift_ms_p99": round(percentile(drifts, 99), 3),
+           "drift_ms_max": round(max(drifts), 3)}
+    print(json.dumps(row))
+    return row
+
+def fake_result(i):
+    return {"status_code": 200, "up": True, "total_latency_ms": 50.0 + i % 100, "dns_lookup_ms": 1.0, "tcp_connection_ms": 2.0,
+            "tls_handshake_ms": 3.0, "server_processing_ms": 40.0, "content_download_ms": 4.0 + i % 100, "connection_reused": False,
+            "dns_cached": False, "timestamp": "2026-01-01T00:00:00.%06d" % (i % 1000000)}
+
+def seed_monitors(path, count):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO monitored_apis (url, check_frequency_minutes) VALUES (?, 1)", [("http://127.0.0.1/m/%d" % i,) for i in range(count)])
+    conn.commit(); conn.close()
+
+def bench_writer(args):
+    # Insert throughput of the group-committing writer, with readers hitting the history query throughout.
+    workdir = tempfile.mkdtemp(prefix="apimon-bench-")
+    app.DATABASE_FILE = os.path.join(workdir, "monitoring.db")
+    app.init_db(); seed_monitors(app.DATABASE_FILE, args.monitors)
+    writer = app.CheckWriter(app.DATABASE_FILE).start()
+    pool = app.ReadPool(app.DATABASE_FILE, size=args.readers)
+    read_ms, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            with pool.connection() as conn:
+                conn.execute("SELECT * FROM monitoring_logs WHERE api_id = ? ORDER BY timestamp DESC LIMIT 15", (random.randint(1, args.monitors),)).fetchall()
+            read_ms.append((time.perf_counter() - started) * 1000)
+
+    readers = [threading.Thread(target=reader, daemon=True) for _ in range(args.readers)]
+    for t in readers: t.start()
+    started = time.perf_counter()
+    for i in range(args.results):
+        writer.submit({"id": i % args.monitors + 1}, fake_result(i), None, time.time(), "Up")
+    writer.flush()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in readers: t.join()
+    with pool.connection() as conn:
+        stored = conn.execute("SELECT COUNT(*) FROM monitoring_logs").fetchone()[0]
+    if stored != args.results:
+        raise SystemExit(f"writer stored {stored} of {args.results} results; see the log for the failed batches")
+    row = {"results": args.results, "readers": args.readers, "batch_size": writer.batch_size, "seconds": round(elapsed, 3),
+           "inserts_per_second": round(args.results / elapsed, 1), "reads": len(read_ms),
+           "read_ms_p50": round(percentile(read_ms, 50), 3), "read_ms_p99": round(percentile(read_ms, 99), 3)}
+    print(json.dumps(row))
+    return row
+
+def bench_mitm(args):
+    # Replays synthetic flows through the generated addon's request and response hooks and measures
+    # the time the hooks add to each proxied flow, then how long the addon takes to drain its queue on done().
+    import api_monitor
+    from mitmproxy.test import tflow
+    controller = api_monitor.MitmController(Path(tempfile.mkdtemp(prefix="apimon-bench-")))
+    spec = importlib.util.spec_from_file_location("bench_mitm_addon", controller.write_addon())
+    addon = importlib.util.module_from_spec(spec); spec.loader.exec_module(addon)
+    addon.load(None)
+    flows = [tflow.tflow(resp=True) for _ in range(args.flows)]
+    for i, flow in enumerate(flows): flow.request.path = "/items/%d" % i
+    hook_us = []
+    started = time.perf_counter()
+    for flow in flows:
+        t0 = time.perf_counter()
+        addon.request(flow)
+        addon.response(flow)
+        hook_us.append((time.perf_counter() - t0) * 1e6)
+    replayed = time.perf_counter() - started
+    addon.done()
+    drained = time.perf_counter() - started
+    conn = sqlite3.connect(controller.db_path)
+    stored = conn.execute("SELECT COUNT(*) FROM requests WHERE status IS NOT NULL").fetchone()[0]
+    conn.close()
+    row = {"flows": args.flows, "stored": stored, "batch_size": api_monitor.ADDON_BATCH_SIZE,
+           "hook_us_p50": round(percentile(hook_us, 50), 2), "hook_us_p99": round(percentile(hook_us, 99), 2),
+           "replay_seconds": round(replayed, 3), "drain_seconds": round(drained, 3), "rows_per_second": round(stored / drained, 1)}
+    print(json.dumps(row))
+    return row
+
+def bench_capture_query(args):
+    # Seeds the capture DB (indexes and FTS triggers in place) and times the GUI's search queries.
+    import api_monitor
+    controller = api_monitor.MitmController(Path(tempfile.mkdtemp(prefix="apimon-bench-")))
+    hosts = ["svc%d.example.test" % i for i in range(200)]
+    methods = ["GET"] * 8 + ["POST", "DELETE"]
+    start = time.time() - args.rows * 0.01
+    conn = sqlite3.connect(controller.db_path)
+    started = time.perf_counter()
+    for offset in range(0, args.rows, 50000):
+        batch = []
+        for i in range(offset, min(offset + 50000, args.rows)):
+            host, path = random.choice(hosts), "/api/v1/items/%d?q=%x" % (i, random.getrandbits(32))
+            ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(start + i * 0.01)) + ".000000Z"
+            batch.append((ts, "10.0.%d.%d:%d" % (i % 4, i % 250, 40000 + i % 20000), random.choice(methods), "https", host, path, "https://" + host + path, "{}"))
+        conn.executemany("INSERT INTO requests (ts, client_addr, method, scheme, host, path, full_url, req_headers) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.commit()
+    conn.close()
+    seeded = time.perf_counter() - started
+    last_hour = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() - 3600)) + "Z"
+    queries = {"latest_page": {}, "host": {"host": hosts[7]}, "host_last_hour": {"host": hosts[7], "since": last_hour},
+               "method": {"method": "DELETE"}, "client": {"client": "10.0.1.17"}, "substring": {"text": "items/4242"},
+               "substring_rare": {"text": "q=abcd"}, "combined": {"host": hosts[3], "method": "POST", "text": "items/1"}}
+    row = {"rows": args.rows, "fts": controller.fts_enabled, "seed_seconds": round(seeded, 1)}
+    for name, filters in queries.items():
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            found = controller.query(**filters)
+            times.append((time.perf_counter() - t0) * 1000)
+        row[name + "_ms"] = round(percentile(times, 50), 2)
+        row[name + "_rows"] = len(found)
+    t0 = time.perf_counter()
+    controller.host_counts(client="10.0.1.17", since=last_hour)
+    row["client_hosts_last_hour_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    print(json.dumps(row))
+    return row
+
+def bench_alerts(args):
+    # Every monitor fails at once behind a slow SMTP server that rejects its first few messages:
+    # notify() must stay off the check path, and the alerts must arrive as one digest per recipient.
+    smtp = StubSMTPServer(delay=args.smtp_delay, fail_first=args.fail_first)
+    dispatcher = app.AlertDispatcher(host="127.0.0.1", port=smtp.port, security="none", username="", password="",
+                                     sender="monitor@example.test", digest_window=args.digest_window, retry_base=0.2).start()
+    apis = [{"id": i, "url": "http://127.0.0.1/m/%d" % i, "notification_email": "ops%d@example.test" % (i % args.recipients)}
+            for i in range(args.monitors)]
+    notify_us = []
+    started = time.perf_counter()
+    for api in apis:
+        t0 = time.perf_counter()
+        dispatcher.notify(api, "down", "HTTP 503")
+        notify_us.append((time.perf_counter() - t0) * 1e6)
+    deadline = time.time() + 60
+    while dispatcher.pending() and time.time() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    smtp.close()
+    row = {"monitors": args.monitors, "recipients": args.recipients, "notify_us_p50": round(percentile(notify_us, 50), 2),
+           "notify_us_max": round(max(notify_us), 2), "emails_delivered": len(smtp.messages), "smtp_connections": smtp.connections,
+           "rejected_then_retried": smtp.rejected, "failed": dispatcher.stats["failed"], "seconds_to_deliver": round(elapsed, 3)}
+    print(json.dumps(row))
+    return row
+
+def bench_bodies(args):
+    # A large JSON endpoint checked four ways: reading the whole body, the default byte cap,
+    # a regex that matches near the start, and a JSONPath assertion (which needs the whole body).
+    body = b'{"status": "ok", "items": [' + b",".join(b'"item-%08d"' % i for i in range(args.body_mb * 1024 * 1024 // 16)) + b"]}"
+    server = StubServer(body=body)
+    cases = {"full_read": (None, len(body) + 1), "capped": (None, app.MAX_BODY_BYTES),
+             "regex_early_exit": ('"status": "ok"', app.MAX_BODY_BYTES), "jsonpath_full": ('$.status == "ok"', len(body) + 1)}
+    row = {"body_bytes": len(body), "checks": args.checks}
+    try:
+        for name, (assertion, max_bytes) in cases.items():
+            check = app.content_check(None, assertion)
+            times, read = [], 0
+            for _ in range(args.checks):
+                started = time.perf_counter()
+                res = app.perform_latency_check(server.url, check=check, max_body_bytes=max_bytes)
+                times.append((time.perf_counter() - started) * 1000)
+                read = res["body_bytes"]
+                assert res["up"], res["assertion_error"]
+            row[name + "_ms_p50"] = round(percentile(times, 50), 2)
+            row[name + "_bytes_read"] = read
+    finally:
+        server.close()
+    check = app.content_check("200-299", '"status":\\s*"ok"')
+    started = time.perf_counter()
+    for _ in range(100000):
+        check.status_ok(200) and check.regex.search(b'{"status": "ok"}')
+    row["assertion_eval_us"] = round((time.perf_counter() - started) * 10, 3)
+    print(json.dumps(row))
+    return row
+
+def bench_batch(args):
+    # The same URL list checked one POST /check_api at a time and with one streamed POST /check_api/batch.
+    servers = start_stub_servers(args.hosts, args.delay)
+    urls = [servers[i % len(servers)].url + "deploy/%d" % i for i in range(args.urls)]
+    app.log_store = app.LogStore(os.path.join(tempfile.mkdtemp(prefix="apimon-bench-"), "api_logs.ndjson"))
+    client = app.app.test_client()
+    row = {"urls": args.urls, "delay": args.delay, "concurrency": args.concurrency}
+    try:
+        sample = urls[:args.sequential_sample]
+        started = time.perf_counter()
+        for url in sample: client.post("/check_api", json={"api_url": url})
+        row["sequential_seconds_est"] = round((time.perf_counter() - started) * len(urls) / len(sample), 3)
+        stored_before = len(app.log_store)
+        started = time.perf_counter()
+        response = client.post("/check_api/batch", json={"urls": urls, "concurrency": args.concurrency, "timeout": 5})
+        first_line_ms, lines = None, []
+        for chunk in response.response:
+            if first_line_ms is None: first_line_ms = (time.perf_counter() - started) * 1000
+            lines.extend(json.loads(line) for line in chunk.decode().splitlines() if line)
+        response.close()
+        row["batch_seconds"] = round(time.perf_counter() - started, 3)
+        row["batch_first_result_ms"] = round(first_line_ms, 1)
+        row["batch_up"] = sum(1 for line in lines if line.get("up"))
+        row["batch_stored"] = len(app.log_store) - stored_before
+    finally:
+        for s in servers: s.close()
+    print(json.dumps(row))
+    return row
+
+def lease_state(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT worker_id, COUNT(*) FROM worker_leases WHERE worker_id IS NOT NULL AND expires_at > ? GROUP BY worker_id", (time.time(),)).fetchall())
+    except sqlite3.OperationalError:
+        return {}  # tables not created yet
+    finally:
+        conn.close()
+
+def wait_for(predicate, timeout, step=0.1):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate(): return True
+        time.sleep(step)
+    return False
+
+def duplicate_checks(conn, interval):
+    # Each monitor's checks fall in interval-long slots counted from its first check, rounded so
+    # probe lag does not split a slot. The scheduler runs a monitor at most once per slot, so every
+    # further check in a slot was run by a second worker.
+    slots, first = Counter(), {}
+    for api_id, ts in conn.execute("SELECT api_id, julianday(timestamp) * 86400 FROM monitoring_logs ORDER BY api_id, timestamp"):
+        slots[api_id, round((ts - first.setdefault(api_id, ts)) / interval)] += 1
+    return sum(n - 1 for n in slots.values())
+
+def bench_workers(args):
+    # N standalone `app.py --worker` processes share one database. Each worker's probe slots are capped
+    # with PROBE_CONCURRENCY and the stubs answer after a delay, so one worker cannot keep up with the
+    # monitors' schedule and committed checks/second shows how the load splits as workers are added.
+    servers = start_stub_servers(args.hosts, args.delay)
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=repo, PROBE_CONCURRENCY=str(args.probe_concurrency), PROBE_PER_HOST_CONCURRENCY=str(args.probe_concurrency),
+               WORKER_LEASE_SECONDS=str(args.lease_seconds), WORKER_RESYNC_SECONDS=str(args.lease_seconds / 3), ALERT_SENDER="")
+    results = []
+    try:
+        for count in [int(c) for c in args.workers.split(",")]:
+            workdir = tempfile.mkdtemp(prefix="apimon-bench-")
+            db = os.path.join(workdir, "monitoring.db")
+            app.DATABASE_FILE = db; app.init_db()
+            conn = sqlite3.connect(db)
+            conn.executemany("INSERT INTO monitored_apis (url, check_frequency_minutes) VALUES (?, ?)",
+                             [(servers[i % len(servers)].url + "m/%d" % i, args.interval / 60) for i in range(args.monitors)])
+            conn.commit(); conn.close()
+            procs = [subprocess.Popen([sys.executable, os.path.join(repo, "app.py"), "--worker"], cwd=workdir, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) for _ in range(count)]
+            row = {"workers": count, "monitors": args.monitors, "probe_concurrency": args.probe_concurrency, "delay": args.delay}
+            try:
+                balanced = wait_for(lambda: sorted(lease_state(db).values()) == sorted(app.WORKER_SHARDS // count + (i < app.WORKER_SHARDS % count) for i in range(count)),
+                                    timeout=4 * args.lease_seconds)
+                row["balanced"] = balanced
+                time.sleep(args.warmup)
+                conn = sqlite3.connect(db)
+                first_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM monitoring_logs").fetchone()[0]
+                time.sleep(args.duration)
+                checks = conn.execute("SELECT COUNT(*) FROM monitoring_logs WHERE id > ?", (first_id,)).fetchone()[0]
+                row["checks_per_second"] = round(checks / args.duration, 1)
+                if count > 1:
+                    victim = procs.pop()
+                    before = lease_state(db)
+                    victim.send_signal(signal.SIGKILL); victim.wait()
+                    killed_at = time.time()
+                    survivors = {w for w in before if int(w.split(":")[-2]) != victim.pid}  # worker ids are host:pid:suffix
+                    taken_over = wait_for(lambda: sum(n for w, n in lease_state(db).items() if w in survivors) == app.WORKER_SHARDS, timeout=4 * args.lease_seconds)
+                    row["takeover_seconds"] = round(time.time() - killed_at, 2) if taken_over else None
+                    time.sleep(args.interval)  # let the survivors run the moved monitors once
+                # Over the whole run: shards move while the workers balance at start-up and after the kill.
+                row["duplicate_checks"] = duplicate_checks(conn, args.interval)
+                conn.close()
+            finally:
+                for proc in procs: proc.terminate()
+                for proc in procs: proc.wait()
+            print(json.dumps(row))
+            results.append(row)
+    finally:
+        for s in servers: s.close()
+    return results
+
+# --- Seeded datasets ---
+def seed_dataset(workdir, monitors, rows, log_rows, days=30, seed=42):
+    """monitoring.db with `monitors` monitors and `rows` checks spread over the last `days` (rollups
+    included), and api_logs.ndjson with `log_rows` simple-checker results. The same seed gives the same data."""
+    rng = random.Random(seed)
+    db = os.path.join(workdir, "monitoring.db")
+    app.DATABASE_FILE = db; app.init_db()
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO monitored_apis (url, category, check_frequency_minutes) VALUES (?, 'bench', 1)",
+                     [("http://127.0.0.1/m/%d" % i,) for i in range(monitors)])
+    now, span = time.time(), days * 86400
+    for offset in range(0, rows, 50000):
+        batch = []
+        for i in range(offset, min(rows, offset + 50000)):
+            ts = datetime.fromtimestamp(now - span + span * i / rows).isoformat()
+            if rng.random() < 0.01:  # probe errors store no status or timings
+                batch.append((i % monitors + 1, ts, None, False, None, None, None, None, None, None, "timed out"))
+                continue
+            dns, tcp, tls, server, download = rng.uniform(0.5, 3), rng.uniform(1, 5), rng.uniform(5, 20), rng.lognormvariate(4, 0.6), rng.uniform(0.5, 10)
+            status = 200 if rng.random() > 0.02 else 503
+            batch.append((i % monitors + 1, ts, status, status == 200, dns + tcp + tls + server + download, dns, tcp, tls, server, download, None))
+        conn.executemany("INSERT INTO monitoring_logs (api_id, timestamp, status_code, is_up, total_latency_ms, dns_lookup_ms, tcp_connection_ms, "
+                         "tls_handshake_ms, server_processing_ms, content_download_ms, error_message) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.commit()
+    app.backfill_rollups(conn)
+    conn.execute("UPDATE monitored_apis SET last_checked_at = ?, last_status = 'Up'", (now,))
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # so monitoring.db alone can be copied
+    conn.close()
+    urls = ["https://svc%d.example.test/health" % i for i in range(50)]
+    with open(os.path.join(workdir, "api_logs.ndjson"), "w", encoding="utf-8") as f:
+        for offset in range(0, log_rows, 50000):
+            f.write("".join(json.dumps({"api_url": urls[i % len(urls)], "timestamp": datetime.fromtimestamp(now - span + span * i / max(log_rows, 1)).isoformat(),
+                                        "status_code": 200, "up": True, "total_latency_ms": round(rng.lognormvariate(4, 0.6), 2),
+                                        "header_name": "", "header_value": "", "diagnosis": "API appears healthy."}) + "\n"
+                            for i in range(offset, min(log_rows, offset + 50000))))
+    return db
+
+def bench_seed(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+    if os.path.exists(os.path.join(args.data_dir, "monitoring.db")):
+        raise SystemExit(f"{args.data_dir} already holds a monitoring.db; seed into an empty directory")
+    started = time.perf_counter()
+    db = seed_dataset(args.data_dir, args.monitors, args.rows, args.log_rows, args.days, args.seed)
+    row = {"monitors": args.monitors, "rows": args.rows, "log_rows": args.log_rows, "seed_seconds": round(time.perf_counter() - started, 1),
+           "db_bytes": os.path.getsize(db), "log_store_bytes": os.path.getsize(os.path.join(args.data_dir, "api_logs.ndjson"))}
+    print(json.dumps(row))
+    return row
+
+# --- Worker and routes under load ---
+def route_mix(monitors, log_urls):
+    """(name, path) of one request per dashboard route, for a random monitor."""
+    api_id, now = random.randint(1, monitors), time.time()
+    return random.choice([
+        ("monitors", "/api/advanced/monitors"),
+        ("history", "/api/advanced/history?id=%d" % api_id),
+        ("daily_summary", "/api/advanced/daily_summary?id=%d" % api_id),
+        ("summary_24h", "/api/advanced/summary?id=%d" % api_id),
+        ("summary_30d", "/api/advanced/summary?id=%d&start=%d&end=%d" % (api_id, now - 30 * 86400, now)),
+        ("percentiles_7d", "/api/advanced/percentiles?id=%d&window=7d" % api_id),
+        ("percentiles_all", "/api/advanced/percentiles?id=%d&window=all" % api_id),
+        ("last_logs", "/last_logs?page=%d" % random.randint(1, 50)),
+        ("chart_data", "/chart_data?url=%s&limit=200" % urllib.request.quote(random.choice(log_urls), safe="")) if log_urls else ("monitored_urls", "/monitored_urls"),
+        ("metrics", "/metrics"),
+    ])
+
+def bench_load(args):
+    # The embedded worker and the dashboard routes together on a copy of a seeded dataset. The worker's
+    # committed checks/second and scheduling lag are measured over the same window as the route latencies
+    # that HTTP clients see, so each shows the cost of the other.
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # one access log line per request would dominate the output
+    workdir = tempfile.mkdtemp(prefix="apimon-bench-")
+    if args.data_dir:
+        for name in ("monitoring.db", "api_logs.ndjson"): shutil.copy(os.path.join(args.data_dir, name), workdir)
+    else:
+        seed_dataset(workdir, args.monitors, args.rows, args.log_rows)
+    db = app.DATABASE_FILE = os.path.join(workdir, "monitoring.db")
+    app.init_db()
+    app.check_writer, app.read_pool, app.shard_leases = app.CheckWriter(db), app.ReadPool(db), app.ShardLeases(db)
+    app.log_store = app.LogStore(os.path.join(workdir, "api_logs.ndjson"))
+    log_urls = [record["api_url"] for record in app.log_store.latest_by_url()]
+
+    https_hosts = max(1, round(args.hosts * args.https_share)) if args.https_share else 0
+    stub_options = {"failure_rate": args.failure_rate, "body_bytes": args.body_bytes}
+    servers = start_stub_servers(args.hosts - https_hosts, args.delay, **stub_options)
+    if https_hosts:
+        tls = make_test_certificate(workdir, ["127.0.0.%d" % (args.hosts - https_hosts + 1 + i) for i in range(https_hosts)])
+        servers += start_stub_servers(https_hosts, args.delay, first_host=args.hosts - https_hosts + 1, tls=tls, **stub_options)
+    conn = sqlite3.connect(db)
+    ids = [r[0] for r in conn.execute("SELECT id FROM monitored_apis ORDER BY id")]
+    now = time.time()
+    # Spread the last checks over one interval so the run starts in a steady state instead of a burst.
+    conn.executemany("UPDATE monitored_apis SET url = ?, check_frequency_minutes = ?, last_checked_at = ?, is_active = 1 WHERE id = ?",
+                     [(servers[i % len(servers)].url + "m/%d" % api_id, args.interval / 60, now - random.uniform(0, args.interval), api_id) for i, api_id in enumerate(ids)])
+    conn.commit()
+
+    threading.Thread(target=app.monitor_worker, daemon=True).start()
+    web = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=web.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % web.server_port
+    row = {"monitors": len(ids), "history_rows": conn.execute("SELECT MAX(id) FROM monitoring_logs").fetchone()[0] or 0, "interval": args.interval,
+           "delay": args.delay, "failure_rate": args.failure_rate, "https_hosts": https_hosts, "clients": args.clients,
+           "demand_checks_per_second": round(len(ids) / args.interval, 1)}
+    try:
+        wait_for(lambda: len(app.shard_leases.owned) == app.shard_leases.shards, timeout=30)
+        time.sleep(args.warmup)
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM monitoring_logs").fetchone()[0]
+        lag_before = app.SCHEDULER_LAG.cumulative()
+        latencies, errors, stop_at = defaultdict(list), defaultdict(int), time.time() + args.duration
+
+        def client():
+            while time.time() < stop_at:
+                name, path = route_mix(len(ids), log_urls)
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(base + path, timeout=30) as response: response.read()
+                except (urllib.error.URLError, OSError):
+                    errors[name] += 1; continue
+                latencies[name].append((time.perf_counter() - started) * 1000)
+
+        clients = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+        for t in clients: t.start()
+        max_writer_depth = 0
+        while time.time() < stop_at:
+            max_writer_depth = max(max_writer_depth, app.check_writer.depth()); time.sleep(0.1)
+        for t in clients: t.join()
+        app.check_writer.flush()
+        checks, failed = conn.execute("SELECT COUNT(*), SUM(is_up = 0) FROM monitoring_logs WHERE id > ?", (first_id,)).fetchone()
+        lag = [after - before for before, after in zip(lag_before, app.SCHEDULER_LAG.cumulative())]
+        row.update({"checks_per_second": round(checks / args.duration, 1), "checks_failed": failed or 0, "max_writer_queue_depth": max_writer_depth,
+                    "lag_ms_p50": round(bucket_quantile(app.SCHEDULER_LAG.buckets, lag, 0.5) * 1000, 2) if lag[-1] else None,
+                    "lag_ms_p99": round(bucket_quantile(app.SCHEDULER_LAG.buckets, lag, 0.99) * 1000, 2) if lag[-1] else None})
+        for name in sorted(latencies):
+            row[f"route_{name}_ms_p50"] = round(percentile(latencies[name], 50), 2)
+            row[f"route_{name}_ms_p99"] = round(percentile(latencies[name], 99), 2)
+        row["route_requests"] = sum(len(v) for v in latencies.values())
+        row["route_errors"] = sum(errors.values())
+    finally:
+        web.shutdown()
+        conn.close()
+        for s in servers: s.close()
+    print(json.dumps(row))
+    return row
+
+# --- Reports ---
+def run_metadata():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"revision": revision, "recorded_at": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def write_report(path, args, results):
+    settings = {k: v for k, v in vars(args).items() if k not in ("output", "scenario")}
+    report = {"scenario": args.scenario, "args": settings, "meta": run_metadata(), "results": results if isinstance(results, list) else [results]}
+    with open(path, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+    print(f"Report written to {path}")
+
+def metric_direction(key):
+    """+1 if a larger value is better, -1 if a smaller one is, None for settings and counts."""
+    if key.endswith("_per_second"): return 1
+    if "_ms" in key or "_us_" in key or key.endswith(("_us", "_seconds")): return -1
+    return None
+
+def bench_compare(args):
+    # Exits non-zero when any timing or throughput in CURRENT is worse than BASELINE by more than --threshold.
+    with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f: current = json.load(f)
+    if baseline["scenario"] != current["scenario"]:
+        raise SystemExit(f"cannot compare a {baseline['scenario']} report with a {current['scenario']} report")
+    if baseline["args"] != current["args"]:
+        print("⚠️ The runs used different settings; differences may not be regressions.")
+    regressions, rows = [], []
+    for index, (old, new) in enumerate(zip(baseline["results"], current["results"])):
+        for key in sorted(old.keys() & new.keys()):
+            direction = metric_direction(key)
+            if direction is None or not isinstance(old[key], (int, float)) or not isinstance(new[key], (int, float)) or not old[key]: continue
+            change = (new[key] - old[key]) / abs(old[key])
+            row = {"result": index, "metric": key, "baseline": old[key], "current": new[key], "change": round(change, 4),
+                   "regression": change * direction < -args.threshold}
+            rows.append(row); print(json.dumps(row))
+            if row["regression"]: regressions.append(row)
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} between {baseline['meta'].get('revision')} and {current['meta'].get('revision')}.")
+    if regressions: sys.exit(1)
+    return rows
+
+
+SCENARIOS = {"probes": bench_probes, "scheduler": bench_scheduler, "writer": bench_writer, "mitm": bench_mitm,
+             "capture-query": bench_capture_query, "alerts": bench_alerts,
+             "bodies": bench_bodies, "batch": bench_batch, "workers": bench_workers, "seed": bench_seed, "load": bench_load,
+             "compare": bench_compare}
+
+def main():
+    parser = argparse.ArgumentParser(description="Local benchmarks for the API monitor.")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+    p = sub.add_parser("probes", help="checks/second of the probe engine against delayed stub servers")
+    p.add_argument("--monitors", type=int, default=200)
+    p.add_argument("--hosts", type=int, default=8)
+    p.add_argument("--delay", type=float, default=0.2, help="seconds each stub waits before answering")
+    p.add_argument("--concurrency", default="1,4,16,64")
+    p.add_argument("--per-host", type=int, default=app.PROBE_PER_HOST_CONCURRENCY)
+    p = sub.add_parser("scheduler", help="scheduling drift of the due-time scheduler with many monitors")
+    p.add_argument("--monitors", type=int, default=10000)
+    p.add_argument("--duration", type=float, default=30)
+    p = sub.add_parser("writer", help="insert throughput and read latency of the batched WAL writer")
+    p.add_argument("--results", type=int, default=50000)
+    p.add_argument("--monitors", type=int, default=500)
+    p.add_argument("--readers", type=int, default=4)
+    p = sub.add_parser("mitm", help="per-request overhead and write throughput of the generated mitmproxy addon")
+    p.add_argument("--flows", type=int, default=20000)
+    p = sub.add_parser("capture-query", help="latency of filtered queries over a large capture DB")
+    p.add_argument("--rows", type=int, default=1000000)
+    p.add_argument("--repeat", type=int, default=5)
+    p = sub.add_parser("alerts", help="alert dispatch against a slow, initially failing stub SMTP server")
+    p.add_argument("--monitors", type=int, default=500)
+    p.add_argument("--recipients", type=int, default=5)
+    p.add_argument("--smtp-delay", type=float, default=0.2, help="seconds the stub takes to accept each message")
+    p.add_argument("--fail-first", type=int, default=3, help="messages rejected with 451 before the stub accepts")
+    p.add_argument("--digest-window", type=float, default=1.0)
+    p = sub.add_parser("bodies", help="bounded, streaming body reads and assertion cost against a large endpoint")
+    p.add_argument("--body-mb", type=int, default=20)
+    p.add_argument("--checks", type=int, default=20)
+    p = sub.add_parser("batch", help="/check_api one URL at a time versus one streamed /check_api/batch request")
+    p.add_argument("--urls", type=int, default=500)
+    p.add_argument("--hosts", type=int, default=8)
+    p.add_argument("--delay", type=float, default=0.1)
+    p.add_argument("--concurrency", type=int, default=app.BATCH_CHECK_CONCURRENCY)
+    p.add_argument("--sequential-sample", type=int, default=20, help="sequential checks timed to estimate the one-at-a-time total")
+    p = sub.add_parser("workers", help="checks/second of 1..N standalone worker processes sharing one database, and crash takeover time")
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--monitors", type=int, default=3000)
+    p.add_argument("--hosts", type=int, default=8)
+    p.add_argument("--delay", type=float, default=0.2)
+    p.add_argument("--probe-concurrency", type=int, default=10, help="PROBE_CONCURRENCY of each worker")
+    p.add_argument("--interval", type=float, default=5, help="seconds between checks of one monitor")
+    p.add_argument("--lease-seconds", type=float, default=3)
+    p.add_argument("--warmup", type=float, default=3)
+    p.add_argument("--duration", type=float, default=20)
+    p = sub.add_parser("seed", help="write a reusable dataset: monitoring.db with history and rollups, and api_logs.ndjson")
+    p.add_argument("--data-dir", required=True)
+    p.add_argument("--monitors", type=int, default=500)
+    p.add_argument("--rows", type=int, default=2000000, help="monitoring_logs rows")
+    p.add_argument("--log-rows", type=int, default=1000000, help="simple-checker results")
+    p.add_argument("--days", type=int, default=30, help="history span")
+    p.add_argument("--seed", type=int, default=42)
+    p = sub.add_parser("load", help="embedded worker and dashboard routes under load on a seeded dataset")
+    p.add_argument("--data-dir", help="dataset written by `seed`; copied, never modified (default: a small fresh one)")
+    p.add_argument("--monitors", type=int, default=500, help="without --data-dir")
+    p.add_argument("--rows", type=int, default=200000, help="without --data-dir")
+    p.add_argument("--log-rows", type=int, default=100000, help="without --data-dir")
+    p.add_argument("--hosts", type=int, default=8)
+    p.add_argument("--https-share", type=float, default=0.25, help="share of stub hosts served over HTTPS")
+    p.add_argument("--delay", type=float, default=0.05)
+    p.add_argument("--failure-rate", type=float, default=0.02)
+    p.add_argument("--body-bytes", type=int, default=512)
+    p.add_argument("--interval", type=float, default=5, help="seconds between checks of one monitor")
+    p.add_argument("--clients", type=int, default=8, help="concurrent HTTP clients on the routes")
+    p.add_argument("--warmup", type=float, default=5)
+    p.add_argument("--duration", type=float, default=30)
+    for p in sub.choices.values():
+        p.add_argument("--output", help="also write the results, settings and machine details to this JSON report")
+    p = sub.add_parser("compare", help="compare two --output reports and fail on regressions")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.1, help="relative change treated as a regression")
+    args = parser.parse_args()
+    results = SCENARIOS[args.scenario](args)
+    if getattr(args, "output", None): write_report(args.output, args, results)
+
+if __name__ == "__main__":
+    main()
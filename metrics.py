@@ -0,0 +1,250 @@
+"""
+metrics.py
+In-process self-metrics for the monitoring service, rendered in the Prometheus text format,
+plus an opt-in sampling profiler. Histograms keep fixed buckets per label set, so recording a
+value is one bisect and one lock; nothing is sampled or stored per observation. Used by app.py.
+"""
+
+import bisect
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+PROFILER_INTERVAL = 0.01  # seconds between stack samples
+PROFILER_MAX_STACKS = 5000  # distinct stacks kept; further ones are counted under "[other]"
+PROFILER_MAX_DEPTH = 64
+IDLE_FRAMES = frozenset(("wait", "select", "poll", "accept", "_wait_for_tstate_lock"))  # innermost frames of threads that are only blocked
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def bucket_quantile(bounds, cumulative, q):
+    """Estimate quantile q from cumulative bucket counts, interpolating inside the bucket
+    as Prometheus' histogram_quantile() does. Values in the +Inf bucket report the last bound."""
+    total = cumulative[-1] if cumulative else 0
+    if not total:
+        return None
+    rank = q * total
+    index = bisect.bisect_left(cumulative, rank)
+    if index >= len(bounds):
+        return bounds[-1]
+    lower = bounds[index - 1] if index else 0
+    below = cumulative[index - 1] if index else 0
+    in_bucket = cumulative[index] - below
+    return lower + (bounds[index] - lower) * ((rank - below) / in_bucket if in_bucket else 0)
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterMetric:
+    """Monotonic count per label set."""
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name + "_total", labels, value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def cumulative(self, *labels):
+        """Cumulative bucket counts of one label set, +Inf last."""
+        with self._lock:
+            series = self._series.get(labels)
+            counts = list(series[0]) if series else [0] * (len(self.buckets) + 1)
+        return [sum(counts[:i + 1]) for i in range(len(counts))]
+
+    def quantile(self, q, *labels):
+        return bucket_quantile(self.buckets, self.cumulative(*labels), q)
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                yield self.name + "_bucket", labels, cumulative, (("le", _number(bound)),)
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Callback:
+    """A gauge or counter read from the application when /metrics is scraped.
+
+    fn returns a number, or a dict of label-value tuples to numbers.
+    """
+    def __init__(self, name, help, fn, kind="gauge", labels=()):
+        self.name, self.help, self.fn, self.kind, self.label_names = name, help, fn, kind, tuple(labels)
+
+    def samples(self):
+        value = self.fn()
+        name = self.name + "_total" if self.kind == "counter" else self.name
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                yield name, labels if isinstance(labels, tuple) else (labels,), v
+        elif value is not None:
+            yield name, (), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(CounterMetric(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, fn, kind="gauge", labels=()):
+        return self._add(Callback(name, help, fn, kind, labels))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:  # one broken callback must not take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample in samples:
+                name, labels, value = sample[:3]
+                extra = sample[3] if len(sample) > 3 else ()
+                lines.append(f"{name}{_labels(metric.label_names, labels, extra)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Periodically samples the Python stack of every thread while enabled.
+
+    Stacks are aggregated as "thread;outer;...;inner" strings (the folded format flame graph
+    tools read), so memory is bounded by the number of distinct stacks, not the run time.
+    Nothing runs while the profiler is stopped. Threads blocked in a lock, queue or selector wait
+    are skipped unless include_idle is set, so the top stacks are the ones using the CPU or the network.
+    """
+    def __init__(self, interval=PROFILER_INTERVAL, max_stacks=PROFILER_MAX_STACKS, max_depth=PROFILER_MAX_DEPTH, include_idle=False):
+        self.interval, self.max_stacks, self.max_depth, self.include_idle = interval, max_stacks, max_depth, include_idle
+        self._stacks = Counter()
+        self._samples = 0
+        self._started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if interval:
+                self.interval = interval
+            if self._thread is None:
+                self._stop.clear()
+                self._started_at = time.time()
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+            self._started_at = time.time() if self._thread else None
+
+    def _stack(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {t.ident: t.name for t in threading.enumerate()}
+            stacks = [f"{threads.get(ident, ident)};{self._stack(frame)}" for ident, frame in sys._current_frames().items()
+                      if ident != me and (self.include_idle or frame.f_code.co_name not in IDLE_FRAMES)]
+            with self._lock:
+                self._samples += 1
+                for stack in stacks:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self._stacks["[other]"] += 1
+
+    def snapshot(self, limit=50):
+        with self._lock:
+            top = self._stacks.most_common(limit)
+            return {"enabled": self.enabled, "interval": self.interval, "samples": self._samples, "started_at": self._started_at,
+                    "distinct_stacks": len(self._stacks), "top": [{"stack": stack, "count": count} for stack, count in top]}
+
+    def folded(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
@@ -13,6 +13,8 @@ document.addEventListener('DOMContentLoaded', () => {
           apiEditId = document.getElementById('apiEditId'),
           tooltip = document.getElementById('tooltip');
     let detailChart = null;
+    // Set while the details view shows the newest history page, so live results can be prepended.
+    let liveHistory = null;
 
     // --- Core Functions ---
     async function fetchMonitors() {
@@ -34,7 +36,11 @@ document.addEventListener('DOMContentLoaded', () => {
             header_name: document.getElementById('apiHeaderName').value,
             header_value: document.getElementById('apiHeaderValue').value,
             notification_email: document.getElementById('apiEmail').value,
-            frequency: parseInt(document.getElementById('apiFrequency').value, 10)
+            cold_dns: document.getElementById('apiColdDns').checked,
+            expected_status: document.getElementById('apiExpectedStatus').value,
+            body_assertion: document.getElementById('apiBodyAssertion').value,
+            max_body_bytes: document.getElementById('apiMaxBodyBytes').value ? parseInt(document.getElementById('apiMaxBodyBytes').value, 10) : null,
+            frequency: parseFloat(document.getElementById('apiFrequency').value)
         };
         let url = '/api/advanced/add_monitor';
         if (editId) {
@@ -52,12 +58,13 @@ document.addEventListener('DOMContentLoaded', () => {
         fetchMonitors();
     }
 
-    async function showDetails(monitor, page = 1) {
+    async function showDetails(monitor) {
         mainView.classList.add('hidden');
         detailsView.classList.remove('hidden');
         detailsView.innerHTML = `
             <a href="#" id="backBtn" class="back-button"><svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 20 20" fill="currentColor"><path fill-rule="evenodd" d="M12.707 5.293a1 1 0 010 1.414L9.414 10l3.293 3.293a1 1 0 01-1.414 1.414l-4-4a1 1 0 010-1.414l4-4a1 1 0 011.414 0z" clip-rule="evenodd"></path></svg>Back to Status List</a>
             <div class="details-header"><div><h2 style="word-break: break-all;">${monitor.url}</h2><p style="color: #6B7280;"><strong>Category:</strong> ${monitor.category || 'N/A'}</p></div></div>
+            <p id="percentileSummary" style="color: #6B7280;"></p>
             <h3>24-Hour Uptime</h3>
             <div class="daily-history-bar"><div class="daily-history-bar-inner" id="dailyHistoryBar"></div></div>
             <div style="height: 300px; margin-bottom: 2rem;"><canvas id="detailChartCanvas"></canvas></div>
@@ -65,15 +72,21 @@ document.addEventListener('DOMContentLoaded', () => {
             <div id="historyPagination" class="pagination-controls"></div>
         `;
         document.getElementById('backBtn').addEventListener('click', showMainView);
-        fetchHistory(monitor, page);
+        fetchHistory(monitor);
         renderDailyHistoryBar(monitor.id);
+        renderPercentiles(monitor.id);
     }
     
-    async function fetchHistory(monitor, page = 1) {
-        const response = await fetch(`/api/advanced/history?id=${monitor.id}&page=${page}`);
+    // cursors[i] is the cursor that loads page i + 1; the first page needs none.
+    async function fetchHistory(monitor, cursors = [null]) {
+        const cursor = cursors[cursors.length - 1];
+        const response = await fetch(`/api/advanced/history?id=${monitor.id}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`);
         const data = await response.json();
+        liveHistory = cursors.length === 1 ? { monitorId: monitor.id, logs: data.history } : null;
         renderHistoryLog(data.history);
-        renderPagination('historyPagination', data.current_page, data.total_pages, (newPage) => fetchHistory(monitor, newPage));
+        renderCursorPagination('historyPagination', cursors.length, data.total_pages, cursors.length > 1, !!data.next_cursor,
+            () => fetchHistory(monitor, cursors.slice(0, -1)),
+            () => fetchHistory(monitor, [...cursors, data.next_cursor]));
         renderDetailChart(data.history);
     }
 
@@ -101,6 +114,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const item = document.createElement('div');
             item.className = 'monitor-item';
             item.dataset.monitor = JSON.stringify(m);
+            item.dataset.id = m.id;
             item.innerHTML = `
                 <div class="monitor-item-info"><strong>${m.url}</strong><small>${m.category || 'No Category'}</small></div>
                 <div class="monitor-item-right">
@@ -127,17 +141,47 @@ document.addEventListener('DOMContentLoaded', () => {
             <table class="history-log-table">
                 <thead><tr><th>Timestamp</th><th>Status</th><th>Latency</th><th></th></tr></thead>
                 <tbody>
-                    ${logs.map(log => `
+                    ${logs.map(historyRowHtml).join('')}
+                </tbody>
+            </table>
+        `;
+    }
+
+    function historyRowHtml(log) {
+        return `
                         <tr>
                             <td>${new Date(log.timestamp).toLocaleString()}</td>
                             <td><span class="status status-${log.is_up ? 'Up' : (log.error_message ? 'Error' : 'Down')}">${log.is_up ? 'Operational' : (log.error_message ? 'Error' : 'Outage')}</span></td>
                             <td>${log.total_latency_ms ? log.total_latency_ms + ' ms' : 'N/A'}</td>
                             <td><button class="report-btn" data-log-id="${log.id}">See Report</button></td>
                         </tr>
-                    `).join('')}
-                </tbody>
-            </table>
-        `;
+                    `;
+    }
+
+    // --- Live Updates ---
+    function applyCheckEvent(check) {
+        const item = monitorListDiv.querySelector(`.monitor-item[data-id="${check.api_id}"]`);
+        if (item) {
+            const monitor = JSON.parse(item.dataset.monitor);
+            monitor.last_status = check.status;
+            monitor.last_checked_at = check.last_checked_at;
+            item.dataset.monitor = JSON.stringify(monitor);
+            const badge = item.querySelector('.status');
+            badge.className = `status status-${check.status}`;
+            badge.textContent = check.status;
+        }
+        if (liveHistory && liveHistory.monitorId === check.api_id && !detailsView.classList.contains('hidden')) {
+            liveHistory.logs = [check, ...liveHistory.logs].slice(0, liveHistory.logs.length || 1);
+            renderHistoryLog(liveHistory.logs);
+            renderDetailChart(liveHistory.logs);
+        }
+    }
+
+    function connectLiveUpdates() {
+        if (!window.EventSource) return;
+        const source = new EventSource('/api/advanced/stream');
+        source.addEventListener('check', (e) => applyCheckEvent(JSON.parse(e.data)));
+        source.addEventListener('monitors', () => fetchMonitors());
     }
 
     function openModal(modalId) { document.getElementById(modalId).classList.remove('hidden'); }
@@ -187,6 +231,10 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('apiHeaderName').value = monitor.header_name || '';
         document.getElementById('apiHeaderValue').value = monitor.header_value || '';
         document.getElementById('apiEmail').value = monitor.notification_email || '';
+        document.getElementById('apiColdDns').checked = Boolean(monitor.cold_dns);
+        document.getElementById('apiExpectedStatus').value = monitor.expected_status || '';
+        document.getElementById('apiBodyAssertion').value = monitor.body_assertion || '';
+        document.getElementById('apiMaxBodyBytes').value = monitor.max_body_bytes || '';
         document.getElementById('apiFrequency').value = monitor.check_frequency_minutes;
         openModal('addApiModal');
     }
@@ -200,15 +248,15 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function renderSparkline(apiId) {
         const container = document.getElementById(`sparkline-${apiId}`);
-        const response = await fetch(`/api/advanced/daily_summary?id=${apiId}`);
-        const data = await response.json();
+        const response = await fetch(`/api/advanced/summary?id=${apiId}&points=48`);
+        const data = (await response.json()).buckets;
         if (data.length === 0) return;
         new Chart(container, {
             type: 'line',
             data: {
-                labels: data.map(d => d.timestamp),
+                labels: data.map(d => d.bucket_start),
                 datasets: [{
-                    data: data.map(d => d.total_latency_ms || 0),
+                    data: data.map(d => d.latency_mean_ms || 0),
                     borderColor: '#4f46e5',
                     borderWidth: 2,
                     pointRadius: 0,
@@ -226,35 +274,38 @@ document.addEventListener('DOMContentLoaded', () => {
     
     async function renderDailyHistoryBar(apiId) {
         const container = document.getElementById('dailyHistoryBar');
-        const response = await fetch(`/api/advanced/daily_summary?id=${apiId}`);
-        const data = await response.json();
+        const response = await fetch(`/api/advanced/summary?id=${apiId}&points=96`);
+        const data = (await response.json()).buckets;
         if (data.length === 0) return;
-        container.innerHTML = data.map(log => {
-            const color = log.is_up ? 'var(--status-up)' : (log.error_message ? 'var(--status-error)' : 'var(--status-down)');
-            const status = log.is_up ? 'Up' : (log.error_message ? 'Error' : 'Down');
-            const title = `${new Date(log.timestamp).toLocaleString()}: ${status} (${log.total_latency_ms || 'N/A'})`;
+        container.innerHTML = data.map(bucket => {
+            const allUp = bucket.up_count === bucket.check_count;
+            const color = allUp ? 'var(--status-up)' : (bucket.error_count ? 'var(--status-error)' : 'var(--status-down)');
+            const status = allUp ? 'Up' : (bucket.error_count ? 'Error' : 'Down');
+            const title = `${new Date(bucket.bucket_start * 1000).toLocaleString()}: ${status}, ${bucket.uptime_pct}% up (mean ${bucket.latency_mean_ms || 'N/A'} ms, p95 ${bucket.latency_p95_ms || 'N/A'} ms)`;
             return `<div class="history-bar-segment" style="background-color: ${color};" title="${title}"></div>`;
         }).join('');
     }
     
-    function renderPagination(elementId, currentPage, totalPages, clickHandler) {
+    async function renderPercentiles(apiId) {
+        const response = await fetch(`/api/advanced/percentiles?id=${apiId}&window=24h`);
+        const data = await response.json();
+        const total = data.percentiles && data.percentiles.total;
+        if (!total || !total.count) return;
+        document.getElementById('percentileSummary').innerHTML = `<strong>24h latency:</strong> p50 ${total.p50} ms &middot; p90 ${total.p90} ms &middot; p99 ${total.p99} ms`;
+    }
+
+    function renderCursorPagination(elementId, currentPage, totalPages, hasNewer, hasOlder, onNewer, onOlder) {
         const container = document.getElementById(elementId);
-        if (!container || totalPages <= 1) {
-            if (container) container.innerHTML = '';
-            return;
-        }
-        let html = '';
-        for (let i = 1; i <= totalPages; i++) {
-            html += `<button class="${i === currentPage ? 'active' : ''}" data-page="${i}">${i}</button>`;
-        }
-        container.innerHTML = html;
-        container.querySelectorAll('button').forEach(button => {
-            button.addEventListener('click', (e) => {
-                clickHandler(parseInt(e.target.dataset.page, 10));
-            });
-        });
+        if (!container) return;
+        if (!hasNewer && !hasOlder) { container.innerHTML = ''; return; }
+        container.innerHTML = `
+            <button data-dir="newer" ${hasNewer ? '' : 'disabled'}>&laquo; Newer</button>
+            <span>Page ${currentPage} of ~${Math.max(totalPages, currentPage)}</span>
+            <button data-dir="older" ${hasOlder ? '' : 'disabled'}>Older &raquo;</button>`;
+        container.querySelector('[data-dir="newer"]').addEventListener('click', onNewer);
+        container.querySelector('[data-dir="older"]').addEventListener('click', onOlder);
     }
-    
+
     function renderDetailChart(history) {
         const ctx = document.getElementById('detailChartCanvas');
         if (!ctx) return;
@@ -292,4 +343,5 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Init ---
     setupInitialEventListeners();
     fetchMonitors();
+    connectLiveUpdates();
 });
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+stream_export.py
+Chunked export of SQLite query results as CSV or NDJSON, optionally gzip-compressed.
+Rows are pulled with fetchmany and encoded batch by batch, so memory stays flat however
+many rows are exported. Used by the capture GUI (api_monitor.py) and the monitoring service (app.py).
+"""
+
+import csv
+import io
+import json
+import zlib
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_CHUNK_ROWS = 1000  # rows fetched and encoded per chunk
+GZIP_LEVEL = 6
+
+
+def encode_rows(cursor, fmt="csv", chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the rows of an executed cursor as UTF-8 bytes, one chunk per fetchmany batch.
+
+    CSV output starts with a header row taken from the cursor's column names.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    columns = [d[0] for d in cursor.description]
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        if writer:
+            writer.writerows(rows)
+        else:
+            buf.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """Compress a byte-chunk stream into a single gzip member without buffering it."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def export_chunks(cursor, fmt="csv", compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    chunks = encode_rows(cursor, fmt, chunk_rows)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_to_file(outpath, cursor, fmt="csv", compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write an export to `outpath`; returns the number of bytes written."""
+    written = 0
+    with open(outpath, "wb") as f:
+        for chunk in export_chunks(cursor, fmt, compress, chunk_rows):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def export_format_for_path(path):
+    """Pick (format, compress) from a file name such as captures.ndjson.gz; CSV by default."""
+    name = str(path).lower()
+    compress = name.endswith(".gz")
+    if compress:
+        name = name[:-3]
+    return ("ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv"), compress
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated monitoring.db in tmp_path, also used by the module-level read pool."""
+    path = str(tmp_path / "monitoring.db")
+    monkeypatch.setattr(app, "DATABASE_FILE", path)
+    app.init_db()
+    monkeypatch.setattr(app, "read_pool", app.ReadPool(path))
+    return path
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
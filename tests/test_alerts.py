@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+import app
+from benchmark import StubSMTPServer
+
+
+def api(api_id, email="ops@example.com"):
+    return {"id": api_id, "url": f"http://127.0.0.1/m/{api_id}", "notification_email": email}
+
+
+@pytest.fixture
+def smtp():
+    server = StubSMTPServer(fail_first=0)
+    yield server
+    server.close()
+
+
+def dispatcher(smtp, **options):
+    return app.AlertDispatcher(host="127.0.0.1", port=smtp.port, security="none", username="", password="", sender="monitor@example.com", **options)
+
+
+def test_stop_sends_the_open_digest_with_the_latest_state_per_monitor(smtp):
+    alerts = dispatcher(smtp, digest_window=3600).start()
+    alerts.notify(api(1), "down", "HTTP 503"); alerts.notify(api(1), "recovered"); alerts.notify(api(2), "down", "timed out")
+    alerts.notify(api(3, email=None), "down")  # no recipient: never queued
+    alerts.stop()
+    assert len(smtp.messages) == 1
+    assert b"Subject: API Alert: 1 down, 1 recovered" in smtp.messages[0]
+    assert alerts.pending() == 0 and alerts.stats["queued"] == 3
+
+
+def test_recipients_get_separate_digests(smtp):
+    alerts = dispatcher(smtp, digest_window=0.05).start()
+    alerts.notify(api(1, "a@example.com"), "down"); alerts.notify(api(2, "b@example.com"), "down")
+    deadline = time.monotonic() + 5
+    while len(smtp.messages) < 2 and time.monotonic() < deadline: time.sleep(0.02)
+    alerts.stop()
+    assert len(smtp.messages) == 2 and smtp.connections == 1  # one reused SMTP connection
+
+
+def test_rejected_sends_are_retried():
+    smtp_failing = StubSMTPServer(fail_first=2)
+    try:
+        alerts = dispatcher(smtp_failing, digest_window=0, retry_base=0.01).start()
+        alerts.notify(api(1), "down")
+        deadline = time.monotonic() + 5
+        while not smtp_failing.messages and time.monotonic() < deadline: time.sleep(0.02)
+        alerts.stop()
+        assert len(smtp_failing.messages) == 1 and smtp_failing.rejected == 2
+        assert (alerts.stats["retries"], alerts.stats["failed"]) == (2, 0)
+    finally:
+        smtp_failing.close()
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class FakeChecks:
+    """Stands in for simple_check: each URL's path says how long it takes and whether it fails."""
+    def __init__(self):
+        self.lock, self.running, self.peak = threading.Lock(), 0, 0
+
+    def __call__(self, api_url, header_name=None, header_value=None, timeout=app.PROBE_TIMEOUT):
+        with self.lock:
+            self.running += 1; self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(float(api_url.rsplit("/", 1)[1]))
+            if "fail" in api_url: raise ConnectionError("refused")
+            return {"api_url": api_url, "status_code": 200, "up": True, "header_name": header_name or "", "header_value": header_value or ""}
+        finally:
+            with self.lock: self.running -= 1
+
+
+@pytest.fixture
+def checks(monkeypatch, tmp_path):
+    fake = FakeChecks()
+    monkeypatch.setattr(app, "simple_check", fake)
+    monkeypatch.setattr(app, "log_store", app.LogStore(str(tmp_path / "api_logs.ndjson")))
+    return fake
+
+
+def post(body):
+    return app.app.test_client().post("/check_api/batch", json=body)
+
+
+def lines(response):
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def test_lines_stream_in_completion_order_and_results_are_saved(checks):
+    response = post({"urls": ["http://a.test/0.3", "http://b.test/0", "http://fail.test/0.1"], "header_name": "X-Key", "header_value": "k"})
+    assert response.mimetype == "application/x-ndjson"
+    rows = lines(response)
+    assert [row["index"] for row in rows] == [1, 2, 0]
+    assert rows[0]["header_name"] == "X-Key" and rows[0]["up"]
+    assert rows[1] == {"index": 2, "api_url": "http://fail.test/0.1", "status_code": 500, "up": False, "error": "refused"}
+    assert sorted(r["api_url"] for r in app.log_store.newest(0, 10)) == ["http://a.test/0.3", "http://b.test/0"]  # failures are not saved
+
+
+def test_first_line_arrives_before_the_slowest_probe_ends(checks):
+    response = post({"urls": ["http://slow.test/0.5", "http://fast.test/0"]})
+    started = time.monotonic()
+    first = json.loads(next(iter(response.response)))
+    assert first["index"] == 1 and time.monotonic() - started < 0.4
+    response.close()
+
+
+def test_slow_probes_time_out_and_still_hold_their_slot(checks):
+    started = time.monotonic()
+    rows = lines(post({"urls": ["http://slow.test/0.6", "http://fast.test/0", "http://fast.test/0.05"], "concurrency": 1, "timeout": 0.2}))
+    by_index = {row["index"]: row for row in rows}
+    assert by_index[0]["error"] == "No result within 0.2s" and by_index[1]["up"] and by_index[2]["up"]
+    assert checks.peak == 1 and time.monotonic() - started >= 0.6  # the timed-out probe kept the only slot until it returned
+
+
+@pytest.mark.parametrize("body", [{}, {"urls": "http://a.test/0"}, {"urls": ["http://a.test/0"] * (app.BATCH_CHECK_MAX_URLS + 1)},
+                                  {"urls": [{"header_name": "X"}]}, {"urls": ["http://a.test/0"], "timeout": "soon"}])
+def test_bad_requests_are_rejected_before_probing(checks, body):
+    assert post(body).status_code == 400 and checks.peak == 0
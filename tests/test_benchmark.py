@@ -0,0 +1,36 @@
+import argparse
+import json
+
+import pytest
+
+from benchmark import bench_compare, metric_direction
+
+
+@pytest.mark.parametrize("key, direction", [
+    ("inserts_per_second", 1), ("read_ms_p99", -1), ("seconds", None), ("wall_seconds", -1),
+    ("hook_us_p50", -1), ("notify_us_max", -1), ("assertion_eval_us", -1),
+    ("connection_reused", None), ("monitors", None),
+])
+def test_metric_direction(key, direction):
+    assert metric_direction(key) == direction
+
+
+def report(path, **result):
+    path.write_text(json.dumps({"scenario": "mitm", "args": {"flows": 100}, "meta": {"revision": path.stem}, "results": [result]}))
+    return str(path)
+
+
+def test_compare_flags_slower_microsecond_timings(tmp_path, capsys):
+    args = argparse.Namespace(baseline=report(tmp_path / "old.json", hook_us_p50=10.0, flows_per_second=1000.0),
+                              current=report(tmp_path / "new.json", hook_us_p50=15.0, flows_per_second=1050.0), threshold=0.1)
+    with pytest.raises(SystemExit) as exit:
+        bench_compare(args)
+    assert exit.value.code == 1
+    assert "1 regression(s) beyond 10%" in capsys.readouterr().out
+
+
+def test_compare_passes_faster_microsecond_timings(tmp_path):
+    args = argparse.Namespace(baseline=report(tmp_path / "old.json", hook_us_p50=15.0),
+                              current=report(tmp_path / "new.json", hook_us_p50=10.0), threshold=0.1)
+    rows = bench_compare(args)
+    assert [(row["metric"], row["regression"]) for row in rows] == [("hook_us_p50", False)]
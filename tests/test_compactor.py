@@ -0,0 +1,23 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import app
+
+
+def test_compactor_drops_expired_rows_only(db):
+    conn = sqlite3.connect(db)
+    now = datetime.now()
+    conn.executemany("INSERT INTO monitoring_logs (api_id, timestamp, is_up) VALUES (1, ?, 1)",
+                     [((now - timedelta(days=days)).isoformat(),) for days in (0, 1, 6, 8, 30, 30)])
+    old, recent = int(time.time() - 100 * 86400), int(time.time() - 3600)
+    conn.executemany("INSERT INTO monitoring_rollups (api_id, resolution, bucket_start, check_count, up_count, error_count, latency_count, latency_sum) "
+                     "VALUES (1, ?, ?, 1, 1, 0, 0, 0)", [(60, old), (60, recent), (3600, old), (86400, old)])
+    conn.commit()
+
+    report = app.Compactor(db, raw_days=7, minute_days=90, batch_size=2, pause=0).run_once()
+
+    assert (report["raw_rows_deleted"], report["rollup_rows_deleted"]) == (3, 1)
+    assert conn.execute("SELECT COUNT(*) FROM monitoring_logs").fetchone()[0] == 3
+    assert sorted(conn.execute("SELECT resolution, bucket_start FROM monitoring_rollups").fetchall()) == [(60, recent), (3600, old), (86400, old)]
+    conn.close()
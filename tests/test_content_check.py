@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+import app
+
+
+class FakeResponse:
+    """The part of http.client.HTTPResponse that _read_body uses."""
+    def __init__(self, body):
+        self._body = io.BytesIO(body)
+        self._size = len(body)
+
+    def read(self, n):
+        return self._body.read(n)
+
+    def isclosed(self):
+        return self._body.tell() >= self._size
+
+
+def read(check, body, max_bytes=app.MAX_BODY_BYTES):
+    phases = {"download": 0.0}
+    return app._read_body(FakeResponse(body), phases, check, max_bytes)
+
+
+@pytest.mark.parametrize("expected, status, ok", [
+    (None, 204, True), (None, 399, True), (None, 404, False),
+    ("200", 200, True), ("200", 201, False),
+    ("200,204,300-399", 204, True), ("200,204,300-399", 302, True), ("200,204,300-399", 400, False),
+    (" 404 , 500-503 ", 503, True),
+])
+def test_expected_status(expected, status, ok):
+    assert app.ContentCheck(expected_status=expected).status_ok(status) is ok
+
+
+@pytest.mark.parametrize("expected", ["2xx", "200-", "-200", "200;201"])
+def test_invalid_expected_status_is_rejected(expected):
+    with pytest.raises(ValueError):
+        app.ContentCheck(expected_status=expected)
+
+
+@pytest.mark.parametrize("assertion, body, error", [
+    ("$.status", b'{"status": "ok"}', None),
+    ("$.data[0].state == \"ready\"", b'{"data": [{"state": "ready"}]}', None),
+    ("$.data[0].state == ready", b'{"data": [{"state": "ready"}]}', None),  # unquoted values compare as strings
+    ("$['odd key'].count == 3", b'{"odd key": {"count": 3}}', None),
+    ("$.data[0].state == \"ready\"", b'{"data": [{"state": "down"}]}', 'JSONPath value "down" != "ready"'),
+    ("$.data[1]", b'{"data": []}', "JSONPath step 1 not found"),
+    ("$.status", b"<html>", "Body is not valid JSON"),
+])
+def test_json_path_assertions(assertion, body, error):
+    check = app.ContentCheck(body_assertion=assertion)
+    assert read(check, body)[2] == error
+
+
+def test_json_path_on_a_truncated_body_is_not_evaluated():
+    check = app.ContentCheck(body_assertion="$.status")
+    total, complete, error = read(check, b'{"status": "ok"}', max_bytes=5)
+    assert (total, complete) == (5, False)
+    assert error == "Body exceeds max_body_bytes; JSONPath assertion not evaluated"
+
+
+@pytest.mark.parametrize("path", ["$.", "$[x]", "$.a..b", "$.a[0"])
+def test_invalid_json_path_is_rejected(path):
+    with pytest.raises(ValueError):
+        app.ContentCheck(body_assertion=path)
+
+
+def test_regex_matches_across_chunk_boundaries_and_stops_reading():
+    check = app.ContentCheck(body_assertion=r"healthy: (yes|true)")
+    body = b"x" * (app.BODY_CHUNK_BYTES - 5) + b"healthy: yes" + b"y" * (4 * app.BODY_CHUNK_BYTES)
+    total, complete, error = read(check, body)
+    assert error is None and not complete and total == 2 * app.BODY_CHUNK_BYTES
+
+
+def test_regex_not_found():
+    check = app.ContentCheck(body_assertion="healthy")
+    assert read(check, b"degraded")[2] == "Body assertion not matched"
+    assert read(check, b"degraded" * 10, max_bytes=16)[2] == "Body assertion not matched within the first 16 bytes"
+
+
+def test_invalid_regex_is_rejected():
+    with pytest.raises(ValueError, match="Invalid body assertion regex"):
+        app.ContentCheck(body_assertion="(unclosed")
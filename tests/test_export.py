@@ -0,0 +1,43 @@
+import gzip
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(db):
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO monitoring_logs (api_id, timestamp, is_up, total_latency_ms) VALUES (?, ?, 1, ?)",
+                     [(api_id, datetime.fromtimestamp(1_700_000_000 + i * 60).isoformat(), 10.0 + i) for i in range(10) for api_id in (1, 2)])
+    conn.commit(); conn.close()
+    return app.app.test_client()
+
+
+def test_ndjson_export_covers_the_window(client):
+    response = client.get("/api/advanced/export", query_string={"id": 1, "format": "ndjson", "start": 1_700_000_000 + 120, "end": 1_700_000_000 + 420})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [row["total_latency_ms"] for row in rows] == [12.0, 13.0, 14.0, 15.0, 16.0]
+    assert {row["api_id"] for row in rows} == {1}
+
+
+def test_gzip_csv_export(client):
+    response = client.get("/api/advanced/export", query_string={"id": 2, "gzip": 1, "start": 1_700_000_000, "end": 1_700_001_000})
+    assert response.headers["Content-Disposition"] == "attachment; filename=monitor-2.csv.gz"
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert lines[0].startswith("id,api_id,") and len(lines) == 11
+
+
+@pytest.mark.parametrize("args", [{"start": "1e20"}, {"end": "1e20"}, {"start": "yesterday"}, {"end": "nan"}])
+def test_bad_window_is_a_400_before_streaming(client, args):
+    response = client.get("/api/advanced/export", query_string={"id": 1, **args})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "start and end must be epoch seconds"}
+
+
+def test_unknown_format_is_a_400(client):
+    assert client.get("/api/advanced/export?id=1&format=xml").status_code == 400
@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(app, "_history_counts", {})
+    conn = sqlite3.connect(db)
+    # Two rows share each timestamp, so pages must break ties on id.
+    conn.executemany("INSERT INTO monitoring_logs (api_id, timestamp, is_up) VALUES (?, ?, 1)",
+                     [(api_id, f"2026-01-01T00:00:{i // 2:02d}") for i in range(25) for api_id in (1, 2)])
+    conn.commit(); conn.close()
+    return app.app.test_client()
+
+
+def test_cursor_pages_cover_every_row_once_newest_first(client):
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/advanced/history", query_string={"id": 1, "limit": 7, **({"cursor": cursor} if cursor else {})}).get_json()
+        seen += [(row["timestamp"], row["id"]) for row in page["history"]]
+        assert all(row["api_id"] == 1 for row in page["history"])
+        cursor = page["next_cursor"]
+        if cursor is None: break
+    assert len(seen) == 25 == page["total_items"] and page["total_pages"] == 4
+    assert seen == sorted(seen, reverse=True) and len(set(seen)) == 25
+
+
+def test_last_page_has_no_cursor(client):
+    page = client.get("/api/advanced/history?id=1&limit=25").get_json()
+    assert len(page["history"]) == 25 and page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "2026-01-01T00:00:05|x", "|"])
+def test_malformed_cursor_is_a_400(client, cursor):
+    response = client.get("/api/advanced/history", query_string={"id": 1, "cursor": cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "invalid cursor"}
+
+
+@pytest.mark.parametrize("limit, size", [(0, 1), (-3, 1), (1000, 25)])
+def test_limit_is_clamped(client, limit, size):
+    response = client.get("/api/advanced/history", query_string={"id": 1, "limit": limit})
+    assert response.status_code == 200
+    page = response.get_json()
+    assert len(page["history"]) == size
+    assert (page["next_cursor"] is None) == (size == 25)
@@ -0,0 +1,81 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+
+class Origin:
+    """A local HTTP/1.1 server with a slow route, a redirect chain and a count of accepted connections."""
+    def __init__(self):
+        origin = self
+        self.connections = 0
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def setup(self):
+                origin.connections += 1
+                super().setup()
+            def do_GET(self):
+                if self.path.startswith("/hop/"):
+                    left = int(self.path.rsplit("/", 1)[1])
+                    self.send_response(302); self.send_header("Location", f"/hop/{left - 1}" if left > 1 else "/slow")
+                    self.send_header("Content-Length", "0"); self.end_headers()
+                    return
+                if self.path == "/slow": time.sleep(0.05)
+                body = b'{"status": "ok"}'
+                self.send_response(200); self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body))); self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://127.0.0.1:%d" % self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+
+@pytest.fixture
+def origin():
+    server = Origin()
+    yield server
+    server.close()
+
+
+def test_phases_add_up_to_the_total(origin):
+    result = app.perform_latency_check(origin.url + "/slow")
+    assert (result["status_code"], result["up"], result["url_type"], result["body_bytes"]) == (200, True, "API", 16)
+    assert result["server_processing_ms"] >= 50 and result["tls_handshake_ms"] == 0
+    phases = ("dns_lookup_ms", "tcp_connection_ms", "tls_handshake_ms", "server_processing_ms", "content_download_ms")
+    assert result["total_latency_ms"] == pytest.approx(sum(result[phase] for phase in phases), abs=0.05)
+
+
+def test_redirect_hops_are_followed_and_timed(origin):
+    direct = app.perform_latency_check(origin.url + "/slow")
+    result = app.perform_latency_check(origin.url + "/hop/3")
+    assert result["status_code"] == 200 and result["up"]
+    assert result["server_processing_ms"] >= direct["server_processing_ms"] - 5  # the final hop's wait is included
+    assert origin.connections == 5  # one cold connection per hop without keep-alive
+
+
+def test_too_many_redirects_report_the_last_redirect(origin):
+    result = app.perform_latency_check(origin.url + f"/hop/{app.PROBE_MAX_REDIRECTS + 2}")
+    assert result["status_code"] == 302
+
+
+def test_keep_alive_reuses_the_connection(origin):
+    first = app.perform_latency_check(origin.url + "/", keep_alive=True)
+    second = app.perform_latency_check(origin.url + "/", keep_alive=True)
+    assert not first["connection_reused"] and second["connection_reused"]
+    assert second["tcp_connection_ms"] == 0 and origin.connections == 1
+    redirected = app.perform_latency_check(origin.url + "/hop/2", keep_alive=True)
+    assert redirected["connection_reused"] and origin.connections == 1  # every hop went over the pooled connection
+
+
+def test_without_keep_alive_every_check_connects(origin):
+    for _ in range(2): assert not app.perform_latency_check(origin.url + "/")["connection_reused"]
+    assert origin.connections == 2
@@ -0,0 +1,49 @@
+import json
+import os
+
+import app
+
+
+def record(url, second, status=200):
+    return {"api_url": url, "timestamp": f"2026-01-01T00:00:{second:02d}", "status_code": status}
+
+
+def test_offsets_survive_reopening_and_slice_newest_first(tmp_path):
+    path = str(tmp_path / "api_logs.ndjson")
+    store = app.LogStore(path)
+    store.append_many([record("http://a", s) for s in range(5)])
+    store.append(record("http://b", 9, status=503))
+    reopened = app.LogStore(path)
+    for s in (store, reopened):
+        assert len(s) == 6
+        assert [r["timestamp"][-2:] for r in s.newest(0, 3)] == ["09", "04", "03"]
+        assert [r["timestamp"][-2:] for r in s.newest(4, 10)] == ["01", "00"]
+        assert s.newest(6, 10) == []
+
+
+def test_for_url_filters_by_since_and_limit(tmp_path):
+    store = app.LogStore(str(tmp_path / "api_logs.ndjson"))
+    store.append_many([record("http://a", s) for s in (3, 1, 2)] + [record("http://b", 0)])
+    assert [r["timestamp"][-2:] for r in store.for_url("http://a")] == ["01", "02", "03"]
+    assert [r["timestamp"][-2:] for r in store.for_url("http://a", since="2026-01-01T00:00:02")] == ["02", "03"]
+    assert [r["timestamp"][-2:] for r in store.for_url("http://a", limit=1)] == ["03"]
+    assert store.for_url("http://missing") == []
+    assert {r["api_url"]: r["timestamp"][-2:] for r in store.latest_by_url()} == {"http://a": "02", "http://b": "00"}
+
+
+def test_torn_final_line_is_truncated_on_open(tmp_path):
+    path = str(tmp_path / "api_logs.ndjson")
+    with open(path, "w") as f:
+        f.write(json.dumps(record("http://a", 1)) + "\n" + '{"api_url": "http://a", "timest')
+    store = app.LogStore(path)
+    assert len(store) == 1
+    store.append(record("http://a", 2))
+    assert [r["timestamp"][-2:] for r in app.LogStore(path).newest(0, 10)] == ["02", "01"]
+
+
+def test_log_store_is_opened_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "log_store", None)
+    assert not os.path.exists(app.LOG_STORE_FILE)
+    store = app.get_log_store()
+    assert store is app.get_log_store() and os.path.exists(app.LOG_STORE_FILE)
@@ -0,0 +1,52 @@
+import pytest
+
+from metrics import Histogram, MetricsRegistry, bucket_quantile
+
+BOUNDS = (1, 2, 4)
+
+
+@pytest.mark.parametrize("q, expected", [(0.2, 0.5), (0.5, 1.25), (0.9, 3.0), (1.0, 4.0)])
+def test_bucket_quantile_interpolates_inside_the_bucket(q, expected):
+    # Two values <= 1, two in (1, 2] and one in (2, 4].
+    assert bucket_quantile(BOUNDS, [2, 4, 5, 5], q) == pytest.approx(expected)
+
+
+def test_bucket_quantile_edges():
+    assert bucket_quantile(BOUNDS, [0, 0, 0, 0], 0.5) is None
+    assert bucket_quantile(BOUNDS, [], 0.5) is None
+    assert bucket_quantile(BOUNDS, [0, 0, 0, 3], 0.5) == 4  # everything in +Inf reports the last bound
+
+
+def test_histogram_counts_each_value_in_its_bucket():
+    histogram = Histogram("h", "help", labels=("op",), buckets=BOUNDS)
+    for value in (0.5, 1, 1.5, 3, 10): histogram.observe(value, "read")
+    assert histogram.cumulative("read") == [2, 3, 4, 5]  # bounds are inclusive, as Prometheus' le
+    assert histogram.cumulative("write") == [0, 0, 0, 0]
+    assert histogram.quantile(0.5, "read") == pytest.approx(1.5)
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    checks = registry.counter("apimon_checks", "Checks run.", labels=("outcome",))
+    latency = registry.histogram("apimon_latency_seconds", "Latency.", buckets=(0.1, 1))
+    registry.callback("apimon_queue_depth", "Queued results.", lambda: 7)
+    registry.callback("apimon_owned", "Owned shards.", lambda: {("a",): 2, ("b\"c",): 3}, labels=("worker",))
+    checks.inc("up"); checks.inc("up"); checks.inc("down", amount=3)
+    latency.observe(0.05); latency.observe(0.5)
+    assert registry.render().splitlines() == [
+        "# HELP apimon_checks Checks run.", "# TYPE apimon_checks counter",
+        'apimon_checks_total{outcome="down"} 3', 'apimon_checks_total{outcome="up"} 2',
+        "# HELP apimon_latency_seconds Latency.", "# TYPE apimon_latency_seconds histogram",
+        'apimon_latency_seconds_bucket{le="0.1"} 1', 'apimon_latency_seconds_bucket{le="1"} 2', 'apimon_latency_seconds_bucket{le="+Inf"} 2',
+        "apimon_latency_seconds_sum 0.55", "apimon_latency_seconds_count 2",
+        "# HELP apimon_queue_depth Queued results.", "# TYPE apimon_queue_depth gauge", "apimon_queue_depth 7",
+        "# HELP apimon_owned Owned shards.", "# TYPE apimon_owned gauge", 'apimon_owned{worker="a"} 2', 'apimon_owned{worker="b\\"c"} 3',
+    ]
+
+
+def test_a_failing_callback_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.callback("apimon_broken", "Broken.", lambda: 1 / 0)
+    registry.counter("apimon_ok", "Fine.").inc()
+    assert registry.render().splitlines() == ["# apimon_broken unavailable: division by zero",
+                                              "# HELP apimon_ok Fine.", "# TYPE apimon_ok counter", "apimon_ok_total 1"]
@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+
+import app
+
+LEGACY_SCHEMA = """
+CREATE TABLE monitored_apis (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE, header_name TEXT,
+    header_value TEXT, check_frequency_minutes INTEGER NOT NULL, category TEXT,
+    notification_email TEXT, is_active BOOLEAN DEFAULT 1,
+    last_checked_at TIMESTAMP, last_status TEXT DEFAULT 'Pending'
+);
+CREATE TABLE monitoring_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, api_id INTEGER, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status_code INTEGER, is_up BOOLEAN, total_latency_ms REAL, error_message TEXT,
+    dns_lookup_ms REAL, tcp_connection_ms REAL, tls_handshake_ms REAL,
+    server_processing_ms REAL, content_download_ms REAL
+);
+"""
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_fresh_database_is_at_the_latest_version(db):
+    conn = sqlite3.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(app.SCHEMA_MIGRATIONS)
+    assert {"connection_reused", "dns_cached"} <= columns(conn, "monitoring_logs")
+    assert {"cold_dns", "expected_status", "body_assertion", "max_body_bytes"} <= columns(conn, "monitored_apis")
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+    app.migrate_db(conn)  # nothing left to apply
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(app.SCHEMA_MIGRATIONS)
+    conn.close()
+
+
+def test_legacy_database_is_upgraded_and_rollups_backfilled(tmp_path, monkeypatch):
+    path = str(tmp_path / "monitoring.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO monitoring_logs (api_id, timestamp, status_code, is_up, total_latency_ms) VALUES (1, ?, 200, 1, ?)",
+                     [(f"2026-01-01T00:00:{i:02d}", 10.0 + i) for i in range(30)])
+    conn.execute("INSERT INTO monitoring_logs (api_id, timestamp, is_up, error_message) VALUES (1, '2026-01-01T00:00:45', 0, 'timed out')")
+    conn.commit(); conn.close()
+    monkeypatch.setattr(app, "DATABASE_FILE", path)
+    app.init_db()
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(app.SCHEMA_MIGRATIONS)
+    assert conn.execute("SELECT COUNT(*) FROM monitoring_logs").fetchone()[0] == 31
+    assert conn.execute("SELECT check_count, error_count, latency_count, latency_sum FROM monitoring_rollups WHERE resolution = ?",
+                        (app.LIFETIME_RESOLUTION,)).fetchone() == (31, 1, 30, sum(10.0 + i for i in range(30)))
+    conn.close()
+
+
+def test_concurrent_starts_apply_each_migration_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "monitoring.db")
+    monkeypatch.setattr(app, "DATABASE_FILE", path)
+    barrier, errors = threading.Barrier(6), []
+    def start():
+        barrier.wait()
+        try: app.init_db()
+        except Exception as e: errors.append(e)
+    threads = [threading.Thread(target=start) for _ in range(6)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(app.SCHEMA_MIGRATIONS)
+    conn.close()
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import app
+
+
+class ConcurrencyProbe:
+    """Stands in for perform_latency_check and records how many calls overlap, overall and per host."""
+    def __init__(self, delay=0.05):
+        self.delay, self.lock = delay, threading.Lock()
+        self.running, self.peak = Counter(), Counter()
+
+    def __call__(self, url, *args):
+        host = app.urlparse(url).hostname
+        with self.lock:
+            self.running[host] += 1; self.running[None] += 1
+            self.peak[host] = max(self.peak[host], self.running[host]); self.peak[None] = max(self.peak[None], self.running[None])
+        time.sleep(self.delay)
+        with self.lock:
+            self.running[host] -= 1; self.running[None] -= 1
+        if "fail" in url: raise ConnectionError("refused")
+        return {"up": True, "status_code": 200, "total_latency_ms": self.delay * 1000}
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    fake = ConcurrencyProbe()
+    monkeypatch.setattr(app, "perform_latency_check", fake)
+    return fake
+
+
+def apis(hosts, per_host):
+    return [{"id": h * 100 + i, "url": f"http://host{h}.test/{i}"} for h in range(hosts) for i in range(per_host)]
+
+
+def run(engine, monitors):
+    results = {}
+    engine.run(monitors, lambda api, res, error: results.__setitem__(api["id"], (res, error)))
+    engine.shutdown()
+    return results
+
+
+def test_global_limit(probe):
+    results = run(app.ProbeEngine(concurrency=4, per_host_concurrency=10), apis(hosts=6, per_host=2))
+    assert len(results) == 12 and probe.peak[None] == 4
+
+
+def test_per_host_limit_leaves_slots_for_other_hosts(probe):
+    monitors = apis(hosts=1, per_host=10) + [{"id": 999, "url": "http://other.test/"}]
+    finished = []
+    engine = app.ProbeEngine(concurrency=8, per_host_concurrency=2)
+    engine.run(monitors, lambda api, res, error: finished.append(api["id"]))
+    engine.shutdown()
+    assert probe.peak["host0.test"] == 2 and probe.peak[None] == 3
+    assert finished.index(999) <= 2  # finishes with the first wave, not behind the throttled host
+
+
+def test_errors_are_reported_and_skipped_probes_are_not(probe):
+    engine = app.ProbeEngine(concurrency=2)
+    results = {}
+    async def probe_all():
+        monitors = [{"id": 1, "url": "http://fail.test/"}, {"id": 2, "url": "http://ok.test/"}, {"id": 3, "url": "http://moved.test/"}]
+        await app.asyncio.gather(*(engine.probe(api, lambda api, res, error: results.__setitem__(api["id"], (res, error)),
+                                                wanted=lambda api: api["id"] != 3) for api in monitors))
+    app.asyncio.run(probe_all())
+    engine.shutdown()
+    assert results[1][0] is None and isinstance(results[1][1], ConnectionError)
+    assert results[2][0]["up"] and results[2][1] is None
+    assert 3 not in results and engine.in_flight == 0
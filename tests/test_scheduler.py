@@ -0,0 +1,79 @@
+import app
+
+
+def monitor(api_id, minutes=1, last_checked_at=None, **extra):
+    return {"id": api_id, "url": f"http://127.0.0.1/m/{api_id}", "check_frequency_minutes": minutes,
+            "last_checked_at": last_checked_at, "last_status": "Up", **extra}
+
+
+def due_ids(scheduler):
+    return [api["id"] for api, _ in scheduler.wait_for_due(timeout=0)]
+
+
+def test_monitors_come_due_in_due_time_order(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    t = clock.now
+    scheduler.load([monitor(1, last_checked_at=t - 10), monitor(2, last_checked_at=t - 50), monitor(3, last_checked_at=t - 30)])
+    assert due_ids(scheduler) == []
+    clock.now = t + 35
+    assert due_ids(scheduler) == [2, 3]
+    clock.now = t + 60
+    assert due_ids(scheduler) == [1]
+
+
+def test_new_monitor_is_due_immediately(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    scheduler.load([monitor(1, last_checked_at=clock.now)])
+    scheduler.upsert(monitor(2))
+    assert due_ids(scheduler) == [2]
+
+
+def test_reschedule_keeps_cadence_from_the_due_time(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    scheduler.load([monitor(1)])
+    (api, due_at), = scheduler.wait_for_due(timeout=0)
+    clock.now += 5  # the check took a while
+    scheduler.reschedule(api["id"], due_at)
+    clock.now = due_at + 59
+    assert due_ids(scheduler) == []
+    clock.now = due_at + 60
+    assert due_ids(scheduler) == [1]
+
+
+def test_removed_and_edited_monitors_leave_no_stale_entries(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    scheduler.load([monitor(1), monitor(2)])
+    scheduler.remove(1)
+    scheduler.upsert(monitor(2, category="edited"))
+    assert due_ids(scheduler) == [2]
+    assert 1 not in scheduler and len(scheduler) == 1
+
+
+def test_reschedule_after_removal_is_ignored(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    scheduler.load([monitor(1)])
+    (api, due_at), = scheduler.wait_for_due(timeout=0)
+    scheduler.remove(1)
+    scheduler.reschedule(1, due_at)
+    clock.now += 3600
+    assert due_ids(scheduler) == []
+
+
+def test_sync_keeps_due_times_of_unchanged_monitors(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    t = clock.now
+    scheduler.load([monitor(1, last_checked_at=t - 30), monitor(2, last_checked_at=t - 30)])
+    # last_checked_at is written by the worker itself, so it does not count as an edit.
+    scheduler.sync([monitor(1, last_checked_at=t), monitor(3, last_checked_at=t - 50)])
+    assert 2 not in scheduler
+    clock.now = t + 30
+    assert due_ids(scheduler) == [3, 1]
+
+
+def test_closed_scheduler_ignores_loads_and_returns_at_once(clock):
+    scheduler = app.MonitorScheduler(jitter=0, clock=clock)
+    scheduler.load([monitor(1)])
+    scheduler.close()
+    scheduler.load([monitor(2)]); scheduler.upsert(monitor(3))
+    assert len(scheduler) == 0
+    assert scheduler.wait_for_due(timeout=60) == []
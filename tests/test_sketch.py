@@ -0,0 +1,51 @@
+import math
+import random
+
+import pytest
+
+import app
+
+
+def exact_quantile(values, q):
+    # The rank LatencySketch.quantile answers for: the value at position floor(q * (n - 1)).
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_quantiles_are_within_the_relative_accuracy(seed):
+    rng = random.Random(seed)
+    values = [rng.lognormvariate(4, 1) for _ in range(20000)]
+    sketch = app.LatencySketch()
+    for v in values: sketch.add(v)
+    for q in (0.5, 0.9, 0.95, 0.99, 0.999):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= app.SKETCH_RELATIVE_ACCURACY * exact + 0.005  # quantile() rounds to 0.01 ms
+
+
+def test_merge_matches_a_sketch_of_all_values():
+    rng = random.Random(7)
+    a_values, b_values = [rng.uniform(1, 500) for _ in range(3000)], [rng.uniform(200, 3000) for _ in range(1000)]
+    a, b, combined = app.LatencySketch(), app.LatencySketch(), app.LatencySketch()
+    for v in a_values: a.add(v); combined.add(v)
+    for v in b_values: b.add(v); combined.add(v)
+    merged = a.merge(b)
+    assert merged.count == 4000
+    assert merged.bins == combined.bins
+    assert [merged.quantile(q) for q in (0.5, 0.99)] == [combined.quantile(q) for q in (0.5, 0.99)]
+
+
+def test_serialization_round_trip_and_zero_bucket():
+    sketch = app.LatencySketch()
+    for v in (0.0, 0.005, 12.5, 12.6, 980.0): sketch.add(v)
+    restored = app.LatencySketch.from_bytes(sketch.to_bytes())
+    assert (restored.bins, restored.zero_count, restored.count) == (sketch.bins, 2, 5)
+    assert restored.quantile(0) == 0.0
+    assert app.LatencySketch.from_bytes(None).quantile(0.5) is None
+
+
+def test_sketch_merge_sql_function():
+    a, b = app.LatencySketch(), app.LatencySketch()
+    a.add(10); b.add(20); b.add(30)
+    merged = app.LatencySketch.from_bytes(app.merge_sketch_blobs(a.to_bytes(), b.to_bytes()))
+    assert merged.count == 3
+    assert app.merge_sketch_blobs(None, b.to_bytes()) == b.to_bytes()
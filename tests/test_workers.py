@@ -0,0 +1,147 @@
+import sqlite3
+import time
+
+import pytest
+
+import app
+from benchmark import fake_result
+from conftest import FakeClock
+
+
+@pytest.fixture
+def leases(db):
+    clock = FakeClock()
+    def make():
+        return app.ShardLeases(db, shards=8, lease_seconds=10, clock=clock)
+    make.clock = clock
+    return make
+
+
+def test_a_lone_worker_takes_every_shard(leases):
+    a = leases()
+    assert a.sync() == frozenset(range(8))
+    assert a.owns(3) and a.owns(11)
+
+
+def test_a_joining_worker_gets_its_fair_share_without_overlap(leases):
+    a, b = leases(), leases()
+    a.sync()
+    assert b.sync() == frozenset()  # every lease is held and unexpired
+    a.sync()  # sees two live workers and hands its surplus back
+    b.sync()
+    assert len(a.owned) == len(b.owned) == 4
+    assert a.owned | b.owned == frozenset(range(8)) and not a.owned & b.owned
+
+
+def test_expired_leases_are_stolen(leases):
+    a, b = leases(), leases()
+    a.sync(); b.sync(); a.sync(); b.sync()
+    leases.clock.now += 11  # a stops renewing
+    assert b.sync() == frozenset(range(8))
+
+
+def test_unexpired_leases_are_not_stolen(leases):
+    a, b = leases(), leases()
+    a.sync(); b.sync(); a.sync(); b.sync()
+    leases.clock.now += 9
+    b.sync()
+    assert len(b.owned) == 4
+
+
+def test_released_shards_move_without_waiting_for_expiry(leases):
+    a, b = leases(), leases()
+    a.sync(); b.sync(); a.sync(); b.sync()
+    a.release()
+    assert a.owned == frozenset() and a.sync() == frozenset()
+    assert b.sync() == frozenset(range(8))
+
+
+def checks(api_id, checked_at, latencies):
+    return [(api_id, checked_at, True, False, ms, {phase: ms / 10 for phase in app.PHASE_COLUMNS}) for ms in latencies]
+
+
+def test_rollups_from_several_writers_add_up(db):
+    # A shard moving A -> B -> A: each worker writes part of the same buckets.
+    upserter, now = app.RollupUpserter(flush_interval=0), time.time()
+    conns = [sqlite3.connect(db), sqlite3.connect(db)]
+    for conn in conns: app.register_rollup_functions(conn)
+    parts = [[10.0, 20.0], [5.0], [40.0, 30.0]]
+    for conn, latencies in zip(conns + conns[:1], parts):
+        with conn: upserter.apply(conn.cursor(), checks(1, now, latencies))
+        upserter.commit()
+    conn = conns[0]; conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT * FROM monitoring_rollups WHERE api_id = 1").fetchall()
+    assert {row["resolution"] for row in rows} == set(app.RollupUpserter.RESOLUTIONS)
+    for row in rows:
+        rollup = app.Rollup.from_row(row)
+        assert (rollup.check_count, rollup.up_count, rollup.latency_sum) == (5, 5, 105.0)
+        assert (rollup.latency_min, rollup.latency_max, rollup.sketch.count) == (5.0, 40.0, 5)
+        assert all(sketch.count == 5 for sketch in rollup.phase_sketches.values())
+    for c in conns: c.close()
+
+
+def test_error_checks_leave_latency_bounds_alone(db):
+    upserter, conn, now = app.RollupUpserter(flush_interval=0), sqlite3.connect(db), time.time()
+    app.register_rollup_functions(conn)
+    for batch in ([(1, now, False, True, None, None)], checks(1, now, [12.0]), [(1, now, False, True, None, None)]):
+        with conn: upserter.apply(conn.cursor(), batch)
+        upserter.commit()
+    assert conn.execute("SELECT check_count, error_count, latency_count, latency_min, latency_max FROM monitoring_rollups WHERE resolution = 60").fetchone() == (3, 2, 1, 12.0, 12.0)
+    conn.close()
+
+
+def test_ownership_ends_when_the_lease_runs_out_without_a_renewal(leases):
+    a = leases()
+    a.sync()
+    leases.clock.now += 9
+    assert a.owns(5)
+    leases.clock.now += 1  # the resync thread stalled: nothing renewed the lease
+    assert not a.owns(5) and a.owned == frozenset(range(8))
+    a.sync()
+    assert a.owns(5)
+
+
+def rollup_counts(conn):
+    return dict(conn.execute("SELECT resolution, check_count FROM monitoring_rollups WHERE api_id = 1"))
+
+
+def test_coarse_rollups_wait_for_the_flush_interval(db, clock):
+    clock.now = 3600 * 1000 + 60  # early in an hour bucket
+    upserter, conn = app.RollupUpserter(flush_interval=30, clock=clock), sqlite3.connect(db)
+    app.register_rollup_functions(conn)
+    for _ in range(3):
+        with conn: upserter.apply(conn.cursor(), checks(1, clock.now, [10.0]))
+        upserter.commit()
+        clock.now += 5
+    assert rollup_counts(conn) == {60: 3}
+    with conn: upserter.apply(conn.cursor(), checks(1, clock.now, [10.0]))
+    upserter.rollback()  # the transaction failed: nothing it staged is kept
+    clock.now += 20
+    with conn: upserter.apply(conn.cursor(), checks(1, clock.now, [10.0]))
+    upserter.commit()
+    assert rollup_counts(conn) == {60: 5, 3600: 4, 86400: 4, 0: 4}
+    assert not upserter.flush(conn.cursor())  # nothing pending any more
+    conn.close()
+
+
+def test_a_closed_bucket_is_written_before_the_interval(db, clock):
+    clock.now = 3600 * 1000 - 10  # the last seconds of an hour bucket
+    upserter, conn = app.RollupUpserter(flush_interval=3600, clock=clock), sqlite3.connect(db)
+    app.register_rollup_functions(conn)
+    with conn: upserter.apply(conn.cursor(), checks(1, clock.now, [10.0]))
+    upserter.commit()
+    clock.now += 20
+    with conn: upserter.apply(conn.cursor(), checks(1, clock.now, [10.0]))
+    upserter.commit()
+    counts = dict(conn.execute("SELECT bucket_start, check_count FROM monitoring_rollups WHERE resolution = 3600"))
+    assert counts == {3600 * 999: 1, 3600 * 1000: 1}
+    conn.close()
+
+
+def test_stopping_the_writer_flushes_pending_rollups(db):
+    writer = app.CheckWriter(db).start()
+    writer.submit({"id": 1}, fake_result(0), None, time.time(), "Up")
+    writer.stop()
+    conn = sqlite3.connect(db)
+    assert rollup_counts(conn) == {60: 1, 3600: 1, 86400: 1, 0: 1}
+    conn.close()